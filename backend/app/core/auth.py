@@ -6,13 +6,14 @@ from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models.user import User as UserModel # Импортируем модель User
 import logging
 
 # Импортируем зависимости из новых мест
 # Используем try-except для обработки потенциальных циклических импортов при инициализации
 try:
-    from ..db.database import get_db
+    from ..db.database import get_db, get_async_db
     from ..crud import user as user_crud
     from ..models import user as user_model # Импортируем конкретную модель
 except ImportError:
@@ -48,7 +49,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> user_model.User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> user_model.User:
     # --- ДОБАВЛЕНО ЛОГИРОВАНИЕ ---
     logger.info(f"Attempting to get current user with token starting: {token[:10]}...")
     # --- КОНЕЦ ЛОГИРОВАНИЯ ---
@@ -85,12 +86,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
 
     # Ищем пользователя в БД
-    user = user_crud.get_user_by_username(db, username=username)
+    user = await db.run_sync(user_crud.get_user_by_username, username=username)
     if user is None:
         # --- ДОБАВЛЕНО ЛОГИРОВАНИЕ ---
         logger.warning(f"User '{username}' found in token but not in DB.")
         # --- КОНЕЦ ЛОГИРОВАНИЯ ---
         raise credentials_exception
+    # Отсоединяем пользователя от сессии: commit в обработчике не должен
+    # "протухать" его атрибуты (ленивая подгрузка вне run_sync невозможна)
+    db.expunge(user)
 
     # --- ДОБАВЛЕНО ЛОГИРОВАНИЕ ---
     logger.info(f"User {user.username} authenticated successfully.")
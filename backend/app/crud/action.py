@@ -10,6 +10,8 @@ import logging
 from .. import models, schemas
 from . import character as character_crud  # Для apply_status_effect
 from .item import get_inventory_item  # Для получения предмета из инвентаря
+from .unit_of_work import get_owned_character
+from .character_loading import COMBAT
 
 # Импортируем утилиты, включая парсер кулдауна
 from .utils import (
@@ -119,22 +121,7 @@ def activate_action(
     Содержит логику для конкретных способностей.
     """
     # Загрузка персонажа со всеми необходимыми связями
-    character = db.query(models.Character).options(
-        selectinload(models.Character.inventory).selectinload(models.CharacterInventoryItem.item),
-        selectinload(models.Character.equipped_weapon1).selectinload(
-            models.CharacterInventoryItem.item.of_type(models.Weapon)).selectinload(models.Weapon.granted_abilities),
-        selectinload(models.Character.equipped_weapon2).selectinload(
-            models.CharacterInventoryItem.item.of_type(models.Weapon)).selectinload(models.Weapon.granted_abilities),
-        selectinload(models.Character.equipped_armor).selectinload(models.CharacterInventoryItem.item),
-        selectinload(models.Character.equipped_shield).selectinload(models.CharacterInventoryItem.item),
-        selectinload(models.Character.active_status_effects),
-        selectinload(models.Character.active_ability_1), selectinload(models.Character.active_ability_2),
-        selectinload(models.Character.active_ability_3), selectinload(models.Character.active_ability_4),
-        selectinload(models.Character.active_ability_5),
-    ).filter(
-        models.Character.id == character_id,
-        models.Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, COMBAT)
 
     if not character:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Персонаж не найден")
@@ -356,7 +343,7 @@ def activate_action(
                 mod_attribute_name = SKILL_MODIFIER_MAP.get(attack_skill_name[:3])
                 if not mod_attribute_name: raise HTTPException(status_code=500,
                                                                detail="Ошибка конфигурации: неверный навык атаки.")
-                base_modifier = getattr(character, mod_attribute_name, 0)
+                base_modifier = character.derived.modifiers.get(mod_attribute_name, 0)
                 is_ranged_attack = attack_skill_name in ["Ловкость",
                                                          "Внимательность"] and equipped_weapon.range_normal is not None
                 attack_type_str = 'ranged' if is_ranged_attack else 'melee';
@@ -426,7 +413,7 @@ def activate_action(
             # Обработка Других Способностей
             elif ability.name == "Атака конусом (Дробовик)":
                 if not equipped_weapon: raise HTTPException(status_code=400, detail="Требуется дробовик.")
-                save_dc = 8 + character.dexterity_mod;
+                save_dc = 8 + character.derived.modifiers['dexterity_mod'];
                 save_attribute = "Ловкость";
                 base_damage_formula = equipped_weapon.damage or "0"
                 full_damage_value, full_damage_details = _parse_and_roll(base_damage_formula, character);
@@ -449,7 +436,7 @@ def activate_action(
                 mod_attribute_name = SKILL_MODIFIER_MAP.get(attack_skill_name[:3])
                 if not mod_attribute_name: raise HTTPException(status_code=500,
                                                                detail="Ошибка Очереди: неверный навык.")
-                base_modifier = getattr(character, mod_attribute_name, 0);
+                base_modifier = character.derived.modifiers.get(mod_attribute_name, 0);
                 skill_attr_map = {'Сила': 'strength', 'Ловкость': 'dexterity', 'Внимательность': 'attention'}
                 attack_context_string = f"attack_rolls.ranged.{skill_attr_map.get(attack_skill_name, 'other')}"
                 numeric_mod_from_effects = _get_numeric_modifier_for_context(character.active_status_effects,
@@ -589,12 +576,6 @@ def activate_action(
                 if ammo_inv_item_to_delete and ammo_inv_item_to_delete.quantity <= 0: db.delete(ammo_inv_item_to_delete)
                 db.commit()
                 logger.info("Action successful, changes committed.")
-                if action_result.character_update_needed:
-                    db.refresh(character)
-                    db.refresh(character, attribute_names=['active_status_effects', 'inventory', 'active_ability_1',
-                                                           'active_ability_2', 'active_ability_3', 'active_ability_4',
-                                                           'active_ability_5'])
-                    logger.debug("Character object and relevant relations refreshed.")
             except Exception as commit_exc:
                 logger.error(f"DATABASE COMMIT FAILED: {commit_exc}", exc_info=True);
                 db.rollback()
@@ -0,0 +1,213 @@
+# backend/app/crud/async_crud.py
+"""
+Async-обёртки над CRUD для AsyncSession.
+
+Бизнес-логика остаётся в синхронных модулях (character, item, action, ...),
+а здесь каждая операция выполняется через `AsyncSession.run_sync`, поэтому
+I/O базы идёт через async-драйвер и не блокирует event loop.
+
+Правило: всё, что обращается к ленивым атрибутам ORM (например, `inv_item.item`
+с полиморфными колонками), собирается в Pydantic-схему ВНУТРИ run_sync.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, List, Tuple, TypeVar, Any
+from pydantic import BaseModel
+import logging
+
+from .. import models, schemas
+from . import character as character_crud
+from . import item as item_crud
+from . import action as action_crud
+from . import custom_item as custom_item_crud
+from . import character_slots as slots_crud
+from . import character_turn as turn_crud
+from . import party as party_crud
+from . import user as user_crud
+from . import chat as chat_crud
+from .skill_check import perform_skill_check as _perform_skill_check
+from .unit_of_work import get_owned_character
+from .character_loading import COMBAT, VITALS
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
+
+
+# --- Пользователи ---
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[models.User]:
+    return await db.run_sync(user_crud.get_user_by_username, username=username)
+
+
+# --- Персонажи: чтение ---
+async def get_characters_by_user(
+    db: AsyncSession, user_id: int, after_id: Optional[int] = None, limit: int = character_crud.CHARACTER_LIST_DEFAULT_LIMIT, name: Optional[str] = None
+) -> Tuple[List[schemas.CharacterBriefOut], Optional[int]]:
+    return await db.run_sync(character_crud.get_characters_by_user, user_id=user_id, after_id=after_id, limit=limit, name=name)
+
+async def get_character_details_for_output(db: AsyncSession, character_id: int, user_id: int) -> Optional[schemas.CharacterDetailedOut]:
+    return await db.run_sync(character_crud.get_character_details_for_output, character_id=character_id, user_id=user_id)
+
+async def get_character_partial_for_output(db: AsyncSession, character_id: int, user_id: int, fields: FrozenSet[str]) -> Optional[BaseModel]:
+    return await db.run_sync(character_crud.get_character_partial_for_output, character_id=character_id, user_id=user_id, fields=fields)
+
+async def get_characters_details_for_output(
+    db: AsyncSession, character_ids: List[int], user_id: Optional[int] = None, shared_ids: Iterable[int] = ()
+) -> Dict[int, schemas.CharacterDetailedOut]:
+    return await db.run_sync(character_crud.get_characters_details_for_output, character_ids=character_ids, user_id=user_id, shared_ids=shared_ids)
+
+async def get_character_owner_id(db: AsyncSession, character_id: int) -> Optional[int]:
+    """Возвращает owner_id персонажа (или None), не загружая сам объект."""
+    def _op(session: Session) -> Optional[int]:
+        row = session.query(models.Character.owner_id).filter(models.Character.id == character_id).first()
+        return row[0] if row else None
+    return await db.run_sync(_op)
+
+
+# --- Персонажи: изменения ---
+# Мутации, после которых нужен лист персонажа, идут через character_crud.run_character_mutation:
+# граф загружается один раз, и обёртка возвращает (результат CRUD, CharacterDetailedOut).
+MutationResult = Tuple[T, Optional[schemas.CharacterDetailedOut]]
+
+async def _run_mutation(
+    db: AsyncSession, character_id: int, user_id: int, operation: Callable[[Session], T], with_details: bool = True
+) -> MutationResult[T]:
+    return await db.run_sync(lambda session: character_crud.run_character_mutation(
+        session, character_id, user_id, lambda: operation(session), with_details=with_details
+    ))
+
+async def create_character(db: AsyncSession, user_id: int, character_in: schemas.CharacterCreate) -> schemas.CharacterBriefOut:
+    def _op(session: Session) -> schemas.CharacterBriefOut:
+        db_char = character_crud.create_character(db=session, user_id=user_id, character_in=character_in)
+        return schemas.CharacterBriefOut.model_validate(db_char)
+    return await db.run_sync(_op)
+
+async def update_character_skills(db: AsyncSession, character_id: int, user_id: int, skill_updates: schemas.CharacterUpdateSkills) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: character_crud.update_character_skills(s, character_id=character_id, user_id=user_id, skill_updates=skill_updates))
+
+async def level_up_character(db: AsyncSession, character_id: int, user_id: int, level_up_data: schemas.LevelUpInfo) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: character_crud.level_up_character(s, character_id=character_id, user_id=user_id, level_up_data=level_up_data))
+
+async def update_character_stats(db: AsyncSession, character_id: int, user_id: int, stats_update: schemas.UpdateCharacterStats) -> MutationResult[Tuple[Optional[models.Character], Optional[str]]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: character_crud.update_character_stats(s, character_id=character_id, user_id=user_id, stats_update=stats_update))
+
+async def update_character_notes(db: AsyncSession, character_id: int, user_id: int, notes_update: schemas.CharacterNotes) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: character_crud.update_character_notes(s, character_id=character_id, user_id=user_id, notes_update=notes_update))
+
+async def apply_status_effect(db: AsyncSession, character_id: int, user_id: int, status_effect_id: int) -> MutationResult[bool]:
+    """
+    Применяет статус-эффект и коммитит изменения.
+    Результат False, если персонаж не найден.
+    """
+    def _op(session: Session) -> bool:
+        db_char = get_owned_character(session, character_id, user_id, VITALS)
+        if not db_char:
+            return False
+        added_effect_name = character_crud.apply_status_effect(session, db_char, status_effect_id)
+        if added_effect_name is not None:
+            try:
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"DB Error applying status effect {status_effect_id} to char {character_id}: {e}", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Ошибка БД при применении статуса: {e}")
+        return True
+    return await _run_mutation(db, character_id, user_id, _op)
+
+async def remove_status_effect(db: AsyncSession, character_id: int, user_id: int, status_effect_id: int) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: character_crud.remove_status_effect(s, character_id, user_id, status_effect_id))
+
+async def heal_character(db: AsyncSession, character_id: int, user_id: int, heal_request: schemas.HealRequest) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: character_crud.heal_character(s, character_id=character_id, user_id=user_id, heal_request=heal_request))
+
+async def perform_short_rest(db: AsyncSession, character_id: int, user_id: int, request: schemas.ShortRestRequest) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: character_crud.perform_short_rest(s, character_id=character_id, user_id=user_id, request=request))
+
+async def perform_long_rest(db: AsyncSession, character_id: int, user_id: int) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: character_crud.perform_long_rest(s, character_id=character_id, user_id=user_id))
+
+
+# --- Инвентарь и экипировка ---
+def _inventory_item_out(inv_item: models.CharacterInventoryItem) -> schemas.CharacterInventoryItemOut:
+    """Собирает CharacterInventoryItemOut с нужной схемой предмета по его типу."""
+    item_data = inv_item.item; item_schema: Any = None
+    if isinstance(item_data, models.Weapon): item_schema = schemas.WeaponOut.model_validate(item_data)
+    elif isinstance(item_data, models.Armor): item_schema = schemas.ArmorOut.model_validate(item_data)
+    elif isinstance(item_data, models.Shield): item_schema = schemas.ShieldOut.model_validate(item_data)
+    elif isinstance(item_data, models.GeneralItem): item_schema = schemas.GeneralItemOut.model_validate(item_data)
+    elif isinstance(item_data, models.Ammo): item_schema = schemas.AmmoOut.model_validate(item_data)
+    else: item_schema = schemas.ItemBase.model_validate(item_data)
+    if item_schema is None: raise HTTPException(status_code=500, detail="Не удалось определить тип добавленного предмета")
+    return schemas.CharacterInventoryItemOut(id=inv_item.id, item=item_schema, quantity=inv_item.quantity)
+
+# Операции с инвентарем и произвольными предметами отвечают не листом персонажа:
+# with_details=True нужен только для рассылки в лобби.
+async def add_item_to_inventory(db: AsyncSession, character_id: int, user_id: int, item_add: schemas.AddItemToInventory, with_details: bool = True) -> MutationResult[Optional[schemas.CharacterInventoryItemOut]]:
+    def _op(session: Session) -> Optional[schemas.CharacterInventoryItemOut]:
+        inv_item = item_crud.add_item_to_inventory(db=session, character_id=character_id, user_id=user_id, item_add=item_add)
+        return _inventory_item_out(inv_item) if inv_item is not None else None
+    return await _run_mutation(db, character_id, user_id, _op, with_details=with_details)
+
+async def remove_item_from_inventory(db: AsyncSession, inventory_item_id: int, character_id: int, user_id: int, quantity: int, with_details: bool = True) -> MutationResult[bool]:
+    return await _run_mutation(db, character_id, user_id, lambda s: item_crud.remove_item_from_inventory(s, inventory_item_id=inventory_item_id, character_id=character_id, user_id=user_id, quantity=quantity), with_details=with_details)
+
+async def equip_item(db: AsyncSession, character_id: int, user_id: int, equip_data: schemas.EquipItem) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: item_crud.equip_item(s, character_id=character_id, user_id=user_id, equip_data=equip_data))
+
+async def unequip_item(db: AsyncSession, character_id: int, user_id: int, slot: str) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: item_crud.unequip_item(s, character_id=character_id, user_id=user_id, slot=slot))
+
+
+# --- Произвольные предметы ---
+async def add_custom_item(db: AsyncSession, character_id: int, user_id: int, item_in: schemas.CustomItemCreate, with_details: bool = True) -> MutationResult[Optional[schemas.CustomItemOut]]:
+    def _op(session: Session) -> Optional[schemas.CustomItemOut]:
+        db_item = custom_item_crud.add_custom_item(session, character_id, user_id, item_in)
+        return schemas.CustomItemOut.model_validate(db_item) if db_item is not None else None
+    return await _run_mutation(db, character_id, user_id, _op, with_details=with_details)
+
+async def remove_custom_item(db: AsyncSession, custom_item_id: int, character_id: int, user_id: int, quantity: int, with_details: bool = True) -> MutationResult[bool]:
+    return await _run_mutation(db, character_id, user_id, lambda s: custom_item_crud.remove_custom_item(s, custom_item_id, character_id, user_id, quantity), with_details=with_details)
+
+
+# --- Действия, проверки, слоты, ход ---
+async def activate_action(db: AsyncSession, character_id: int, user_id: int, activation_data: schemas.ActivationRequest) -> MutationResult[schemas.ActionResultOut]:
+    """Граф нужен самому действию (инвентарь, экипировка, слоты), поэтому загружается всегда."""
+    return await _run_mutation(db, character_id, user_id, lambda s: action_crud.activate_action(s, character_id=character_id, user_id=user_id, activation_data=activation_data))
+
+async def perform_skill_check(db: AsyncSession, character_id: int, user_id: int, skill_name: str) -> Optional[schemas.SkillCheckResultOut]:
+    """Выполняет проверку навыка. Возвращает None, если персонаж не найден."""
+    def _op(session: Session) -> Optional[schemas.SkillCheckResultOut]:
+        # Проверке нужны состояния и предметы инвентаря (бонусы к навыкам) — профиль combat
+        character = get_owned_character(session, character_id, user_id, COMBAT)
+        if not character:
+            return None
+        return _perform_skill_check(db=session, character=character, skill_name=skill_name)
+    return await db.run_sync(_op)
+
+async def assign_ability_to_slot(db: AsyncSession, character_id: int, user_id: int, slot_number: int, ability_id: Optional[int]) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: slots_crud.assign_ability_to_slot(s, character_id=character_id, user_id=user_id, slot_number=slot_number, ability_id=ability_id))
+
+async def end_character_turn(db: AsyncSession, character_id: int, user_id: int) -> MutationResult[Optional[models.Character]]:
+    return await _run_mutation(db, character_id, user_id, lambda s: turn_crud.end_character_turn(s, character_id=character_id, user_id=user_id))
+
+
+# --- Партии ---
+async def create_party(db: AsyncSession, user_id: int, party: schemas.PartyCreate) -> schemas.PartyOut:
+    return await db.run_sync(party_crud.create_party, user_id=user_id, party=party)
+
+async def get_party_by_lobby_key(db: AsyncSession, lobby_key: str) -> Optional[models.Party]:
+    return await db.run_sync(party_crud.get_party_by_lobby_key, lobby_key=lobby_key)
+
+async def add_party_member(db: AsyncSession, party_id: int, user_id: int) -> None:
+    return await db.run_sync(party_crud.add_party_member, party_id=party_id, user_id=user_id)
+
+async def is_party_member(db: AsyncSession, party_id: int, user_id: int) -> bool:
+    return await db.run_sync(party_crud.is_party_member, party_id=party_id, user_id=user_id)
+
+
+# --- Чат ---
+async def save_chat_messages(db: AsyncSession, messages: List[Dict[str, Any]]) -> int:
+    return await db.run_sync(chat_crud.save_chat_messages, messages=messages)
+
+async def get_chat_history(db: AsyncSession, lobby_key: str, before_id: Optional[int] = None, limit: int = 50) -> schemas.ChatHistoryOut:
+    return await db.run_sync(chat_crud.get_chat_history, lobby_key=lobby_key, before_id=before_id, limit=limit)
@@ -1,9 +1,9 @@
 # backend/app/crud/character.py
-from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import func, inspect as sqlainspect
-from sqlalchemy.orm.properties import ColumnProperty # Импорт ColumnProperty
+from sqlalchemy.orm import Session, load_only, raiseload
+from pydantic import BaseModel
+from sqlalchemy import func, or_
 from fastapi import HTTPException, status
-from typing import List, Optional, Tuple, Any # Добавлен Any
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, TypeVar, Any # Добавлен Any
 
 import random
 
@@ -26,17 +26,25 @@ from .utils import (
     _get_skill_modifier,
     _calculate_initial_hp,
     _calculate_base_pu,
-    _get_xp_for_level,
     _update_character_available_abilities,
-    _calculate_total_ac,
     NEGATIVE_EMOTIONS, # Импортируем списки эмоций
     POSITIVE_EMOTIONS
 )
 
 from ..schemas import CustomItemOut
+from .character_cache import character_details_cache, has_pending_changes
+from .unit_of_work import CharacterUnitOfWork, get_owned_character
+from .character_loading import FULL, MINIMAL, VITALS, character_options, relation_options
+from .character_serializer import (
+    serialize_character, serialize_character_fields, partial_from_details, required_loads
+)
 import logging
 
 logger = logging.getLogger(__name__)
+T = TypeVar("T")
+
+CHARACTER_LIST_DEFAULT_LIMIT = 100
+CHARACTER_LIST_MAX_LIMIT = 500
 # Импортируем item CRUD для проверки экипировки при удалении
 from . import item as item_crud
 # Импортируем статус эффект CRUD для добавления эмоций
@@ -45,19 +53,36 @@ from . import reference as reference_crud
 
 # --- Character Read Operations ---
 
-def get_characters_by_user(db: Session, user_id: int) -> List[CharacterBriefOut]:
-    """Получает список краткой информации о персонажах пользователя."""
-    db_chars = db.query(Character).filter(Character.owner_id == user_id).all()
-    # Используем Pydantic схему для формирования ответа
-    return [
-        CharacterBriefOut(
-            id=c.id,
-            name=c.name,
-            level=c.level,
-            current_hp=c.current_hp,
-            max_hp=c.max_hp
-        ) for c in db_chars
+def _like_pattern(text: str) -> str:
+    """Подстрока для LIKE с экранированными %, _ и \\."""
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def get_characters_by_user(
+    db: Session, user_id: int, after_id: Optional[int] = None, limit: int = CHARACTER_LIST_DEFAULT_LIMIT, name: Optional[str] = None
+) -> Tuple[List[CharacterBriefOut], Optional[int]]:
+    """
+    Страница краткого списка персонажей пользователя (keyset по id, по возрастанию).
+    Выбираются только пять колонок CharacterBriefOut: без ORM-объектов и без
+    joined-связей экипировки/слотов. name — поиск по подстроке без учета регистра.
+    Возвращает (персонажи, after_id следующей страницы или None, если это последняя).
+    """
+    limit = max(1, min(limit, CHARACTER_LIST_MAX_LIMIT))
+    query = db.query(Character.id, Character.name, Character.level, Character.current_hp, Character.max_hp).filter(
+        Character.owner_id == user_id
+    )
+    if after_id is not None:
+        query = query.filter(Character.id > after_id)
+    if name:
+        query = query.filter(Character.name.ilike(_like_pattern(name), escape="\\"))
+    rows = query.order_by(Character.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    characters = [
+        CharacterBriefOut(id=row.id, name=row.name, level=row.level, current_hp=row.current_hp, max_hp=row.max_hp)
+        for row in rows
     ]
+    return characters, rows[-1].id if has_more else None
 
 def get_character_details(db: Session, character_id: int, user_id: int) -> Optional[Character]:
     """
@@ -65,106 +90,149 @@ def get_character_details(db: Session, character_id: int, user_id: int) -> Optio
     включая инвентарь, экипировку и способности оружия.
     Проверяет принадлежность персонажа пользователю.
     """
-    return db.query(Character).options(
-        selectinload(Character.owner),
-        # Инвентарь и предметы в нем
-        selectinload(Character.inventory).selectinload(CharacterInventoryItem.item),
-        # Экипировка (сразу грузим предметы, включая полиморфные способности оружия)
-        selectinload(Character.equipped_armor).selectinload(CharacterInventoryItem.item),
-        selectinload(Character.equipped_shield).selectinload(CharacterInventoryItem.item),
-        selectinload(Character.equipped_weapon1)
-            .selectinload(CharacterInventoryItem.item.of_type(Weapon)) # Явное указание типа для полиморфизма
-            .selectinload(Weapon.granted_abilities), # Загрузка способностей оружия
-        selectinload(Character.equipped_weapon2)
-            .selectinload(CharacterInventoryItem.item.of_type(Weapon))
-            .selectinload(Weapon.granted_abilities),
-        # Изученные способности и активные состояния
-        selectinload(Character.available_abilities),
-        selectinload(Character.active_status_effects),
-        selectinload(Character.custom_items)
-    ).filter(
+    return db.query(Character).options(*_character_details_options()).filter(
         Character.id == character_id,
         Character.owner_id == user_id # Проверка владельца
     ).first()
 
 
+def _character_details_options() -> Tuple:
+    """Опции загрузки полного графа персонажа (профиль full: один IN-запрос на связь для любого числа персонажей)."""
+    return character_options(FULL)
+
+
+def _character_partial_options(fields: FrozenSet[str]) -> list:
+    """
+    Опции загрузки только для запрошенных полей. Остальные связи не грузятся:
+    raiseload превращает случайное обращение в ошибку, а не в скрытый запрос.
+    Без связей — один узкий SELECT нужных колонок.
+    """
+    relations, columns = required_loads(fields)
+    options = relation_options(relations)
+    if columns is not None:
+        options.append(load_only(*(getattr(Character, name) for name in columns), raiseload=True))
+    options.append(raiseload("*"))
+    return options
+
+
+def get_character_partial_for_output(db: Session, character_id: int, user_id: int, fields: FrozenSet[str]) -> Optional[BaseModel]:
+    """
+    Частичный вывод персонажа (?fields= / ?sections=): схема только с полями `fields`
+    (набор из character_serializer.resolve_character_fields). Если полная схема уже
+    в кэше — поля берутся из нее без запросов; иначе грузятся только нужные связи.
+    """
+    cache = character_details_cache
+    if cache.enabled and not has_pending_changes(db, character_id):
+        cached = cache.get(character_id, user_id)
+        if cached is not None:
+            return partial_from_details(cached, fields)
+    db_char = db.query(Character).options(*_character_partial_options(fields)).filter(
+        Character.id == character_id,
+        Character.owner_id == user_id
+    ).first()
+    if not db_char: return None
+    try:
+        return serialize_character_fields(db_char, fields)
+    except Exception as e:
+        logger.error(f"Pydantic partial character validation error (fields: {sorted(fields)}): {e}", exc_info=True)
+        return None
+
+
 def get_character_details_for_output(db: Session, character_id: int, user_id: int) -> Optional[CharacterDetailedOut]:
-    """Получает данные персонажа и формирует Pydantic схему CharacterDetailedOut для вывода."""
+    """
+    Возвращает CharacterDetailedOut персонажа, используя версионированный LRU-кэш.
+    Возвращаемую схему нельзя изменять: она разделяется между запросами.
+    """
+    cache = character_details_cache
+    if not cache.enabled or has_pending_changes(db, character_id):
+        return _build_character_details_for_output(db, character_id, user_id)
+    cached = cache.get(character_id, user_id)
+    if cached is not None:
+        return cached
+    # Версию читаем ДО запроса: если во время сборки был commit, запись не сохранится
+    version = cache.current_version(character_id)
+    details = _build_character_details_for_output(db, character_id, user_id)
+    if details is not None:
+        cache.put(character_id, version, details)
+    return details
+
+
+def get_characters_details_for_output(
+    db: Session, character_ids: Iterable[int], user_id: Optional[int] = None, shared_ids: Iterable[int] = ()
+) -> Dict[int, CharacterDetailedOut]:
+    """
+    Пакетная версия get_character_details_for_output для нескольких персонажей
+    (initial_character_sync в лобби, /characters/batch). Персонажи, которых нет
+    в кэше, загружаются одним набором IN-запросов, а не отдельным запросом на каждого.
+    Без user_id владелец НЕ проверяется: вызывающий код сам решает, кому можно
+    видеть персонажей. С user_id возвращаются только персонажи владельца и
+    `shared_ids`; условие входит в запрос, чужие листы не собираются и не кэшируются.
+    Возвращает { character_id: CharacterDetailedOut } в порядке character_ids;
+    отсутствующие и недоступные id пропускаются.
+    """
+    ids = list(dict.fromkeys(character_ids)) # Уникальные, порядок сохраняется
+    if not ids:
+        return {}
+    shared = set(shared_ids)
+    cache = character_details_cache
+    use_cache = cache.enabled and not any(has_pending_changes(db, cid) for cid in ids)
+    found: Dict[int, CharacterDetailedOut] = cache.get_many(ids) if use_cache else {}
+    if user_id is not None:
+        found = {cid: details for cid, details in found.items() if details.owner_id == user_id or cid in shared}
+    missing = [cid for cid in ids if cid not in found]
+    if missing:
+        # Версии читаем ДО запроса (см. get_character_details_for_output)
+        versions = {cid: cache.current_version(cid) for cid in missing} if use_cache else {}
+        query = db.query(Character).options(*_character_details_options()).filter(Character.id.in_(missing))
+        if user_id is not None:
+            query = query.filter(or_(Character.owner_id == user_id, Character.id.in_(shared)))
+        for db_char in query.all():
+            details = _character_to_output(db_char)
+            if details is None:
+                continue
+            found[db_char.id] = details
+            if use_cache:
+                cache.put(db_char.id, versions[db_char.id], details)
+    return {cid: found[cid] for cid in ids if cid in found}
+
+
+def run_character_mutation(
+    db: Session, character_id: int, user_id: int, operation: Callable[[], T], with_details: bool = True
+) -> Tuple[T, Optional[CharacterDetailedOut]]:
+    """
+    Выполняет мутацию персонажа (operation — замыкание над CRUD-функцией) как unit of work:
+    граф деталей загружается один раз, CRUD меняет его и коммитит, тот же граф
+    сериализуется без повторной загрузки (см. crud/unit_of_work.py).
+    Возвращает (результат operation, CharacterDetailedOut). Детали — None, если
+    with_details=False (граф тогда не загружается) или персонаж не найден/чужой.
+    Собранные детали кладутся в кэш, как после get_character_details_for_output.
+    """
+    if not with_details:
+        return operation(), None
+    cache = character_details_cache
+    version = cache.current_version(character_id) # ДО загрузки графа
     db_char = get_character_details(db, character_id, user_id)
-    if not db_char: return None
+    if db_char is None:
+        return operation(), None # CRUD сам сообщит об отсутствии персонажа (None/404)
+    with CharacterUnitOfWork(db, db_char, version) as uow:
+        result = operation()
+        details = _character_to_output(uow.sync())
+    if details is not None and cache.enabled and not has_pending_changes(db, character_id):
+        cache.put(character_id, uow.version, details)
+    return result, details
 
-    total_ac = _calculate_total_ac(db_char)
-    passive_attention = 10 + db_char.attention_mod
-    next_level = db_char.level + 1
-    xp_needed = _get_xp_for_level(next_level)
 
-    character_data = {}
-    char_mapper = sqlainspect(Character)
+def _build_character_details_for_output(db: Session, character_id: int, user_id: int) -> Optional[CharacterDetailedOut]:
+    """Получает данные персонажа и формирует Pydantic схему CharacterDetailedOut для вывода."""
+    db_char = get_character_details(db, character_id, user_id)
+    if not db_char: return None
+    return _character_to_output(db_char)
 
-    # Копируем основные поля
-    for prop in char_mapper.iterate_properties:
-        if isinstance(prop, ColumnProperty) and prop.key in CharacterDetailedOut.model_fields:
-            # Копируем флаги действий
-            if prop.key in ['has_used_main_action', 'has_used_bonus_action', 'has_used_reaction']:
-                character_data[prop.key] = getattr(db_char, prop.key, False)
-            else:
-                character_data[prop.key] = getattr(db_char, prop.key)
-
-    # Формируем данные для слотов
-    active_slots_data = {}
-    for i in range(1, 6):
-        slot_ability_attr = f"active_ability_{i}"
-        slot_cooldown_attr = f"active_ability_slot_{i}_cooldown"
-        slot_ability_obj = getattr(db_char, slot_ability_attr, None)
-        slot_cooldown_val = getattr(db_char, slot_cooldown_attr, 0)
-        ability_schema = None
-        if slot_ability_obj:
-            try: ability_schema = AbilityOut.from_orm(slot_ability_obj)
-            except Exception as e: logger.error(f"Error creating AbilityOut schema for slot {i}: {e}")
-        active_slots_data[f"active_slot_{i}"] = ActiveAbilitySlotOut(
-            ability=ability_schema, cooldown_remaining=slot_cooldown_val
-        )
 
-    # Вспомогательная функция для инвентаря
-    def get_inventory_item_schema(inv_item: Optional[CharacterInventoryItem]) -> Optional[CharacterInventoryItemOut]:
-        if not inv_item or not inv_item.item: return None
-        item_data = inv_item.item; item_schema: Any = None
-        if isinstance(item_data, Weapon): item_schema = WeaponOut.from_orm(item_data)
-        elif isinstance(item_data, Armor): item_schema = ArmorOut.from_orm(item_data)
-        elif isinstance(item_data, Shield): item_schema = ShieldOut.from_orm(item_data)
-        elif isinstance(item_data, GeneralItem): item_schema = GeneralItemOut.from_orm(item_data)
-        elif isinstance(item_data, Ammo): item_schema = AmmoOut.from_orm(item_data)
-        else: item_schema = ItemBase.from_orm(item_data)
-        if item_schema is None: return None
-        return CharacterInventoryItemOut(id=inv_item.id, item=item_schema, quantity=inv_item.quantity)
-
-    inventory_list = [get_inventory_item_schema(inv_item) for inv_item in db_char.inventory if inv_item]
-    inventory_list = [item for item in inventory_list if item is not None]
-    custom_items_list = [CustomItemOut.from_orm(ci) for ci in db_char.custom_items]
-
-    # Добавляем все данные в словарь
-    character_data.update({
-        "skill_modifiers": {f: getattr(db_char, f) for f in CharacterSkillModifiers.model_fields.keys() if hasattr(db_char, f)},
-        "total_ac": total_ac, "passive_attention": passive_attention, "xp_needed_for_next_level": xp_needed,
-        "max_hp": db_char.max_hp, "current_hp": db_char.current_hp, "base_pu": db_char.base_pu,
-        "current_pu": db_char.current_pu, "stamina_points": db_char.stamina_points,
-        "exhaustion_level": db_char.exhaustion_level, "speed": db_char.speed,
-        "initiative_bonus": db_char.initiative_bonus, "base_ac": db_char.base_ac,
-        "inventory": inventory_list,
-        "equipped_armor": get_inventory_item_schema(db_char.equipped_armor),
-        "equipped_shield": get_inventory_item_schema(db_char.equipped_shield),
-        "equipped_weapon1": get_inventory_item_schema(db_char.equipped_weapon1),
-        "equipped_weapon2": get_inventory_item_schema(db_char.equipped_weapon2),
-        "available_abilities": [AbilityOut.from_orm(ab) for ab in db_char.available_abilities if ab],
-        "active_status_effects": [StatusEffectOut.from_orm(se) for se in db_char.active_status_effects if se],
-        "custom_items": custom_items_list,
-        **active_slots_data # Добавляем слоты
-    })
-
-    # Создаем и возвращаем Pydantic модель
+def _character_to_output(db_char: Character) -> Optional[CharacterDetailedOut]:
+    """Формирует CharacterDetailedOut из персонажа с загруженным графом (_character_details_options)."""
     try:
-        result_schema = CharacterDetailedOut(**character_data)
-        return result_schema
+        return serialize_character(db_char)
     except Exception as e:
         logger.error(f"Pydantic CharacterDetailedOut validation error: {e}", exc_info=True)
         return None
@@ -246,10 +314,7 @@ def create_character(db: Session, user_id: int, character_in: CharacterCreate) -
 
 def update_character_skills(db: Session, character_id: int, user_id: int, skill_updates: CharacterUpdateSkills) -> Optional[Character]:
     """Обновляет базовые значения навыков персонажа (1-10)."""
-    db_char = db.query(Character).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    db_char = get_owned_character(db, character_id, user_id, MINIMAL)
 
     if not db_char:
         return None
@@ -268,27 +333,23 @@ def update_character_skills(db: Session, character_id: int, user_id: int, skill_
 
     if updated:
         # Пересчитываем базовую ПУ, если Самообладание изменилось
-        db_char.base_pu = _calculate_base_pu(db_char.self_control_mod)
+        db_char.base_pu = _calculate_base_pu(db_char.derived.modifiers['self_control_mod'])
         # Пересчитать AC не нужно здесь, т.к. он зависит от Ловкости, брони и щита,
         # а не меняется напрямую при изменении других навыков через этот метод.
         db.commit()
-        db.refresh(db_char)
 
     return db_char
 
 
 def level_up_character(db: Session, character_id: int, user_id: int, level_up_data: LevelUpInfo) -> Optional[Character]:
     """Повышает уровень персонажа, обновляет статы, навыки и способности."""
-    db_char = db.query(Character).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    db_char = get_owned_character(db, character_id, user_id, FULL)
 
     if not db_char:
         return None
 
     # Проверка на возможность повышения уровня по опыту
-    xp_needed = _get_xp_for_level(db_char.level + 1)
+    xp_needed = db_char.derived.xp_needed_for_next_level
     if xp_needed is None or db_char.experience_points < xp_needed:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -300,7 +361,7 @@ def level_up_character(db: Session, character_id: int, user_id: int, level_up_da
 
     # Обновляем Макс. ПЗ
     # Убедимся, что используем актуальный модификатор Выносливости
-    current_endurance_mod = _get_skill_modifier(db_char.skill_endurance)
+    current_endurance_mod = db_char.derived.modifiers['endurance_mod']
     db_char.max_hp += level_up_data.hp_roll + current_endurance_mod
     db_char.current_hp = db_char.max_hp
 
@@ -365,7 +426,6 @@ def level_up_character(db: Session, character_id: int, user_id: int, level_up_da
 
     # Сохраняем все изменения
     db.commit()
-    db.refresh(db_char) # Обновляем объект из БД
     return db_char
 
 def update_character_stats(
@@ -375,12 +435,7 @@ def update_character_stats(
     stats_update: UpdateCharacterStats
 ) -> Tuple[Optional[Character], Optional[str]]:
     """Обновляет статы, проверяет триггеры ПУ и возвращает персонажа и имя сработавшей эмоции."""
-    character = db.query(Character).options(
-        selectinload(Character.active_status_effects) # Загружаем для добавления/проверки эмоций
-    ).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, VITALS)
 
     if not character:
         return None, None
@@ -461,10 +516,6 @@ def update_character_stats(
     if updated:
         try:
             db.commit()
-            db.refresh(character) # Обновляем объект из БД
-            # Дополнительно обновляем связи, которые могли измениться (статусы)
-            # Это важно, если get_character_details_for_output вызывается *до* refresh
-            # db.refresh(character, attribute_names=['active_status_effects']) # Попробуем без этого, т.к. get_character_details_for_output все равно запросит заново
             print(f"Character ID {character_id} stats updated. Triggered emotion: {triggered_emotion_name}")
         except Exception as e:
             db.rollback()
@@ -476,10 +527,7 @@ def update_character_stats(
 
 def update_character_notes(db: Session, character_id: int, user_id: int, notes_update: CharacterNotes) -> Optional[Character]:
     """Обновляет описательные заметки персонажа."""
-    db_char = db.query(Character).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    db_char = get_owned_character(db, character_id, user_id, MINIMAL)
 
     if not db_char:
         return None
@@ -493,7 +541,6 @@ def update_character_notes(db: Session, character_id: int, user_id: int, notes_u
 
     if updated:
         db.commit()
-        db.refresh(db_char)
 
     return db_char
 
@@ -529,12 +576,7 @@ def apply_status_effect(db: Session, character: Character, status_effect_id: int
 def remove_status_effect(db: Session, character_id: int, user_id: int, status_effect_id: int) -> Optional[Character]:
     """Снимает статус-эффект с персонажа и коммитит изменения."""
     # Загружаем персонажа вместе с его активными эффектами
-    character = db.query(Character).options(
-        selectinload(Character.active_status_effects)
-    ).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, VITALS)
 
     if not character:
         return None # Персонаж не найден или не принадлежит пользователю
@@ -550,7 +592,6 @@ def remove_status_effect(db: Session, character_id: int, user_id: int, status_ef
         character.active_status_effects.remove(status_effect_to_remove)
         try:
             db.commit()
-            db.refresh(character) # Обновляем объект после коммита
             print(f"Статус-эффект ID {status_effect_id} удален у персонажа ID {character_id}")
             return character
         except Exception as e:
@@ -575,10 +616,7 @@ def heal_character(db: Session, character_id: int, user_id: int, heal_request: H
 
     # <<< ИЗМЕНЕНИЕ НАЧАЛО: Загружаем персонажа с модификаторами >>>
     # Вместо простого запроса, загрузим сразу или получим модификаторы позже
-    character = db.query(Character).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, MINIMAL)
     # <<< ИЗМЕНЕНИЕ КОНЕЦ >>>
 
     if not character:
@@ -698,7 +736,6 @@ def heal_character(db: Session, character_id: int, user_id: int, heal_request: H
         character.current_hp = new_hp
         try:
             db.commit() # Сохраняем изменения HP, ОС и/или удаление/изменение quantity предмета
-            db.refresh(character) # Обновляем объект персонажа
             print(f"  Successfully applied healing/cost and committed.")
             return character
         except Exception as e:
@@ -715,10 +752,7 @@ def perform_short_rest(db: Session, character_id: int, user_id: int, request: Sh
     print(f"\n--- CRUD: perform_short_rest ---")
     print(f"Character ID: {character_id}, User ID: {user_id}, Request: {request}")
 
-    character = db.query(Character).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, MINIMAL)
 
     if not character:
         print(f"  ERROR: Character {character_id} not found or doesn't belong to user {user_id}")
@@ -734,7 +768,7 @@ def perform_short_rest(db: Session, character_id: int, user_id: int, request: Sh
     print(f"  Spent {dice_to_spend} Stamina Dice. Remaining: {character.stamina_points}")
 
     # 2. Лечим ПЗ
-    endurance_mod = character.endurance_mod
+    endurance_mod = character.derived.modifiers['endurance_mod']
     hp_healed = 0
     for _ in range(dice_to_spend):
         roll = random.randint(1, 10)
@@ -755,7 +789,6 @@ def perform_short_rest(db: Session, character_id: int, user_id: int, request: Sh
     # 4. Сохраняем
     try:
         db.commit()
-        db.refresh(character)
         print(f"  Short rest completed and committed.")
         return character
     except Exception as e:
@@ -769,10 +802,7 @@ def perform_long_rest(db: Session, character_id: int, user_id: int) -> Optional[
     print(f"\n--- CRUD: perform_long_rest ---")
     print(f"Character ID: {character_id}, User ID: {user_id}")
 
-    character = db.query(Character).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, MINIMAL)
 
     if not character:
         print(f"  ERROR: Character {character_id} not found or doesn't belong to user {user_id}")
@@ -784,7 +814,7 @@ def perform_long_rest(db: Session, character_id: int, user_id: int) -> Optional[
 
     # 2. Восстанавливаем ОС
     # Считаем максимум ОС = Уровень + Мод.Выносливости (минимум 1)
-    endurance_mod = character.endurance_mod
+    endurance_mod = character.derived.modifiers['endurance_mod']
     max_stamina_points = max(1, character.level)
     character.stamina_points = max_stamina_points
     print(f"  Stamina Points restored to max: {max_stamina_points} (Level {character.level} + EndMod {endurance_mod})")
@@ -803,7 +833,6 @@ def perform_long_rest(db: Session, character_id: int, user_id: int) -> Optional[
     # 5. Сохраняем
     try:
         db.commit()
-        db.refresh(character)
         print(f"  Long rest completed and committed.")
         return character
     except Exception as e:
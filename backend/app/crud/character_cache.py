@@ -0,0 +1,180 @@
+# backend/app/crud/character_cache.py
+"""
+Per-process LRU-кэш собранных CharacterDetailedOut.
+
+Каждому персонажу соответствует монотонно растущая версия. Запись в кэше
+хранит версию, с которой она была собрана; при чтении запись действительна,
+только если её версия совпадает с текущей.
+
+Версии повышаются слушателями сессии SQLAlchemy: после flush собираются id
+персонажей, затронутых изменениями (сам Character, его инвентарь, произвольные
+предметы), а после commit их версии увеличиваются. Так любой CRUD-путь записи
+(статы, инвентарь, экипировка, эффекты, слоты, ход, отдых, действия)
+инвалидирует кэш без явных вызовов. Изменение справочников (предметы,
+способности, статусы) сбрасывает кэш целиком.
+
+Кэш локален для процесса; повышения версий рассылаются остальным воркерам
+через шину WebSocket (on_bump, событие "cache_bump" в websockets/manager.py),
+поэтому запись в одном процессе инвалидирует лист во всех.
+"""
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple, Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models.character import Character, CharacterInventoryItem
+from ..models.custom_item import CharacterCustomItem
+from ..schemas.character import CharacterDetailedOut
+from .reference_catalog import has_reference_changes
+
+CHARACTER_CACHE_SIZE = int(os.getenv("CHARACTER_CACHE_SIZE", "512")) # 0 = кэш выключен
+
+_PENDING_KEY = "character_cache_pending" # ключ в Session.info
+_ALL = "*" # маркер "сбросить всё" (изменились справочники)
+
+
+class CharacterDetailsCache:
+    """LRU: character_id -> (version, owner_id, CharacterDetailedOut)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[int, int, CharacterDetailedOut]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._counter = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Рассылка повышений версий другим процессам (подключает ConnectionManager.start_backplane)
+        self.on_bump: Optional[Callable[[Set[Any]], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def current_version(self, character_id: int) -> int:
+        with self._lock:
+            return self._versions.get(character_id, 0)
+
+    def get(self, character_id: int, user_id: int) -> Optional[CharacterDetailedOut]:
+        """Возвращает схему, если она собрана для текущей версии и принадлежит user_id."""
+        with self._lock:
+            entry = self._entries.get(character_id)
+            if entry is None or entry[0] != self._versions.get(character_id, 0) or entry[1] != user_id:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(character_id)
+            self.hits += 1
+            return entry[2]
+
+    def get_many(self, character_ids: List[int]) -> Dict[int, CharacterDetailedOut]:
+        """Актуальные схемы для нескольких персонажей без проверки владельца (её делает вызывающий код)."""
+        found: Dict[int, CharacterDetailedOut] = {}
+        with self._lock:
+            for cid in character_ids:
+                entry = self._entries.get(cid)
+                if entry is None or entry[0] != self._versions.get(cid, 0):
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(cid)
+                self.hits += 1
+                found[cid] = entry[2]
+        return found
+
+    def put(self, character_id: int, version: int, details: CharacterDetailedOut) -> None:
+        """
+        Сохраняет схему, собранную при версии `version` (прочитанной ДО запроса к БД).
+        Если за время сборки версия успела измениться, запись не сохраняется.
+        """
+        with self._lock:
+            if version != self._versions.get(character_id, 0):
+                return
+            self._entries[character_id] = (version, details.owner_id, details)
+            self._entries.move_to_end(character_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self, character_ids: Set[Any]) -> None:
+        """Повышает версии персонажей (или сбрасывает всё при маркере _ALL)."""
+        with self._lock:
+            if _ALL in character_ids:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                character_ids = set(self._versions.keys()) | {cid for cid in character_ids if cid != _ALL}
+            for cid in character_ids:
+                self._versions[cid] = next(self._counter)
+                if self._entries.pop(cid, None) is not None:
+                    self.invalidations += 1
+
+    def invalidate(self, character_ids: Set[Any]) -> None:
+        """bump() в этом процессе и рассылка той же инвалидации остальным (on_bump)."""
+        self.bump(character_ids)
+        if self.on_bump is not None and self.enabled:
+            self.on_bump(set(character_ids))
+
+    def clear(self) -> None:
+        self.invalidate({_ALL})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "capacity": self.capacity,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "tracked_versions": len(self._versions),
+            }
+
+
+character_details_cache = CharacterDetailsCache(CHARACTER_CACHE_SIZE)
+
+
+def has_pending_changes(db: Session, character_id: int) -> bool:
+    """True, если в сессии есть незакоммиченные изменения, затрагивающие персонажа."""
+    if db.new or db.dirty or db.deleted:
+        return True
+    pending = db.info.get(_PENDING_KEY)
+    return bool(pending) and (character_id in pending or _ALL in pending)
+
+
+# --- Слушатели сессии (регистрируются на классе Session: sync и AsyncSession) ---
+
+def _affected_character_id(obj: Any) -> Any:
+    if isinstance(obj, Character):
+        return obj.id
+    if isinstance(obj, (CharacterInventoryItem, CharacterCustomItem)):
+        return obj.character_id
+    return None
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_characters(session: Session, flush_context) -> None:
+    # В after_flush списки new/dirty/deleted ещё в состоянии "до flush",
+    # а внешние ключи уже проставлены
+    pending: Set[Any] = session.info.setdefault(_PENDING_KEY, set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        cid = _affected_character_id(obj)
+        if cid is not None:
+            pending.add(cid)
+    if has_reference_changes(session):
+        pending.add(_ALL)
+
+@event.listens_for(Session, "after_commit")
+def _bump_versions_on_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        character_details_cache.invalidate(pending)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_on_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
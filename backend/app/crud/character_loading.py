@@ -0,0 +1,106 @@
+# backend/app/crud/character_loading.py
+"""
+Профили загрузки персонажа.
+
+У связей Character нет жадной загрузки по умолчанию (lazy="joined"/"selectin"):
+каждый запрос выбирает профиль — именованный набор связей, нужных вызывающему коду.
+Остальные связи персонажа закрыты raiseload: обращение к незагруженной связи —
+ошибка, а не скрытый запрос.
+
+- minimal — только колонки персонажа: навыки, заметки, отдых, конец хода,
+  снятие экипировки, удаление из инвентаря (предмет грузится отдельным запросом);
+- vitals — + активные состояния: статы (эмоции ПУ), наложение и снятие состояний;
+- combat — + инвентарь с предметами и экипировка: экипировка, действия, проверка навыка;
+- full — + изученные способности, слоты и произвольные предметы: полный лист
+  (CharacterDetailedOut, unit of work), назначение слотов, повышение уровня.
+
+Внутри unit of work (crud/unit_of_work.py) персонаж уже загружен профилем full,
+и профиль, запрошенный CRUD-функцией, запроса не добавляет.
+
+Экипировка — записи того же инвентаря: если инвентарь грузится вместе с ней,
+equipped_* своих запросов не делают (см. relation_options).
+"""
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from ..models.character import Character, CharacterInventoryItem
+from ..models.item import Ammo, Armor, GeneralItem, Shield, Weapon
+
+MINIMAL = "minimal"
+VITALS = "vitals"
+COMBAT = "combat"
+FULL = "full"
+
+_ITEM_CLASSES = (Weapon, Armor, Shield, GeneralItem, Ammo)
+
+
+def inventory_item_options(relationship) -> list:
+    """
+    Загрузка предметов для связи Character -> CharacterInventoryItem: колонки подтипов
+    (joined-наследование) — по одному IN-запросу на подтип, а не отдельным запросом
+    на каждый предмет. Способности оружия догружаются одним IN-запросом связью
+    Weapon.granted_abilities (lazy="selectin") при загрузке подтипа.
+    """
+    return [selectinload(relationship).selectinload(CharacterInventoryItem.item).selectin_polymorphic(_ITEM_CLASSES)]
+
+
+# Связь Character -> опции загрузки (профили и частичный вывод, см. character_serializer.FIELD_RELATIONS)
+RELATION_LOADERS: Dict[str, Callable[[], list]] = {
+    # Инвентарь и экипировка (предметы сразу со способностями оружия);
+    # экипировка без инвентаря (частичный вывод, например total_ac) грузится сама
+    "inventory": lambda: inventory_item_options(Character.inventory),
+    "equipped_armor": lambda: inventory_item_options(Character.equipped_armor),
+    "equipped_shield": lambda: inventory_item_options(Character.equipped_shield),
+    "equipped_weapon1": lambda: inventory_item_options(Character.equipped_weapon1),
+    "equipped_weapon2": lambda: inventory_item_options(Character.equipped_weapon2),
+    # Изученные способности и активные состояния
+    "available_abilities": lambda: [selectinload(Character.available_abilities)],
+    "active_status_effects": lambda: [selectinload(Character.active_status_effects)],
+    "custom_items": lambda: [selectinload(Character.custom_items)],
+    # Способности в слотах: LEFT JOIN по первичному ключу в основном запросе
+    **{f"active_ability_{i}": (lambda attr: lambda: [joinedload(attr)])(getattr(Character, f"active_ability_{i}")) for i in range(1, 6)},
+}
+
+EQUIPMENT_RELATIONS: Tuple[str, ...] = ("equipped_armor", "equipped_shield", "equipped_weapon1", "equipped_weapon2")
+
+
+def relation_options(names: Iterable[str]) -> list:
+    """
+    Опции загрузки набора связей Character. Вместе с "inventory" связи equipped_*
+    не грузятся отдельно: их записи приходят с инвентарем, и many-to-one по ключу
+    берется из identity map без SQL. raiseload(sql_only=True) делает запрос в этом
+    случае ошибкой (экипированный предмет вне инвентаря), а не скрытой загрузкой.
+    """
+    names = sorted(set(names))
+    options: List = []
+    for name in names:
+        if name in EQUIPMENT_RELATIONS and "inventory" in names:
+            options.append(raiseload(getattr(Character, name), sql_only=True))
+        else:
+            options.extend(RELATION_LOADERS[name]())
+    return options
+
+
+_VITALS_RELATIONS: Tuple[str, ...] = ("active_status_effects",)
+_COMBAT_RELATIONS: Tuple[str, ...] = _VITALS_RELATIONS + (
+    "inventory", *EQUIPMENT_RELATIONS,
+)
+CHARACTER_PROFILES: Dict[str, Tuple[str, ...]] = {
+    MINIMAL: (),
+    VITALS: _VITALS_RELATIONS,
+    COMBAT: _COMBAT_RELATIONS,
+    FULL: _COMBAT_RELATIONS + ("available_abilities", *(f"active_ability_{i}" for i in range(1, 6)), "custom_items"),
+}
+
+
+@lru_cache(maxsize=None)
+def character_options(profile: str) -> Tuple:
+    """
+    Опции запроса Character для профиля `profile`: связи профиля + raiseload для
+    остальных. Строятся один раз на профиль (объекты опций неизменяемы).
+    """
+    options = relation_options(CHARACTER_PROFILES[profile])
+    options.append(raiseload("*"))
+    return tuple(options)
@@ -0,0 +1,294 @@
+# backend/app/crud/character_serializer.py
+"""
+Скомпилированный сериализатор CharacterDetailedOut.
+
+Все, что не зависит от конкретного персонажа, вычисляется один раз при импорте:
+список колонок Character, входящих в схему, поля модификаторов навыков,
+TypeAdapter'ы схем предметов/способностей/состояний, построители полей.
+Сборка идет за один проход по загруженному графу (_character_details_options):
+- каждый предмет и каждая способность валидируются один раз за вызов
+  (повторы в инвентаре, слоты и список способностей переиспользуют результат);
+- экипировка ссылается на уже собранные записи инвентаря, а не строит их заново;
+- запись инвентаря собирается без повторной валидации Union AnyItemOut
+  (тип схемы предмета уже выбран по классу модели);
+- итоговая схема валидирует только свои скалярные поля: вложенные схемы
+  уже готовые экземпляры и повторно не проверяются.
+
+Частичный вывод (?fields= / ?sections= в GET /characters/{id}): запрошенные поля
+определяют и связи, которые нужно загрузить (required_loads), и схему ответа
+(partial_schema) — урезанную копию CharacterDetailedOut.
+
+Пакетный вывод (GET /parties/{lobby_key}/characters, POST /characters/batch)
+отдается JSON-массивом по частям (iter_details_json): листы сериализуются по одному.
+"""
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, TypeAdapter, create_model
+from sqlalchemy import inspect as sqlainspect
+
+from ..models.character import Character, CharacterInventoryItem
+from ..models.item import Item, Weapon, Armor, Shield, GeneralItem, Ammo
+from ..schemas.ability import AbilityOut
+from ..schemas.character import (
+    ActiveAbilitySlotOut, CharacterClassBranchLevels, CharacterDetailedOut, CharacterNotes, CharacterSkillModifiers
+)
+from ..schemas.custom_item import CustomItemOut
+from ..schemas.item import CharacterInventoryItemOut, WeaponOut, ArmorOut, ShieldOut, GeneralItemOut, AmmoOut, ItemBase
+from ..schemas.status_effect import StatusEffectOut
+
+# Колонки Character, которые напрямую попадают в CharacterDetailedOut
+CHARACTER_COLUMNS: Tuple[str, ...] = tuple(
+    prop.key for prop in sqlainspect(Character).column_attrs if prop.key in CharacterDetailedOut.model_fields
+)
+SKILL_FIELDS: Tuple[str, ...] = tuple(name for name in CHARACTER_COLUMNS if name.startswith("skill_"))
+SKILL_MODIFIER_FIELDS: Tuple[str, ...] = tuple(CharacterSkillModifiers.model_fields)
+ACTIVE_SLOTS: Tuple[Tuple[str, str, str], ...] = tuple(
+    (f"active_slot_{i}", f"active_ability_{i}", f"active_ability_slot_{i}_cooldown") for i in range(1, 6)
+)
+EQUIPMENT_SLOTS: Tuple[str, ...] = ("equipped_armor", "equipped_shield", "equipped_weapon1", "equipped_weapon2")
+
+_ITEM_ADAPTERS: Dict[type, TypeAdapter] = {
+    Weapon: TypeAdapter(WeaponOut),
+    Armor: TypeAdapter(ArmorOut),
+    Shield: TypeAdapter(ShieldOut),
+    GeneralItem: TypeAdapter(GeneralItemOut),
+    Ammo: TypeAdapter(AmmoOut),
+}
+_ITEM_BASE_ADAPTER = TypeAdapter(ItemBase)
+_ABILITY_ADAPTER = TypeAdapter(AbilityOut)
+_STATUS_EFFECT_ADAPTER = TypeAdapter(StatusEffectOut)
+_CUSTOM_ITEM_ADAPTER = TypeAdapter(CustomItemOut)
+
+
+def _item_adapter(item: Item) -> TypeAdapter:
+    adapter = _ITEM_ADAPTERS.get(type(item))
+    if adapter is None: # Подкласс одной из моделей предметов
+        adapter = next((a for cls, a in _ITEM_ADAPTERS.items() if isinstance(item, cls)), _ITEM_BASE_ADAPTER)
+    return adapter
+
+
+class _GraphSerializer:
+    """Сборка одного персонажа: кэши предметов и способностей живут только в пределах вызова."""
+    __slots__ = ("items", "abilities", "inventory")
+
+    def __init__(self):
+        self.items: Dict[int, Any] = {} # item.id -> схема предмета
+        self.abilities: Dict[int, AbilityOut] = {} # ability.id -> AbilityOut
+        self.inventory: Dict[int, CharacterInventoryItemOut] = {} # inv_item.id -> запись инвентаря
+
+    def ability(self, ability) -> AbilityOut:
+        schema = self.abilities.get(ability.id)
+        if schema is None:
+            schema = self.abilities[ability.id] = _ABILITY_ADAPTER.validate_python(ability, from_attributes=True)
+        return schema
+
+    def inventory_item(self, inv_item: Optional[CharacterInventoryItem]) -> Optional[CharacterInventoryItemOut]:
+        if inv_item is None:
+            return None
+        entry = self.inventory.get(inv_item.id)
+        if entry is not None:
+            return entry
+        item = inv_item.item
+        if item is None:
+            return None
+        item_schema = self.items.get(item.id)
+        if item_schema is None:
+            item_schema = self.items[item.id] = _item_adapter(item).validate_python(item, from_attributes=True)
+        # Схема предмета уже проверена: Union AnyItemOut повторно не разбираем
+        entry = self.inventory[inv_item.id] = CharacterInventoryItemOut.model_construct(
+            id=inv_item.id, item=item_schema, quantity=inv_item.quantity
+        )
+        return entry
+
+
+# --- Построители полей ---
+# Поле схемы -> (персонаж, сборщик графа) -> значение. Поля без построителя копируются getattr'ом.
+FieldBuilder = Callable[[Character, _GraphSerializer], Any]
+
+
+def _equipment_builder(attr: str) -> FieldBuilder:
+    return lambda c, g: g.inventory_item(getattr(c, attr))
+
+
+def _slot_builder(ability_attr: str, cooldown_attr: str) -> FieldBuilder:
+    def build(c: Character, g: _GraphSerializer) -> ActiveAbilitySlotOut:
+        slot_ability = getattr(c, ability_attr)
+        return ActiveAbilitySlotOut(
+            ability=g.ability(slot_ability) if slot_ability else None,
+            cooldown_remaining=getattr(c, cooldown_attr),
+        )
+    return build
+
+
+_FIELD_BUILDERS: Dict[str, FieldBuilder] = {
+    # Производные характеристики — из кэша на экземпляре (Character.derived)
+    "skill_modifiers": lambda c, g: CharacterSkillModifiers.model_construct(**c.derived.modifiers),
+    "initiative_bonus": lambda c, g: c.derived.initiative_bonus,
+    "base_ac": lambda c, g: c.derived.base_ac,
+    "total_ac": lambda c, g: c.derived.total_ac,
+    "passive_attention": lambda c, g: c.derived.passive_attention,
+    "xp_needed_for_next_level": lambda c, g: c.derived.xp_needed_for_next_level,
+    "inventory": lambda c, g: [entry for entry in map(g.inventory_item, c.inventory) if entry is not None],
+    "available_abilities": lambda c, g: [g.ability(ab) for ab in c.available_abilities if ab],
+    "active_status_effects": lambda c, g: [
+        _STATUS_EFFECT_ADAPTER.validate_python(se, from_attributes=True) for se in c.active_status_effects if se
+    ],
+    "custom_items": lambda c, g: [_CUSTOM_ITEM_ADAPTER.validate_python(ci, from_attributes=True) for ci in c.custom_items],
+    # Только для частичного вывода: кулдауны слотов 1-5 без самих способностей
+    "active_slot_cooldowns": lambda c, g: [getattr(c, cooldown_attr) for _, _, cooldown_attr in ACTIVE_SLOTS],
+}
+_FIELD_BUILDERS.update({slot: _equipment_builder(slot) for slot in EQUIPMENT_SLOTS})
+_FIELD_BUILDERS.update({slot_key: _slot_builder(ability_attr, cooldown_attr) for slot_key, ability_attr, cooldown_attr in ACTIVE_SLOTS})
+
+# Полный вывод: порядок полей схемы, построители разрешены заранее
+_FULL_PLAN: Tuple[Tuple[str, Optional[FieldBuilder]], ...] = tuple(
+    (name, _FIELD_BUILDERS.get(name)) for name in CharacterDetailedOut.model_fields
+)
+
+
+def _build(db_char: Character, plan) -> Dict[str, Any]:
+    graph = _GraphSerializer()
+    return {name: builder(db_char, graph) if builder is not None else getattr(db_char, name) for name, builder in plan}
+
+
+def serialize_character(db_char: Character) -> CharacterDetailedOut:
+    """Собирает CharacterDetailedOut из персонажа с загруженным графом. Ошибки валидации пробрасываются."""
+    return CharacterDetailedOut.model_validate(_build(db_char, _FULL_PLAN))
+
+
+# --- Частичный вывод ---
+# Поля, которых нет в CharacterDetailedOut: (аннотация, значение по умолчанию) для create_model
+PARTIAL_EXTRA_FIELDS: Dict[str, Tuple[Any, Any]] = {
+    "active_slot_cooldowns": (List[int], ...),
+}
+PARTIAL_FIELDS: Tuple[str, ...] = tuple(CharacterDetailedOut.model_fields) + tuple(PARTIAL_EXTRA_FIELDS)
+
+CHARACTER_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    "core": ("id", "name", "level", "experience_points", "owner_id", "xp_needed_for_next_level"),
+    "vitals": (
+        "max_hp", "current_hp", "base_pu", "current_pu", "stamina_points", "exhaustion_level",
+        "has_used_main_action", "has_used_bonus_action", "has_used_reaction", "active_slot_cooldowns",
+    ),
+    "skills": SKILL_FIELDS + ("skill_modifiers",),
+    "branches": tuple(CharacterClassBranchLevels.model_fields),
+    "combat": ("speed", "initiative_bonus", "base_ac", "total_ac", "passive_attention"),
+    "inventory": ("inventory",) + EQUIPMENT_SLOTS,
+    "abilities": ("available_abilities",) + tuple(slot_key for slot_key, _, _ in ACTIVE_SLOTS),
+    "effects": ("active_status_effects",),
+    "custom_items": ("custom_items",),
+    "notes": tuple(CharacterNotes.model_fields),
+}
+
+# Поле -> связи Character, без которых его не собрать
+FIELD_RELATIONS: Dict[str, Tuple[str, ...]] = {
+    "inventory": ("inventory",),
+    **{slot: (slot,) for slot in EQUIPMENT_SLOTS},
+    "total_ac": ("equipped_armor", "equipped_shield", "active_status_effects"),
+    "available_abilities": ("available_abilities",),
+    **{slot_key: (ability_attr,) for slot_key, ability_attr, _ in ACTIVE_SLOTS},
+    "active_status_effects": ("active_status_effects",),
+    "custom_items": ("custom_items",),
+}
+# Поле -> колонки Character, из которых оно считается (по умолчанию — одноименная колонка)
+FIELD_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    # Модификаторы в Character.derived считаются по всем навыкам сразу
+    "skill_modifiers": SKILL_FIELDS,
+    "initiative_bonus": SKILL_FIELDS,
+    "base_ac": SKILL_FIELDS,
+    "total_ac": SKILL_FIELDS,
+    "passive_attention": SKILL_FIELDS,
+    "xp_needed_for_next_level": ("level",),
+    "active_slot_cooldowns": tuple(cooldown_attr for _, _, cooldown_attr in ACTIVE_SLOTS),
+}
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def resolve_character_fields(fields: Optional[str], sections: Optional[str]) -> Optional[FrozenSet[str]]:
+    """
+    Разбирает ?fields=a,b и ?sections=vitals,inventory в набор полей ответа.
+    None — частичный вывод не запрошен (полный CharacterDetailedOut). id включается всегда.
+    """
+    field_names, section_names = _split(fields), _split(sections)
+    if not field_names and not section_names:
+        return None
+    unknown_sections = [name for name in section_names if name not in CHARACTER_SECTIONS]
+    unknown_fields = [name for name in field_names if name not in PARTIAL_FIELDS]
+    if unknown_sections or unknown_fields:
+        detail = []
+        if unknown_sections:
+            detail.append(f"Неизвестные секции: {', '.join(unknown_sections)} (доступны: {', '.join(CHARACTER_SECTIONS)})")
+        if unknown_fields:
+            detail.append(f"Неизвестные поля: {', '.join(unknown_fields)}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="; ".join(detail))
+    selected = {"id", *field_names}
+    for name in section_names:
+        selected.update(CHARACTER_SECTIONS[name])
+    return frozenset(selected)
+
+
+def required_loads(fields: FrozenSet[str]) -> Tuple[FrozenSet[str], Optional[Tuple[str, ...]]]:
+    """
+    Что загрузить для набора полей: (связи Character, колонки).
+    Колонки возвращаются только если связи не нужны (узкий запрос load_only);
+    иначе None — грузятся все колонки (нужны внешние ключи связей).
+    """
+    relations = frozenset(rel for name in fields for rel in FIELD_RELATIONS.get(name, ()))
+    if relations:
+        return relations, None
+    columns = {col for name in fields for col in FIELD_COLUMNS.get(name, (name,))}
+    return relations, tuple(sorted(columns))
+
+
+def _ordered(fields: FrozenSet[str]) -> Tuple[str, ...]:
+    return tuple(name for name in PARTIAL_FIELDS if name in fields)
+
+
+@lru_cache(maxsize=128)
+def partial_schema(fields: FrozenSet[str]) -> Type[BaseModel]:
+    """Урезанная копия CharacterDetailedOut только с запрошенными полями (одна модель на набор полей)."""
+    definitions: Dict[str, Any] = {}
+    for name in _ordered(fields):
+        if name in PARTIAL_EXTRA_FIELDS:
+            definitions[name] = PARTIAL_EXTRA_FIELDS[name]
+        else:
+            info = CharacterDetailedOut.model_fields[name]
+            definitions[name] = (info.annotation, info)
+    return create_model("CharacterPartialOut", **definitions)
+
+
+@lru_cache(maxsize=128)
+def _partial_plan(fields: FrozenSet[str]) -> Tuple[Tuple[str, Optional[FieldBuilder]], ...]:
+    return tuple((name, _FIELD_BUILDERS.get(name)) for name in _ordered(fields))
+
+
+def serialize_character_fields(db_char: Character, fields: FrozenSet[str]) -> BaseModel:
+    """Собирает только запрошенные поля персонажа (связи загружены по required_loads)."""
+    return partial_schema(fields).model_validate(_build(db_char, _partial_plan(fields)))
+
+
+def partial_from_details(details: CharacterDetailedOut, fields: FrozenSet[str]) -> BaseModel:
+    """Частичный вывод из уже собранного CharacterDetailedOut (например, из кэша) — без запросов к БД."""
+    data: Dict[str, Any] = {}
+    for name in _ordered(fields):
+        if name == "active_slot_cooldowns":
+            data[name] = [getattr(details, slot_key).cooldown_remaining for slot_key, _, _ in ACTIVE_SLOTS]
+        else:
+            data[name] = getattr(details, name)
+    return partial_schema(fields).model_validate(data)
+
+
+def iter_details_json(details: Iterable[CharacterDetailedOut]) -> Iterator[bytes]:
+    """
+    JSON-массив CharacterDetailedOut по частям, по листу на чанк: в памяти не
+    собирается ни общий список словарей, ни весь ответ целиком.
+    """
+    separator = b"["
+    for item in details:
+        yield separator + item.model_dump_json().encode()
+        separator = b","
+    yield b"]" if separator == b"," else b"[]"
@@ -1,10 +1,12 @@
 # backend/app/crud/character_slots.py
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from typing import Optional
 import json # <-- Импортируем json для парсинга требований
 
 from .. import models, schemas
+from .unit_of_work import get_owned_character
+from .character_loading import FULL
 import logging
 
 logger = logging.getLogger(__name__)
@@ -39,12 +41,7 @@ def assign_ability_to_slot(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный номер слота (должен быть от 1 до 5)")
 
     # Загружаем персонажа со списком доступных способностей
-    character = db.query(models.Character).options(
-        selectinload(models.Character.available_abilities)
-    ).filter(
-        models.Character.id == character_id,
-        models.Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, FULL)
 
     if not character:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Персонаж не найден или не принадлежит вам")
@@ -137,12 +134,6 @@ def assign_ability_to_slot(
     try:
         db.add(character) # Помечаем для сохранения
         db.commit()
-        db.refresh(character)
-        # Обновим конкретные связи для слотов, чтобы они подтянулись
-        db.refresh(character, attribute_names=[
-            'active_ability_1', 'active_ability_2', 'active_ability_3',
-            'active_ability_4', 'active_ability_5'
-        ])
         logger.info(f"Character {character_id}: Slot {slot_number} updated with ability ID {ability_id}")
         return character
     except Exception as e:
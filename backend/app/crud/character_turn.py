@@ -4,6 +4,8 @@ from fastapi import HTTPException, status
 from typing import Optional
 
 from .. import models
+from .unit_of_work import get_owned_character
+from .character_loading import MINIMAL
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,10 +20,7 @@ def end_character_turn(
     - Уменьшает активные кулдауны способностей в слотах.
     - Сбрасывает флаги использованных действий (основное, бонусное, реакция).
     """
-    character = db.query(models.Character).filter(
-        models.Character.id == character_id,
-        models.Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, MINIMAL)
 
     if not character:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Персонаж не найден или не принадлежит вам")
@@ -59,7 +58,6 @@ def end_character_turn(
         try:
             db.add(character) # Помечаем для сохранения
             db.commit()
-            db.refresh(character)
             logger.info(f"Character {character_id}: Turn ended, cooldowns/actions updated.")
         except Exception as e:
             db.rollback()
@@ -0,0 +1,38 @@
+# backend/app/crud/chat.py
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+
+from ..models.chat import ChatMessage
+from ..schemas.chat import ChatHistoryOut, ChatMessageOut
+
+CHAT_HISTORY_MAX_LIMIT = 200
+
+def save_chat_messages(db: Session, messages: List[Dict[str, Any]]) -> int:
+    """
+    Сохраняет пачку сообщений одним INSERT (executemany) и коммитит.
+    messages: [{"lobby_key", "sender", "text", "created_at"}, ...]. Возвращает число строк.
+    """
+    if not messages:
+        return 0
+    db.execute(insert(ChatMessage), messages)
+    db.commit()
+    return len(messages)
+
+
+def get_chat_history(db: Session, lobby_key: str, before_id: Optional[int] = None, limit: int = 50) -> ChatHistoryOut:
+    """
+    Страница истории чата лобби (keyset по id, от новых к старым).
+    Следующая страница — before_id=next_before_id; OFFSET не используется.
+    """
+    limit = max(1, min(limit, CHAT_HISTORY_MAX_LIMIT))
+    query = db.query(ChatMessage.id, ChatMessage.sender, ChatMessage.text, ChatMessage.created_at).filter(ChatMessage.lobby_key == lobby_key)
+    if before_id is not None:
+        query = query.filter(ChatMessage.id < before_id)
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return ChatHistoryOut(
+        messages=[ChatMessageOut(id=row.id, sender=row.sender, text=row.text, created_at=row.created_at) for row in rows],
+        next_before_id=rows[-1].id if has_more else None,
+    )
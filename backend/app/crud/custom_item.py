@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from .. import models, schemas
 from ..models.character import Character # Для проверки владельца
+from .unit_of_work import loaded_character
 
 def get_character_custom_items(db: Session, character_id: int, user_id: int) -> List[models.CharacterCustomItem]:
     """Получает все произвольные предметы для персонажа пользователя."""
@@ -20,7 +21,7 @@ def get_character_custom_items(db: Session, character_id: int, user_id: int) ->
 
 def add_custom_item(db: Session, character_id: int, user_id: int, item_in: schemas.CustomItemCreate) -> Optional[models.CharacterCustomItem]:
     """Добавляет произвольный предмет персонажу. Если предмет с таким именем уже есть, увеличивает количество."""
-    character = db.query(models.Character.id).filter(
+    character = loaded_character(db, character_id, user_id) or db.query(models.Character.id).filter(
         models.Character.id == character_id,
         models.Character.owner_id == user_id
     ).first()
@@ -46,7 +47,6 @@ def add_custom_item(db: Session, character_id: int, user_id: int, item_in: schem
 
     try:
         db.commit()
-        db.refresh(db_item)
         return db_item
     except Exception as e:
         db.rollback()
@@ -6,6 +6,8 @@ from typing import Optional
 from ..models.character import Character, CharacterInventoryItem
 from ..models.item import Item, Weapon, Armor, Shield, GeneralItem, Ammo
 from ..schemas.item import AddItemToInventory, EquipItem
+from .unit_of_work import get_owned_character, loaded_character
+from .character_loading import COMBAT, MINIMAL
 
 # --- Inventory Operations ---
 
@@ -14,6 +16,9 @@ def get_inventory_item(db: Session, inventory_item_id: int, character_id: int, u
     Получает конкретный предмет инвентаря персонажа с загруженным объектом Item.
     Проверяет принадлежность персонажа пользователю.
     """
+    character = loaded_character(db, character_id, user_id)
+    if character is not None: # unit of work: инвентарь уже загружен вместе с предметами
+        return next((row for row in character.inventory if row.id == inventory_item_id), None)
     return db.query(CharacterInventoryItem).join(
         Character, Character.id == CharacterInventoryItem.character_id
     ).options(
@@ -36,7 +41,7 @@ def add_item_to_inventory(db: Session, character_id: int, user_id: int, item_add
     print(f"\n--- CRUD: add_item_to_inventory (v2 - with initial uses) ---")
     print(f"Character ID: {character_id}, User ID: {user_id}, Item Add Data: {item_add}")
 
-    character = db.query(Character.id).filter(
+    character = loaded_character(db, character_id, user_id) or db.query(Character.id).filter(
         Character.id == character_id,
         Character.owner_id == user_id
     ).first()
@@ -99,8 +104,6 @@ def add_item_to_inventory(db: Session, character_id: int, user_id: int, item_add
     # --- Коммит и возврат ---
     try:
         db.commit()
-        db.refresh(db_inv_item)
-        db.refresh(db_inv_item, attribute_names=['item'])
         print(f"  Successfully committed. Returning Inventory Item ID: {db_inv_item.id}, Quantity: {db_inv_item.quantity}, Item Type: {db_inv_item.item.item_type}")
         return db_inv_item
     except Exception as e:
@@ -118,7 +121,7 @@ def remove_item_from_inventory(db: Session, inventory_item_id: int, character_id
         return False # Предмет не найден или не принадлежит персонажу
 
     # Загружаем персонажа, чтобы снять предмет с экипировки, если удаляется последняя единица
-    character = db.query(Character).filter(Character.id == character_id).first()
+    character = get_owned_character(db, character_id, user_id, MINIMAL)
     if not character:
         return False # Неожиданная ошибка, персонаж должен существовать
 
@@ -159,17 +162,8 @@ def equip_item(db: Session, character_id: int, user_id: int, equip_data: EquipIt
     if not inv_item or inv_item.quantity == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Предмет инвентаря не найден или количество 0")
 
-    # Получаем персонажа с загруженной экипировкой для проверок
-    # Загружаем через selectinload для проверок, хотя можно было бы и через backref, если настроено
-    character = db.query(Character).options(
-        selectinload(Character.equipped_armor).selectinload(CharacterInventoryItem.item),
-        selectinload(Character.equipped_shield).selectinload(CharacterInventoryItem.item),
-        selectinload(Character.equipped_weapon1).selectinload(CharacterInventoryItem.item.of_type(Weapon)), # Важно для проверки is_two_handed
-        selectinload(Character.equipped_weapon2).selectinload(CharacterInventoryItem.item.of_type(Weapon))
-    ).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    # Получаем персонажа с экипировкой для проверок (в unit of work — уже загруженный граф)
+    character = get_owned_character(db, character_id, user_id, COMBAT)
 
     if not character:
         # Эта проверка дублируется в get_inventory_item, но для надежности
@@ -243,7 +237,6 @@ def equip_item(db: Session, character_id: int, user_id: int, equip_data: EquipIt
 
     try:
         db.commit()
-        db.refresh(character) # Обновляем объект персонажа
         return character
     except Exception as e:
         db.rollback()
@@ -254,10 +247,7 @@ def equip_item(db: Session, character_id: int, user_id: int, equip_data: EquipIt
 def unequip_item(db: Session, character_id: int, user_id: int, slot: str) -> Optional[Character]:
     """Снимает предмет с указанного слота экипировки."""
     # Проверяем владельца
-    character = db.query(Character).filter(
-        Character.id == character_id,
-        Character.owner_id == user_id
-    ).first()
+    character = get_owned_character(db, character_id, user_id, MINIMAL)
 
     if not character:
         return None # Персонаж не найден
@@ -280,7 +270,6 @@ def unequip_item(db: Session, character_id: int, user_id: int, slot: str) -> Opt
 
     try:
         db.commit()
-        db.refresh(character)
         return character
     except Exception as e:
         db.rollback()
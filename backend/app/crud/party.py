@@ -6,6 +6,7 @@ import random
 import string
 
 from ..models.party import Party
+from ..models.association_tables import party_members
 from ..models.user import User # Нужна для проверки party.creator
 from ..schemas.party import PartyCreate, PartyOut
 
@@ -54,4 +55,20 @@ def get_party_by_lobby_key(db: Session, lobby_key: str) -> Optional[Party]:
     # Сразу загружаем создателя, чтобы он был доступен в вызывающем коде
     return db.query(Party).options(
         selectinload(Party.creator)
-    ).filter(Party.lobby_key == lobby_key).first()
\ No newline at end of file
+    ).filter(Party.lobby_key == lobby_key).first()
+
+
+def add_party_member(db: Session, party_id: int, user_id: int) -> None:
+    """Запоминает пользователя участником партии (повторный вход ничего не меняет)."""
+    if is_party_member(db, party_id, user_id):
+        return
+    db.execute(party_members.insert().values(party_id=party_id, user_id=user_id))
+    db.commit()
+
+
+def is_party_member(db: Session, party_id: int, user_id: int) -> bool:
+    """True, если пользователь присоединялся к партии (создатель сюда не записывается)."""
+    return db.query(party_members.c.party_id).filter(
+        party_members.c.party_id == party_id,
+        party_members.c.user_id == user_id
+    ).first() is not None
@@ -0,0 +1,176 @@
+# backend/app/crud/reference_catalog.py
+"""
+Неизменяемый in-memory каталог справочников для /data эндпоинтов.
+
+Каталог строится один раз (при старте приложения или лениво при первом
+запросе) из crud/reference.py: каждая таблица сразу сериализуется в готовое
+JSON-тело (bytes) со строгим ETag (sha256 тела). Эндпоинты отдают эти байты
+без запросов к БД и без повторной сериализации, а на If-None-Match с
+совпадающим ETag отвечают 304.
+
+Инвалидация: `reference_catalog.invalidate()` (явный хук, есть админ-эндпоинт)
+и автоматически после commit, в котором менялись предметы/способности/статусы.
+Следующий запрос перестраивает каталог целиком. Каталог локален для процесса;
+инвалидация рассылается остальным воркерам через шину WebSocket (on_invalidate,
+событие "catalog_invalidate" в websockets/manager.py).
+"""
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from . import reference as reference_crud
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """Готовый ответ для одного справочника."""
+    body: bytes
+    etag: str # строгий ETag в кавычках: "..."
+    count: int
+
+
+# имя справочника -> (загрузчик из БД, схема элемента)
+_CATALOG_SOURCES: Dict[str, Tuple[Callable[[Session], List[Any]], Any]] = {
+    "weapons": (lambda db: reference_crud.get_all_items(db, models.Weapon), schemas.WeaponOut),
+    "armor": (lambda db: reference_crud.get_all_items(db, models.Armor), schemas.ArmorOut),
+    "shields": (lambda db: reference_crud.get_all_items(db, models.Shield), schemas.ShieldOut),
+    "general_items": (lambda db: reference_crud.get_all_items(db, models.GeneralItem), schemas.GeneralItemOut),
+    "ammo": (lambda db: reference_crud.get_all_items(db, models.Ammo), schemas.AmmoOut),
+    "abilities": (reference_crud.get_all_abilities, schemas.AbilityOut),
+    "status_effects": (reference_crud.get_all_status_effects, schemas.StatusEffectOut),
+}
+_ADAPTERS: Dict[str, TypeAdapter] = {name: TypeAdapter(List[schema]) for name, (_, schema) in _CATALOG_SOURCES.items()}
+
+
+def _make_entry(adapter: TypeAdapter, rows: List[Any]) -> CatalogEntry:
+    validated = adapter.validate_python(rows, from_attributes=True)
+    body = adapter.dump_json(validated, by_alias=True)
+    return CatalogEntry(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"', count=len(validated))
+
+
+class ReferenceCatalog:
+    def __init__(self):
+        self._entries: Optional[Mapping[str, CatalogEntry]] = None
+        self._generation = 0 # растёт при каждой инвалидации
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.invalidations = 0
+        # Рассылка инвалидации другим процессам (подключает ConnectionManager.start_backplane)
+        self.on_invalidate: Optional[Callable[[], None]] = None
+
+    @property
+    def is_built(self) -> bool:
+        return self._entries is not None
+
+    def build(self, db: Session) -> Mapping[str, CatalogEntry]:
+        """Синхронная сборка каталога (вызывать через run_sync для AsyncSession)."""
+        with self._lock:
+            generation = self._generation
+        entries = {
+            name: _make_entry(_ADAPTERS[name], loader(db))
+            for name, (loader, _) in _CATALOG_SOURCES.items()
+        }
+        frozen = MappingProxyType(entries)
+        with self._lock:
+            # Если во время сборки была инвалидация, результат устарел — не публикуем
+            if generation == self._generation:
+                self._entries = frozen
+                self._built_at = time.time()
+                self.rebuilds += 1
+        logger.info(f"Reference catalog built: { {k: v.count for k, v in entries.items()} }")
+        return frozen
+
+    async def get_entry(self, name: str, db: AsyncSession) -> CatalogEntry:
+        """Возвращает готовый ответ справочника, при необходимости перестраивая каталог."""
+        entries = self._entries
+        if entries is None:
+            # Параллельные первые запросы могут собрать каталог дважды — это безвредно
+            entries = await db.run_sync(self.build)
+        return entries[name]
+
+    def reset(self) -> None:
+        """Сбрасывает каталог только в этом процессе: следующий запрос перестроит его."""
+        with self._lock:
+            self._entries = None
+            self._generation += 1
+            self.invalidations += 1
+        logger.info("Reference catalog invalidated.")
+
+    def invalidate(self) -> None:
+        """Явный хук инвалидации: reset() здесь и рассылка остальным воркерам (on_invalidate)."""
+        self.reset()
+        if self.on_invalidate is not None:
+            self.on_invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries
+        return {
+            "built": entries is not None,
+            "built_at": self._built_at,
+            "rebuilds": self.rebuilds,
+            "invalidations": self.invalidations,
+            "tables": {k: {"count": v.count, "etag": v.etag, "bytes": len(v.body)} for k, v in entries.items()} if entries else {},
+        }
+
+
+reference_catalog = ReferenceCatalog()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Сравнение для If-None-Match (RFC 9110: слабое сравнение, поддержка '*')."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# --- Автоматическая инвалидация при изменении справочников ---
+_DIRTY_KEY = "reference_catalog_dirty"
+
+REFERENCE_MODELS = (models.Item, models.Ability, models.StatusEffect)
+
+def has_reference_changes(session: Session) -> bool:
+    """
+    True, если flush меняет строки справочников. "Грязные" объекты учитываются
+    только при изменении колонок: добавление способности/статуса персонажу
+    помечает Ability/StatusEffect как dirty через коллекции, но сам справочник
+    не меняет.
+    """
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, REFERENCE_MODELS):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, REFERENCE_MODELS) and session.is_modified(obj, include_collections=False):
+            return True
+    return False
+
+@event.listens_for(Session, "after_flush")
+def _mark_reference_changes(session: Session, flush_context) -> None:
+    if has_reference_changes(session):
+        session.info[_DIRTY_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    if session.info.pop(_DIRTY_KEY, False):
+        reference_catalog.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_KEY, None)
@@ -116,7 +116,7 @@ def perform_skill_check(
             roll_detail_str="Ошибка: Неизвестный навык"  # Или просто message
         ) # Возвращаем ошибку
 
-    base_modifier_value = getattr(character, mod_attribute, 0)
+    base_modifier_value = character.derived.modifiers.get(mod_attribute, 0)
     logger.debug(f"  Base Modifier ({mod_attribute}): {base_modifier_value}")
 
     # 2. Определение числового модификатора от ЭФФЕКТОВ
@@ -0,0 +1,142 @@
+# backend/app/crud/unit_of_work.py
+"""
+Unit of work для мутаций персонажа.
+
+Граф деталей персонажа (профиль full) загружается один раз в начале
+операции. CRUD-функции берут персонажа через get_owned_character: внутри unit of
+work это попадание в identity map сессии, без запроса. После commit граф не
+сбрасывается (expire_on_commit выключен на время операции) и не перечитывается
+(db.refresh не нужен): строки, добавленные или удаленные через db.add/db.delete,
+и ссылки, измененные через внешние ключи (слоты экипировки и способностей),
+переносятся в граф по итогам flush (sync). Этот же граф затем сериализуется.
+
+Версия кэша деталей фиксируется в момент commit операции (слушатель after_commit
+ниже регистрируется после слушателя character_cache — модуль импортируется раньше),
+поэтому собранный лист можно положить в кэш: если после нашего commit персонажа
+успел изменить кто-то еще, put() запись отклонит.
+"""
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.base import instance_dict
+
+from .character_cache import character_details_cache
+from .character_loading import MINIMAL, character_options
+from ..models.ability import Ability
+from ..models.character import Character, CharacterInventoryItem
+from ..models.custom_item import CharacterCustomItem
+from ..models.item import Item
+
+_UOW_KEY = "character_unit_of_work" # ключ в Session.info
+
+# Коллекции персонажа, в которые CRUD добавляет/удаляет строки напрямую через сессию
+_OWNED_COLLECTIONS: Tuple[Tuple[str, type], ...] = (
+    ("inventory", CharacterInventoryItem),
+    ("custom_items", CharacterCustomItem),
+)
+# Ссылки "многие-к-одному", которые CRUD меняет через внешний ключ: (связь, колонка FK, модель)
+_FK_REFERENCES: Tuple[Tuple[str, str, type], ...] = (
+    ("equipped_armor", "armor_inv_item_id", CharacterInventoryItem),
+    ("equipped_shield", "shield_inv_item_id", CharacterInventoryItem),
+    ("equipped_weapon1", "weapon1_inv_item_id", CharacterInventoryItem),
+    ("equipped_weapon2", "weapon2_inv_item_id", CharacterInventoryItem),
+    *((f"active_ability_{i}", f"active_ability_slot_{i}_id", Ability) for i in range(1, 6)),
+)
+
+
+def get_owned_character(db: Session, character_id: int, user_id: int, profile: str = MINIMAL) -> Optional[Character]:
+    """
+    Персонаж пользователя для изменения. В unit of work — уже загруженный граф
+    (identity map, без запроса), иначе — SELECT по первичному ключу со связями
+    профиля `profile` (crud/character_loading.py): вызывающий код указывает самый
+    дешевый профиль, которого ему достаточно.
+    """
+    character = db.get(Character, character_id, options=character_options(profile))
+    if character is None or character.owner_id != user_id:
+        return None
+    return character
+
+
+def loaded_character(db: Session, character_id: int, user_id: int) -> Optional[Character]:
+    """
+    Персонаж текущего unit of work, если операция идет над ним (граф со всеми
+    коллекциями уже в сессии), иначе None — тогда CRUD делает свой узкий запрос.
+    """
+    uow = db.info.get(_UOW_KEY)
+    if uow is None or uow.character.id != character_id or uow.character.owner_id != user_id:
+        return None
+    return uow.character
+
+
+class CharacterUnitOfWork:
+    """
+    Состояние одной операции: загруженный персонаж, строки, добавленные/удаленные
+    во flush, и версия кэша деталей (`version` — прочитанная ДО загрузки графа,
+    после каждого commit — версия, выставленная этим commit).
+    """
+
+    def __init__(self, db: Session, character: Character, version: int):
+        self.db = db
+        self.character = character
+        self.version = version
+        self.added: List[Any] = []
+        self.deleted: List[Any] = []
+        self._expire_on_commit = db.expire_on_commit
+
+    def __enter__(self) -> "CharacterUnitOfWork":
+        self.db.info[_UOW_KEY] = self
+        self.db.expire_on_commit = False
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.db.info.pop(_UOW_KEY, None)
+        self.db.expire_on_commit = self._expire_on_commit
+        if exc_type is not None:
+            # Незакоммиченные изменения графа (например, валидация после частичной мутации) не должны остаться в сессии
+            self.db.rollback()
+
+    def sync(self) -> Character:
+        """Переносит в граф изменения, сделанные в обход связей персонажа. Без запросов к БД."""
+        character = self.character
+        loaded = instance_dict(character)
+        for attr, model in _OWNED_COLLECTIONS:
+            if attr not in loaded:
+                continue
+            current = loaded[attr]
+            rows = [row for row in current if row not in self.deleted]
+            rows.extend(
+                row for row in self.added
+                if isinstance(row, model) and row.character_id == character.id and row not in rows
+            )
+            if len(rows) != len(current) or any(a is not b for a, b in zip(rows, current)):
+                rows.sort(key=lambda row: (row.name, row.id) if attr == "custom_items" else row.id) # order_by связей
+                set_committed_value(character, attr, rows)
+        for row in self.added:
+            if isinstance(row, CharacterInventoryItem) and "item" not in instance_dict(row):
+                set_committed_value(row, "item", self.db.get(Item, row.item_id))
+        for attr, fk_attr, model in _FK_REFERENCES:
+            if attr not in loaded:
+                continue
+            target_id = getattr(character, fk_attr)
+            current = loaded[attr]
+            if (current.id if current is not None else None) != target_id:
+                set_committed_value(character, attr, self.db.get(model, target_id) if target_id is not None else None)
+        character.invalidate_derived() # set_committed_value не вызывает событий сброса
+        return character
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_rows(session: Session, flush_context) -> None:
+    uow = session.info.get(_UOW_KEY)
+    if uow is not None:
+        uow.added.extend(session.new)
+        uow.deleted.extend(session.deleted)
+
+
+@event.listens_for(Session, "after_commit")
+def _record_committed_version(session: Session) -> None:
+    uow = session.info.get(_UOW_KEY)
+    if uow is not None:
+        uow.version = character_details_cache.current_version(uow.character.id)
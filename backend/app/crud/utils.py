@@ -7,6 +7,7 @@ from typing import Optional, Dict, Any, Tuple, Literal, List
 
 # Импортируем модели напрямую, т.к. utils не должен зависеть от других crud модулей
 from .. import models, schemas # schemas нужен для VALID_BRANCH_KEYS
+from ..models.character import skill_modifier
 import logging
 
 logger = logging.getLogger(__name__)
@@ -178,8 +179,8 @@ def _parse_and_roll(formula: str, character: models.Character) -> Tuple[int, str
         sign = skill_mod_match.group(1)
         mod_key_short = skill_mod_match.group(2)
         mod_attr = SKILL_MODIFIER_MAP.get(mod_key_short)
-        if mod_attr and hasattr(character, mod_attr):
-            mod_value = getattr(character, mod_attr)
+        mod_value = character.derived.modifiers.get(mod_attr) if mod_attr else None
+        if mod_value is not None:
             if sign == '+':
                 total_result += mod_value
                 details_list.append(f"+{mod_value}(Мод.{mod_key_short})")
@@ -197,13 +198,8 @@ def _parse_and_roll(formula: str, character: models.Character) -> Tuple[int, str
 
 # --- Вспомогательные функции ---
 def _get_skill_modifier(skill_level: int) -> int:
-    """Рассчитывает модификатор навыка по уровню."""
-    if skill_level <= 1: return 0
-    if skill_level <= 3: return 1
-    if skill_level <= 5: return 2
-    if skill_level <= 7: return 3
-    if skill_level <= 9: return 4
-    return 5 # Для 10
+    """Рассчитывает модификатор навыка по уровню (таблица SKILL_MODIFIER_TABLE)."""
+    return skill_modifier(skill_level)
 
 def _calculate_initial_hp(endurance_mod: int) -> int:
     """Рассчитывает начальные ПЗ."""
@@ -254,47 +250,8 @@ def _update_character_available_abilities(db: Session, character: models.Charact
         # Не делаем flush/commit здесь, это должно происходить в вызывающей функции
 
 def _calculate_total_ac(character: models.Character) -> int:
-    """Рассчитывает итоговый AC с учетом брони, щита и статус-эффектов."""
-    dex_mod = character.dexterity_mod
-    ac_from_armor = 10 + dex_mod # Базовый AC
-
-    # Расчет AC от брони (существующая логика без изменений)
-    if character.equipped_armor and isinstance(character.equipped_armor.item, models.Armor):
-        armor = character.equipped_armor.item
-        base_armor_ac = armor.ac_bonus
-        max_dex = 99
-        if armor.armor_type == 'Средняя':
-            max_dex = armor.max_dex_bonus if armor.max_dex_bonus is not None else 2
-            ac_from_armor = base_armor_ac + min(dex_mod, max_dex)
-        elif armor.armor_type == 'Тяжёлая':
-            ac_from_armor = base_armor_ac
-        elif armor.armor_type == 'Лёгкая':
-             max_dex = armor.max_dex_bonus if armor.max_dex_bonus is not None else 99
-             ac_from_armor = base_armor_ac + min(dex_mod, max_dex)
-        else: # Если тип брони неизвестен или "Нет", считаем как без брони
-             ac_from_armor = 10 + dex_mod # Используем базовый AC
-
-    total_ac = ac_from_armor
-
-    # Добавление бонуса от щита (существующая логика без изменений)
-    if character.equipped_shield and isinstance(character.equipped_shield.item, models.Shield):
-        total_ac += character.equipped_shield.item.ac_bonus
-
-    # --- НОВОЕ: Учет модификаторов от статус-эффектов ---
-    # Убедимся, что эффекты загружены. Если нет, возможно, их нужно загрузить здесь
-    # или передавать в функцию. Предполагаем, что они доступны в character.active_status_effects
-    if character.active_status_effects:
-        ac_mod_from_effects = sum(
-            effect.ac_modifier for effect in character.active_status_effects
-            if effect.ac_modifier is not None
-        )
-        total_ac += ac_mod_from_effects
-        # Логирование для отладки (опционально)
-        if ac_mod_from_effects != 0:
-             logger.debug(f"Applying AC modifier from status effects: {ac_mod_from_effects}. New Total AC (before final): {total_ac}")
-    # --- КОНЕЦ НОВОГО БЛОКА ---
-
-    return total_ac
+    """Итоговый AC с учетом брони, щита и статус-эффектов (Character.derived)."""
+    return character.derived.total_ac
 
 RollMode = Literal['normal', 'advantage', 'disadvantage']
 def determine_roll_mode(
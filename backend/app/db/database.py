@@ -1,16 +1,125 @@
 # backend/app/db/database.py
-from sqlalchemy import create_engine
+import os
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+from .pool_stats import InstrumentedQueuePool, InstrumentedAsyncQueuePool, get_pool_stats
+
+# --- Конфигурация БД (переменные окружения) ---
+# DATABASE_URL: по умолчанию локальный SQLite; для PostgreSQL, например,
+#   postgresql://user:pass@db:5432/player_tool
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Параметры пула (используются для QueuePool; in-memory SQLite их не поддерживает)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # сек; -1 = не пересоздавать
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+# --- Опциональный профиль "concurrent SQLite" (SQLITE_CONCURRENT=1) ---
+# WAL позволяет читателям не блокировать писателя, synchronous=NORMAL убирает
+# fsync на каждый commit (fsync только на checkpoint), busy_timeout заставляет
+# ждать освобождения блокировки вместо мгновенного "database is locked".
+SQLITE_CONCURRENT = _env_bool("SQLITE_CONCURRENT", False)
+SQLITE_PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))), # байт
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")), # <0 = размер в KiB (64 MiB)
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")), # мс
+}
+
+def _normalize_sync_url(url: str) -> str:
+    """postgres:// (Heroku-стиль) и postgresql[+asyncpg]:// -> postgresql+psycopg2://."""
+    parsed = make_url(url)
+    backend, _, driver = parsed.drivername.partition("+")
+    if backend in ("postgres", "postgresql") and driver in ("", "asyncpg"):
+        return parsed.set(drivername="postgresql+psycopg2").render_as_string(hide_password=False)
+    return url
+
+def _to_async_url(url: str) -> str:
+    """Тот же сервер БД, но через async-драйвер (aiosqlite / asyncpg)."""
+    parsed = make_url(url)
+    backend = parsed.drivername.partition("+")[0]
+    if backend == "sqlite":
+        return url.replace(parsed.drivername, "sqlite+aiosqlite", 1)
+    if backend in ("postgres", "postgresql"):
+        return url.replace(parsed.drivername, "postgresql+asyncpg", 1)
+    return url
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).drivername.partition("+")[0] == "sqlite"
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.drivername.partition("+")[0] == "sqlite" and parsed.database in (None, "", ":memory:")
+
+def _engine_kwargs(url: str, pool_class, pool_name: str) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {}
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if not _is_memory_sqlite(url):
+        kwargs.update(
+            poolclass=pool_class,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            pool_logging_name=pool_name, # ключ счётчиков в pool_stats
+        )
+    return kwargs
+
+SQLALCHEMY_DATABASE_URL = _normalize_sync_url(SQLALCHEMY_DATABASE_URL)
+# Тот же файл/сервер БД, но через async-драйвер для AsyncSession
+ASYNC_SQLALCHEMY_DATABASE_URL = _to_async_url(SQLALCHEMY_DATABASE_URL)
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Слушатель 'connect': выставляет PRAGMA профиля на каждое новое соединение."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def enable_sqlite_concurrent_profile(sync_engine) -> None:
+    """Подключает PRAGMA-профиль к движку (для async-движка передавать .sync_engine)."""
+    url = sync_engine.url.render_as_string(hide_password=False)
+    if not _is_sqlite(url) or _is_memory_sqlite(url):
+        return # WAL не имеет смысла для in-memory БД
+    if not event.contains(sync_engine, "connect", _apply_sqlite_pragmas):
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+    **_engine_kwargs(SQLALCHEMY_DATABASE_URL, InstrumentedQueuePool, "sync")
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- Async-движок для async-обработчиков (не блокирует event loop на I/O БД) ---
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    **_engine_kwargs(ASYNC_SQLALCHEMY_DATABASE_URL, InstrumentedAsyncQueuePool, "async")
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False)
+
+if SQLITE_CONCURRENT:
+    enable_sqlite_concurrent_profile(engine)
+    enable_sqlite_concurrent_profile(async_engine.sync_engine)
+
 Base = declarative_base()
 
 def get_db():
@@ -18,4 +127,28 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Зависимость FastAPI: AsyncSession на время запроса."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_pool_status() -> Dict[str, Any]:
+    """Сводка по настройкам и телеметрии пулов обоих движков (для админки)."""
+    return {
+        "database_url": engine.url.render_as_string(hide_password=True),
+        "async_database_url": async_engine.url.render_as_string(hide_password=True),
+        "config": {
+            "sqlite_concurrent": SQLITE_CONCURRENT,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout_s": DB_POOL_TIMEOUT,
+            "pool_recycle_s": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        },
+        "pools": {
+            "sync": get_pool_stats("sync").snapshot(engine.pool),
+            "async": get_pool_stats("async").snapshot(async_engine.pool),
+        },
+    }
@@ -0,0 +1,123 @@
+# backend/app/db/pool_stats.py
+"""
+Телеметрия пула соединений SQLAlchemy.
+
+Пулы создаются через InstrumentedQueuePool / InstrumentedAsyncQueuePool:
+они замеряют время получения соединения (ожидание свободного слота +
+создание нового), считают checkout/checkin и события исчерпания пула
+(TimeoutError, когда pool_size + max_overflow заняты дольше pool_timeout).
+
+Счётчики хранятся в реестре по logging_name пула, поэтому переживают
+engine.dispose() / pool.recreate().
+"""
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, Pool
+
+
+class PoolStats:
+    """Накопительные счётчики одного пула (потокобезопасно)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.exhaustion_events = 0
+            self.last_exhausted_at: Optional[float] = None
+            self.total_wait_s = 0.0
+            self.max_wait_s = 0.0
+
+    def record_checkout(self, wait_s: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_s += wait_s
+            if wait_s > self.max_wait_s:
+                self.max_wait_s = wait_s
+
+    def record_checkin(self) -> None:
+        with self._lock:
+            self.checkins += 1
+
+    def record_exhaustion(self, wait_s: float) -> None:
+        with self._lock:
+            self.exhaustion_events += 1
+            self.last_exhausted_at = time.time()
+            self.total_wait_s += wait_s
+            if wait_s > self.max_wait_s:
+                self.max_wait_s = wait_s
+
+    def snapshot(self, pool: Optional[Pool] = None) -> Dict[str, Any]:
+        with self._lock:
+            data: Dict[str, Any] = {
+                "name": self.name,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "exhaustion_events": self.exhaustion_events,
+                "last_exhausted_at": self.last_exhausted_at,
+                "avg_wait_ms": round(self.total_wait_s / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_s * 1000, 3),
+            }
+        # Текущее состояние пула (только у QueuePool-подобных)
+        if isinstance(pool, QueuePool):
+            data.update({
+                "pool_class": type(pool).__name__,
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout_s": pool.timeout(),
+            })
+        elif pool is not None:
+            data["pool_class"] = type(pool).__name__
+        return data
+
+
+_registry: Dict[str, PoolStats] = {}
+_registry_lock = threading.Lock()
+
+
+def get_pool_stats(name: str) -> PoolStats:
+    """Возвращает (создаёт при необходимости) счётчики пула по имени."""
+    with _registry_lock:
+        stats = _registry.get(name)
+        if stats is None:
+            stats = _registry[name] = PoolStats(name)
+        return stats
+
+
+class _InstrumentedPoolMixin:
+    """Оборачивает Pool.connect() замером ожидания и учётом исчерпания."""
+
+    def _stats(self) -> PoolStats:
+        return get_pool_stats(self._orig_logging_name or type(self).__name__)
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except sa_exc.TimeoutError:
+            self._stats().record_exhaustion(time.perf_counter() - start)
+            raise
+        self._stats().record_checkout(time.perf_counter() - start)
+        return conn
+
+    def _do_return_conn(self, record):
+        self._stats().record_checkin()
+        return super()._do_return_conn(record)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    """QueuePool с телеметрией (sync-движок)."""
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool с телеметрией (async-движок)."""
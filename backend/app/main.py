@@ -1,18 +1,25 @@
 from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Query
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
 import json
 from typing import Optional, List, Dict, Any # Added List, Dict, Any
 import asyncio # Added asyncio for potential background tasks
+from contextlib import asynccontextmanager
 
 # --- Imports ---
-from .db.database import engine, Base, get_db, SessionLocal
+from .db.database import engine, Base, get_db, SessionLocal, AsyncSessionLocal, async_engine
 from .core.auth import get_current_user
 from .websockets.manager import manager
+from .websockets.backplane import create_backplane
+from .websockets.codec import Frame, supported_encodings
+from .websockets.rpc import handle_rpc
+from .websockets.chat import chat_pipeline
+from .models.chat import ChatMessage
+from .models.association_tables import party_members
 from .models.user import User
 from .models.character import Character
 # --- ADDED IMPORTS ---
-from .crud import character as character_crud
+from .crud import async_crud
+from .crud.reference_catalog import reference_catalog
 from .schemas import CharacterDetailedOut
 # --- END ADDED IMPORTS ---
 from .routers import auth, characters, parties, reference_data, admin
@@ -20,8 +27,34 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Предсобираем каталог справочников (/data/*); при ошибке (например, БД
+    # ещё не засеяна) каталог соберется лениво при первом запросе
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(reference_catalog.build)
+    except Exception as e:
+        logger.warning(f"Reference catalog was not prebuilt at startup: {e}")
+    # Таблицы истории чата и участников партий появились позже остальных: в уже
+    # засеянной БД сидер не запускается, поэтому создаем их здесь (если нет)
+    try:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(ChatMessage.__table__.create, checkfirst=True)
+            await conn.run_sync(party_members.create, checkfirst=True)
+    except Exception as e:
+        logger.error(f"Could not ensure chat_messages/party_members tables: {e}")
+    # Шина между воркерами: лобби видят участников всех процессов uvicorn
+    await manager.start_backplane(create_backplane())
+    chat_pipeline.start()
+    try:
+        yield
+    finally:
+        await chat_pipeline.stop() # Дописываем историю чата до остановки
+        await manager.stop_backplane()
+
 # Base.metadata.create_all(bind=engine) # Use Alembic for migrations
-app = FastAPI(title="Осознание API", version="0.4.3") # Increment version
+app = FastAPI(title="Осознание API", version="0.4.3", lifespan=lifespan) # Increment version
 
 # CORS Middleware
 origins = [
@@ -35,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[characters.NEXT_PAGE_HEADER], # Пагинация GET /characters
 )
 
 # Routers
@@ -44,6 +78,21 @@ app.include_router(parties.router)
 app.include_router(reference_data.router)
 app.include_router(admin.router)
 
+# Типы управляющих кадров от клиента (остальные сообщения считаются чатом)
+WS_CONTROL_FRAME_TYPES = {"resync", "pong", "rpc"}
+
+def _parse_control_frame(data: str) -> Optional[Dict[str, Any]]:
+    """Возвращает управляющий кадр, если сообщение — JSON-объект с известным "type"."""
+    if not data.startswith("{"):
+        return None
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        return None
+    if isinstance(frame, dict) and frame.get("type") in WS_CONTROL_FRAME_TYPES:
+        return frame
+    return None
+
 # WebSocket Endpoint
 @app.websocket("/ws")
 async def websocket_endpoint(
@@ -52,10 +101,17 @@ async def websocket_endpoint(
     lobbyKey: str = Query(...),
     masterUsername: str = Query(...),
     maxPlayers: str = Query(...),
-    characterId: Optional[int] = Query(None, description="ID персонажа игрока (null/отсутствует для мастера)")
+    characterId: Optional[int] = Query(None, description="ID персонажа игрока (null/отсутствует для мастера)"),
+    delta: bool = Query(False, description="Клиент принимает character_patch (дельты) вместо полных character_update"),
+    encoding: str = Query("json", description="Формат кадров сервер->клиент: json (текст) или msgpack (бинарные)"),
+    heartbeat: bool = Query(False, description="Клиент получает {\"type\": \"ping\"} и отвечает {\"type\": \"pong\"}; молчащий клиент отключается"),
+    lastSeq: Optional[int] = Query(None, description="Последний полученный lobby_seq: пропущенные события повторяются вместо полной синхронизации"),
+    epoch: Optional[str] = Query(None, description="Эпоха лобби из сообщения session (вместе с lastSeq)"),
+    chatBatch: bool = Query(False, description="Чат приходит пачками {\"type\": \"chat_batch\", \"messages\": [...]}, включая свои сообщения")
 ):
-    # Create a new session scope for this connection
-    db: Session = SessionLocal()
+    # Сессия БД НЕ держится на всё время жизни сокета: короткие сессии открываются
+    # только на фазы проверки и начальной синхронизации (и на отдельные сообщения,
+    # если им нужна БД), поэтому простаивающий игрок не занимает соединение пула.
     user: Optional[User] = None
     character: Optional[Character] = None # Character object if player connects
     lobby_key_upper = lobbyKey.upper()
@@ -63,44 +119,41 @@ async def websocket_endpoint(
 
     # === Pre-Connection Validation ===
     try:
-        # 1. Authenticate user (using the same db session)
-        try:
-            user = await get_current_user(token=token, db=db)
-            if not user: # Should not happen if get_current_user raises exception, but check anyway
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found after token decode")
-            username = user.username
-            logger.info(f"WebSocket Auth successful for user: {username}")
-        except HTTPException as auth_exc:
-            # Log and close with specific reason
-            logger.error(f"WebSocket auth failed for token starting {token[:10]}...: {auth_exc.detail} (Status: {auth_exc.status_code})")
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=f"Authentication failed: {auth_exc.detail}")
-            db.close() # Close session on failure
-            return
-        except Exception as e:
-             # Catch other unexpected errors during auth
-            logger.error(f"Unexpected WebSocket auth error: {e}", exc_info=True)
-            await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason="Internal authentication error")
-            db.close() # Close session on failure
-            return
-
-        # 2. Validate character ownership (ONLY if characterId is provided)
-        if characterId is not None:
-            character = db.query(Character).filter(Character.id == characterId, Character.owner_id == user.id).first()
-            if not character:
-                logger.warning(f"User {username} tried to connect with invalid/unowned charId {characterId}")
-                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid character ID or character not owned by user.")
-                db.close()
+        async with AsyncSessionLocal() as db:
+            # 1. Authenticate user (using the same db session)
+            try:
+                user = await get_current_user(token=token, db=db)
+                if not user: # Should not happen if get_current_user raises exception, but check anyway
+                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found after token decode")
+                username = user.username
+                logger.info(f"WebSocket Auth successful for user: {username}")
+            except HTTPException as auth_exc:
+                # Log and close with specific reason
+                logger.error(f"WebSocket auth failed for token starting {token[:10]}...: {auth_exc.detail} (Status: {auth_exc.status_code})")
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=f"Authentication failed: {auth_exc.detail}")
+                return
+            except Exception as e:
+                 # Catch other unexpected errors during auth
+                logger.error(f"Unexpected WebSocket auth error: {e}", exc_info=True)
+                await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason="Internal authentication error")
                 return
-            logger.info(f"User {username} validated for character {characterId} (Owner ID: {user.id})")
-        else:
-            # Check if user is the master if no characterId is provided
-            # TODO: A better check would involve fetching the party by lobbyKey and comparing user.id to party.creator_id
-            if user.username != masterUsername:
-                 logger.warning(f"User {username} attempted connection to lobby '{lobby_key_upper}' without characterId but is not master ({masterUsername})")
-                 await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Only players select characters; master connects without one.")
-                 db.close()
-                 return
-            logger.info(f"Master {username} connecting without specific character ID.")
+
+            # 2. Validate character ownership (ONLY if characterId is provided)
+            if characterId is not None:
+                owner_id_for_char = await async_crud.get_character_owner_id(db, characterId)
+                if owner_id_for_char != user.id:
+                    logger.warning(f"User {username} tried to connect with invalid/unowned charId {characterId}")
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid character ID or character not owned by user.")
+                    return
+                logger.info(f"User {username} validated for character {characterId} (Owner ID: {user.id})")
+            else:
+                # Check if user is the master if no characterId is provided
+                # TODO: A better check would involve fetching the party by lobbyKey and comparing user.id to party.creator_id
+                if user.username != masterUsername:
+                     logger.warning(f"User {username} attempted connection to lobby '{lobby_key_upper}' without characterId but is not master ({masterUsername})")
+                     await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Only players select characters; master connects without one.")
+                     return
+                logger.info(f"Master {username} connecting without specific character ID.")
 
         # 3. Validate maxPlayers
         try:
@@ -109,7 +162,13 @@ async def websocket_endpoint(
         except ValueError as e:
             logger.warning(f"Invalid maxPlayers value '{maxPlayers}' for lobby '{lobby_key_upper}': {e}")
             await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA, reason=f"Invalid maxPlayers format: {e}")
-            db.close()
+            return
+
+        # 3.1. Validate wire encoding
+        encoding = encoding.lower()
+        if encoding not in supported_encodings():
+            logger.warning(f"Unsupported encoding '{encoding}' requested by {username} for lobby '{lobby_key_upper}'")
+            await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA, reason=f"Unsupported encoding '{encoding}'. Supported: {', '.join(supported_encodings())}")
             return
 
         # 4. Accept the connection ONLY after all validations pass
@@ -119,45 +178,49 @@ async def websocket_endpoint(
         # === Post-Connection Logic ===
 
         # 5. Connect to manager (adds user to internal lists)
-        connected = await manager.connect(websocket, lobby_key_upper, username, characterId)
+        connected = await manager.connect(websocket, lobby_key_upper, username, characterId, delta=delta, encoding=encoding, heartbeat=heartbeat, chat_batch=chatBatch)
         if not connected:
             # Manager.connect might refuse (e.g., duplicate character) and close the socket
             logger.warning(f"ConnectionManager refused connection for {username} (CharID: {characterId})")
             # Websocket should already be closed by manager.connect in this case
-            db.close()
             return
+        # 5.1. Возобновление сессии: сразу после connect (без await), чтобы повтор
+        # пропущенных событий шел раньше новых
+        resumed = lastSeq is not None and manager.resume(websocket, lobby_key_upper, epoch, lastSeq)
 
         # 6. Fetch details for initial sync
         all_participant_details: List[Dict[str, Any]] = []
         try:
             # Get IDs of all chars currently connected (including the new one if applicable)
             current_char_ids_in_lobby = manager.get_character_ids_in_lobby(lobby_key_upper)
+            if resumed:
+                # Остальные листы клиент получил повтором; нужен только свой персонаж для рассылки другим
+                current_char_ids_in_lobby = {characterId} if characterId is not None else set()
             logger.info(f"Fetching details for {len(current_char_ids_in_lobby)} characters for initial sync/broadcast.")
 
-            # Fetch details for all characters currently in the lobby
-            for cid in current_char_ids_in_lobby:
-                 # Need owner_id for get_character_details_for_output
-                 # This requires a query unless we store owner_id in ConnectionManager
-                 char_owner_q = db.query(Character.owner_id).filter(Character.id == cid).first()
-                 if char_owner_q:
-                     owner_id = char_owner_q[0]
-                     details = character_crud.get_character_details_for_output(db=db, character_id=cid, user_id=owner_id)
-                     if details:
-                         all_participant_details.append(details.model_dump(mode='json'))
-                     else:
-                          logger.warning(f"Could not fetch details for existing char {cid} for owner {owner_id}")
-                 else:
-                     logger.warning(f"Could not find owner for existing char {cid}")
+            # Один пакетный запрос на всех участников (владелец берется из загруженных строк);
+            # сессия живет только на время загрузки
+            async with AsyncSessionLocal() as db:
+                details_by_id = await async_crud.get_characters_details_for_output(db, sorted(current_char_ids_in_lobby))
+            for cid in sorted(current_char_ids_in_lobby):
+                details = details_by_id.get(cid)
+                if details:
+                    all_participant_details.append(details.model_dump(mode='json'))
+                else:
+                    logger.warning(f"Could not fetch details for existing char {cid}")
 
         except Exception as e:
              logger.error(f"Error fetching initial character details for lobby {lobby_key_upper}: {e}", exc_info=True)
              # Continue connection, but client might have incomplete data initially
 
-        # 7. Send FULL details of ALL participants to the NEW client
-        if all_participant_details:
-             initial_sync_message = json.dumps({
+        # 7. Send FULL details of ALL participants to the NEW client (не нужно при возобновлении)
+        if all_participant_details and not resumed:
+             # seq снапшотов нужен delta-клиентам как база для character_patch
+             seqs = manager.record_initial_sync(websocket, lobby_key_upper, all_participant_details)
+             initial_sync_message = Frame({
                  "type": "initial_character_sync",
-                 "characters": all_participant_details
+                 "characters": all_participant_details,
+                 "seqs": seqs
              })
              await manager.send_personal_message(websocket, initial_sync_message)
              logger.info(f"Sent initial sync with {len(all_participant_details)} character details to {username}")
@@ -182,19 +245,26 @@ async def websocket_endpoint(
         except Exception as e:
              logger.error(f"Error sending initial players_update for lobby {lobby_key_upper}: {e}", exc_info=True)
 
-        # 10. Main message loop (Chat)
+        # 10. Main message loop (Chat + управляющие кадры)
+        # Обработчикам, которым нужна БД (rpc), — своя короткая сессия на сообщение:
+        # `async with AsyncSessionLocal() as db: ...`
         try:
             while True:
                 data = await websocket.receive_text()
-                # Basic chat relay with sender info
+                manager.touch(websocket) # Любой входящий кадр — признак живого клиента
+                # Управляющие кадры (JSON с "type"); все остальное — чат
+                control = _parse_control_frame(data)
+                if control is not None:
+                    if control.get("type") == "resync":
+                        await manager.send_resync(websocket, lobby_key_upper, control.get("character_id"))
+                    elif control.get("type") == "rpc":
+                        # Игровое действие от имени уже аутентифицированного пользователя (см. websockets/rpc.py)
+                        await handle_rpc(websocket, lobby_key_upper, user.id, characterId, control)
+                    # "pong" — только отметка активности (уже учтена в touch)
+                    continue
+                # Chat: лимит частоты, пакетная рассылка и история (см. websockets/chat.py)
                 logger.debug(f"WS message from {username} in {lobby_key_upper}: {data}")
-                chat_message = json.dumps({
-                    "type": "chat",
-                    "sender": username,
-                    "text": data
-                })
-                # Broadcast chat message excluding the sender
-                await manager.broadcast(lobby_key_upper, chat_message, exclude_websocket=websocket)
+                await chat_pipeline.submit(websocket, lobby_key_upper, username, data)
         except WebSocketDisconnect as ws_disconnect:
             logger.info(f"WebSocket disconnected for user {username} (CharID: {characterId}) in lobby {lobby_key_upper}. Code: {ws_disconnect.code}, Reason: {ws_disconnect.reason}")
         except Exception as e:
@@ -209,9 +279,12 @@ async def websocket_endpoint(
     finally:
         # 11. Disconnect and update player list for everyone else
         logger.info(f"Cleaning up connection for {username} in lobby {lobby_key_upper}")
-        manager.disconnect(websocket, lobby_key_upper)
-        # Send final player update only if the lobby still exists and has connections
-        if lobby_key_upper in manager.active_connections and manager.active_connections[lobby_key_upper]:
+        removed = manager.disconnect(websocket, lobby_key_upper)
+        # Send final player update only if the lobby still has members (on any worker).
+        # Выселенное соединение уже удалено, и players_update разослан менеджером.
+        if not removed:
+            logger.info(f"Connection for {username} in lobby {lobby_key_upper} was already removed, skipping final player update.")
+        elif manager.lobby_has_members(lobby_key_upper):
              try:
                  # Ensure maxPlayers is still valid int
                  max_players_int_on_disconnect = int(maxPlayers)
@@ -221,8 +294,3 @@ async def websocket_endpoint(
                  logger.error(f"Error sending player update after {username} disconnect: {update_e}", exc_info=True)
         else:
               logger.info(f"Lobby {lobby_key_upper} closed or empty, skipping final player update on disconnect for {username}.")
-
-        # Close the database session associated with this connection
-        if db:
-             db.close()
-             logger.debug(f"Database session closed for {username}'s connection.")
\ No newline at end of file
@@ -9,8 +9,9 @@ from .item import Item, Weapon, Armor, Shield, GeneralItem, Ammo
 from .ability import Ability
 from .status_effect import StatusEffect
 from .character import Character, CharacterInventoryItem
-from .association_tables import character_abilities, character_status_effects, weapon_granted_abilities
+from .association_tables import character_abilities, character_status_effects, party_members, weapon_granted_abilities
 from .custom_item import CharacterCustomItem
+from .chat import ChatMessage
 
 # Константа XP_THRESHOLDS может остаться в character.py или быть вынесена сюда
 from .character import XP_THRESHOLDS
\ No newline at end of file
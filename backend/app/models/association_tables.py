@@ -18,6 +18,13 @@ character_status_effects = Table(
     Column('status_effect_id', Integer, ForeignKey('status_effects.id', ondelete='CASCADE'), primary_key=True)
 )
 
+# Таблица связи Партия <-> Участники (присоединившиеся через /parties/join)
+party_members = Table(
+    'party_members', Base.metadata,
+    Column('party_id', Integer, ForeignKey('parties.id', ondelete='CASCADE'), primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+)
+
 # Таблица связи Оружие <-> Способности
 weapon_granted_abilities = Table(
     'weapon_granted_abilities', Base.metadata,
@@ -1,16 +1,17 @@
 # backend/app/models/character.py
 from __future__ import annotations
-from typing import Optional, List
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, Text, Boolean # <-- Добавили Boolean
+from functools import cached_property
+from operator import attrgetter, itemgetter
+from typing import Dict, Optional, List, Tuple
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, Text, Boolean, Index, case, event # <-- Добавили Boolean
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.ext.hybrid import hybrid_property
-import math # Нужен для hybrid_property
 from ..db.database import Base
 # Импортируем таблицы связей
 from .association_tables import character_abilities, character_status_effects
 # Импортируем зависимые модели (или используем строки)
 from .user import User
-from .item import Item # Нужен для связи с CharacterInventoryItem
+from .item import Item, Armor, Shield # Нужен для связи с CharacterInventoryItem
 from .custom_item import CharacterCustomItem
 from .ability import Ability # Добавим импорт Ability
 
@@ -20,6 +21,37 @@ XP_THRESHOLDS = {
     6: 14000, 7: 23000, 8: 34000, 9: 48000, 10: 64000,
 }
 
+# Навыки персонажа: колонка skill_<name>, модификатор <name>_mod
+SKILL_NAMES: Tuple[str, ...] = (
+    "strength", "dexterity", "endurance", "reaction", "technique", "adaptation",
+    "logic", "attention", "erudition", "culture", "science", "medicine",
+    "suggestion", "insight", "authority", "self_control", "religion", "flow",
+)
+SKILL_MODIFIER_ATTRS: Tuple[str, ...] = tuple(f"{name}_mod" for name in SKILL_NAMES)
+_SKILL_COLUMNS: Tuple[str, ...] = tuple(f"skill_{name}" for name in SKILL_NAMES)
+# Все 18 значений за один вызов: из __dict__ экземпляра (загруженные колонки) или через атрибуты
+_loaded_skill_values = itemgetter(*_SKILL_COLUMNS)
+_skill_values = attrgetter(*_SKILL_COLUMNS)
+
+# Модификатор по значению навыка: индекс — значение (0-10); меньше 0 — как 0, больше 10 — как 10
+SKILL_MODIFIER_TABLE: Tuple[int, ...] = (0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5)
+_MAX_SKILL_VALUE = len(SKILL_MODIFIER_TABLE) - 1
+_MODIFIER_BY_VALUE: Dict[int, int] = dict(enumerate(SKILL_MODIFIER_TABLE))
+
+
+def skill_modifier(value: int) -> int:
+    """Модификатор навыка по SKILL_MODIFIER_TABLE."""
+    return SKILL_MODIFIER_TABLE[min(max(value, 0), _MAX_SKILL_VALUE)]
+
+
+def skill_modifier_expression(column):
+    """SQL-версия skill_modifier: CASE по верхней границе значений навыка для каждого модификатора."""
+    upper_bounds: Dict[int, int] = {}
+    for value, modifier in enumerate(SKILL_MODIFIER_TABLE):
+        upper_bounds[modifier] = value
+    *bounded, (top_modifier, _) = sorted(upper_bounds.items())
+    return case(*((column <= bound, modifier) for modifier, bound in bounded), else_=top_modifier)
+
 # --- Модель Предмета Инвентаря ---
 class CharacterInventoryItem(Base):
     __tablename__ = 'character_inventory_items'
@@ -27,7 +59,7 @@ class CharacterInventoryItem(Base):
     character_id: Mapped[int] = mapped_column(ForeignKey('characters.id'))
     item_id: Mapped[int] = mapped_column(ForeignKey('items.id'))
     quantity: Mapped[int] = mapped_column(Integer, default=1)
-    item: Mapped["Item"] = relationship(lazy="joined")
+    item: Mapped["Item"] = relationship()
 
 # --- Основная модель Персонажа ---
 class Character(Base):
@@ -58,51 +90,7 @@ class Character(Base):
     skill_religion: Mapped[int] = mapped_column(Integer, default=1)
     skill_flow: Mapped[int] = mapped_column(Integer, default=1)
 
-    # --- Модификаторы (рассчитываются на лету) ---
-    def _get_modifier(self, skill_value: int) -> int:
-        if skill_value <= 1: return 0
-        if skill_value <= 3: return 1
-        if skill_value <= 5: return 2
-        if skill_value <= 7: return 3
-        if skill_value <= 9: return 4
-        return 5 # Для 10
-
-    @hybrid_property
-    def strength_mod(self): return self._get_modifier(self.skill_strength)
-    @hybrid_property
-    def dexterity_mod(self): return self._get_modifier(self.skill_dexterity)
-    @hybrid_property
-    def endurance_mod(self): return self._get_modifier(self.skill_endurance)
-    @hybrid_property
-    def reaction_mod(self): return self._get_modifier(self.skill_reaction)
-    @hybrid_property
-    def technique_mod(self): return self._get_modifier(self.skill_technique)
-    @hybrid_property
-    def adaptation_mod(self): return self._get_modifier(self.skill_adaptation)
-    @hybrid_property
-    def logic_mod(self): return self._get_modifier(self.skill_logic)
-    @hybrid_property
-    def attention_mod(self): return self._get_modifier(self.skill_attention)
-    @hybrid_property
-    def erudition_mod(self): return self._get_modifier(self.skill_erudition)
-    @hybrid_property
-    def culture_mod(self): return self._get_modifier(self.skill_culture)
-    @hybrid_property
-    def science_mod(self): return self._get_modifier(self.skill_science)
-    @hybrid_property
-    def medicine_mod(self): return self._get_modifier(self.skill_medicine)
-    @hybrid_property
-    def suggestion_mod(self): return self._get_modifier(self.skill_suggestion)
-    @hybrid_property
-    def insight_mod(self): return self._get_modifier(self.skill_insight)
-    @hybrid_property
-    def authority_mod(self): return self._get_modifier(self.skill_authority)
-    @hybrid_property
-    def self_control_mod(self): return self._get_modifier(self.skill_self_control)
-    @hybrid_property
-    def religion_mod(self): return self._get_modifier(self.skill_religion)
-    @hybrid_property
-    def flow_mod(self): return self._get_modifier(self.skill_flow)
+    # Модификаторы навыков (strength_mod ... flow_mod) — hybrid-свойства, создаются по SKILL_NAMES после класса
 
     # --- Производные характеристики ---
     max_hp: Mapped[int] = mapped_column(Integer, default=10)
@@ -114,9 +102,15 @@ class Character(Base):
     speed: Mapped[int] = mapped_column(Integer, default=10)
 
     @hybrid_property
-    def initiative_bonus(self) -> int: return self.reaction_mod
+    def initiative_bonus(self) -> int: return self.derived.initiative_bonus
+    @initiative_bonus.inplace.expression
+    @classmethod
+    def _initiative_bonus_expression(cls): return skill_modifier_expression(cls.skill_reaction)
     @hybrid_property
-    def base_ac(self) -> int: return 10 + self.dexterity_mod
+    def base_ac(self) -> int: return self.derived.base_ac
+    @base_ac.inplace.expression
+    @classmethod
+    def _base_ac_expression(cls): return 10 + skill_modifier_expression(cls.skill_dexterity)
 
     # --- Уровни веток ---
     medic_branch_level: Mapped[int] = mapped_column(Integer, default=0)
@@ -133,16 +127,17 @@ class Character(Base):
     weapon1_inv_item_id: Mapped[Optional[int]] = mapped_column(ForeignKey('character_inventory_items.id'), nullable=True)
     weapon2_inv_item_id: Mapped[Optional[int]] = mapped_column(ForeignKey('character_inventory_items.id'), nullable=True)
 
+    # Связи персонажа без жадной загрузки: что грузить, решает профиль запроса (crud/character_loading.py)
     inventory: Mapped[List["CharacterInventoryItem"]] = relationship(
         cascade="all, delete-orphan",
         foreign_keys="[CharacterInventoryItem.character_id]",
         backref="character",
         order_by="CharacterInventoryItem.id"
     )
-    equipped_armor: Mapped[Optional["CharacterInventoryItem"]] = relationship(foreign_keys=[armor_inv_item_id], lazy="joined")
-    equipped_shield: Mapped[Optional["CharacterInventoryItem"]] = relationship(foreign_keys=[shield_inv_item_id], lazy="joined")
-    equipped_weapon1: Mapped[Optional["CharacterInventoryItem"]] = relationship(foreign_keys=[weapon1_inv_item_id], lazy="joined")
-    equipped_weapon2: Mapped[Optional["CharacterInventoryItem"]] = relationship(foreign_keys=[weapon2_inv_item_id], lazy="joined")
+    equipped_armor: Mapped[Optional["CharacterInventoryItem"]] = relationship(foreign_keys=[armor_inv_item_id])
+    equipped_shield: Mapped[Optional["CharacterInventoryItem"]] = relationship(foreign_keys=[shield_inv_item_id])
+    equipped_weapon1: Mapped[Optional["CharacterInventoryItem"]] = relationship(foreign_keys=[weapon1_inv_item_id])
+    equipped_weapon2: Mapped[Optional["CharacterInventoryItem"]] = relationship(foreign_keys=[weapon2_inv_item_id])
 
     # === Слоты Активных Способностей ===
     active_ability_slot_1_id: Mapped[Optional[int]] = mapped_column(ForeignKey('abilities.id', use_alter=True), nullable=True)
@@ -157,11 +152,11 @@ class Character(Base):
     active_ability_slot_4_cooldown: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
     active_ability_slot_5_cooldown: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
 
-    active_ability_1: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_1_id], lazy="joined", post_update=True)
-    active_ability_2: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_2_id], lazy="joined", post_update=True)
-    active_ability_3: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_3_id], lazy="joined", post_update=True)
-    active_ability_4: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_4_id], lazy="joined", post_update=True)
-    active_ability_5: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_5_id], lazy="joined", post_update=True)
+    active_ability_1: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_1_id], post_update=True)
+    active_ability_2: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_2_id], post_update=True)
+    active_ability_3: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_3_id], post_update=True)
+    active_ability_4: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_4_id], post_update=True)
+    active_ability_5: Mapped[Optional["Ability"]] = relationship(foreign_keys=[active_ability_slot_5_id], post_update=True)
     # === КОНЕЦ Слотов ===
 
     # === Отслеживание Действий за Ход ===
@@ -184,7 +179,6 @@ class Character(Base):
     custom_items: Mapped[List["CharacterCustomItem"]] = relationship(
         "CharacterCustomItem",
         cascade="all, delete-orphan",
-        lazy="selectin",
         order_by="CharacterCustomItem.name"
     )
 
@@ -197,3 +191,125 @@ class Character(Base):
     # Связь "многие-к-одному" с User (владелец)
     owner: Mapped["User"] = relationship("User", back_populates="characters")
 
+    # Keyset-пагинация списка: WHERE owner_id = ? AND id > ? ORDER BY id
+    __table_args__ = (Index("ix_characters_owner_id_id", "owner_id", "id"),)
+
+    # --- Производные характеристики (кэш на экземпляре) ---
+    @property
+    def derived(self) -> "CharacterDerivedStats":
+        """Производные характеристики; пересчитываются только после изменения исходных данных."""
+        stats = self.__dict__.get("_derived_stats")
+        if stats is None:
+            stats = self.__dict__["_derived_stats"] = CharacterDerivedStats(self)
+        return stats
+
+    def invalidate_derived(self) -> None:
+        self.__dict__.pop("_derived_stats", None)
+
+
+class CharacterDerivedStats:
+    """
+    Производные характеристики персонажа: модификаторы навыков, КД, пассивное
+    внимание, опыт до следующего уровня. Каждое значение считается при первом
+    обращении и хранится до сброса (Character.invalidate_derived), поэтому
+    частичная загрузка персонажа не требует колонок/связей для непрочитанных значений.
+
+    Сброс делают слушатели ниже: изменение навыков, уровня, брони/щита, списка
+    статус-эффектов, а также refresh/expire экземпляра. Правки справочников
+    (ac_bonus брони, ac_modifier эффекта) не отслеживаются: справочники меняются
+    вне игровых сессий, а экземпляр персонажа живет в пределах одной сессии.
+    """
+
+    def __init__(self, character: Character):
+        self._character = character
+
+    @cached_property
+    def modifier_values(self) -> Tuple[int, ...]:
+        """Модификаторы всех навыков в порядке SKILL_NAMES, за один проход по таблице."""
+        character = self._character
+        try:
+            values = _loaded_skill_values(character.__dict__) # без дескрипторов ORM
+        except KeyError:
+            values = _skill_values(character) # часть колонок не загружена/сброшена — ленивая загрузка
+        modifiers = tuple(map(_MODIFIER_BY_VALUE.get, values))
+        if None in modifiers: # значения вне 0-10
+            modifiers = tuple(map(skill_modifier, values))
+        return modifiers
+
+    @cached_property
+    def modifiers(self) -> Dict[str, int]:
+        """{'strength_mod': 2, ...} — в порядке SKILL_NAMES."""
+        return dict(zip(SKILL_MODIFIER_ATTRS, self.modifier_values))
+
+    @cached_property
+    def initiative_bonus(self) -> int:
+        return self.modifiers["reaction_mod"]
+
+    @cached_property
+    def base_ac(self) -> int:
+        return 10 + self.modifiers["dexterity_mod"]
+
+    @cached_property
+    def passive_attention(self) -> int:
+        return 10 + self.modifiers["attention_mod"]
+
+    @cached_property
+    def xp_needed_for_next_level(self) -> Optional[int]:
+        return XP_THRESHOLDS.get(self._character.level + 1)
+
+    @cached_property
+    def total_ac(self) -> int:
+        """Итоговый КД с учетом брони, щита и статус-эффектов."""
+        character = self._character
+        dex_mod = self.modifiers["dexterity_mod"]
+        total_ac = self.base_ac
+        armor_slot = character.equipped_armor
+        if armor_slot and isinstance(armor_slot.item, Armor):
+            armor = armor_slot.item
+            if armor.armor_type == 'Средняя':
+                max_dex = armor.max_dex_bonus if armor.max_dex_bonus is not None else 2
+                total_ac = armor.ac_bonus + min(dex_mod, max_dex)
+            elif armor.armor_type == 'Тяжёлая':
+                total_ac = armor.ac_bonus
+            elif armor.armor_type == 'Лёгкая':
+                max_dex = armor.max_dex_bonus if armor.max_dex_bonus is not None else 99
+                total_ac = armor.ac_bonus + min(dex_mod, max_dex)
+            # Иной тип брони ("Нет" и т.п.) — базовый КД
+        shield_slot = character.equipped_shield
+        if shield_slot and isinstance(shield_slot.item, Shield):
+            total_ac += shield_slot.item.ac_bonus
+        total_ac += sum(effect.ac_modifier for effect in character.active_status_effects if effect.ac_modifier is not None)
+        return total_ac
+
+
+# --- Модификаторы навыков: hybrid-свойства по таблице ---
+def _skill_modifier_property(index: int, attr: str, column: str) -> hybrid_property:
+    """На экземпляре — значение из Character.derived, в запросе — skill_modifier_expression."""
+    def fget(self: Character) -> int:
+        return self.derived.modifier_values[index]
+    def expr(cls):
+        return skill_modifier_expression(getattr(cls, column))
+    fget.__name__ = expr.__name__ = attr
+    return hybrid_property(fget, expr=expr)
+
+for _index, _name in enumerate(SKILL_NAMES):
+    setattr(Character, SKILL_MODIFIER_ATTRS[_index], _skill_modifier_property(_index, SKILL_MODIFIER_ATTRS[_index], f"skill_{_name}"))
+
+
+# --- Сброс производных характеристик ---
+def _invalidate_derived(target: Character, *args) -> None:
+    target.invalidate_derived()
+
+_DERIVED_SOURCES = (
+    *(getattr(Character, f"skill_{name}") for name in SKILL_NAMES),
+    Character.level,
+    Character.armor_inv_item_id, Character.shield_inv_item_id,
+    Character.equipped_armor, Character.equipped_shield,
+)
+for _attr in _DERIVED_SOURCES:
+    event.listen(_attr, "set", _invalidate_derived)
+for _event_name in ("append", "remove", "bulk_replace"):
+    event.listen(Character.active_status_effects, _event_name, _invalidate_derived)
+for _event_name in ("refresh", "expire"):
+    event.listen(Character, _event_name, _invalidate_derived)
+
@@ -0,0 +1,23 @@
+# backend/app/models/chat.py
+from __future__ import annotations
+from datetime import datetime
+from sqlalchemy import String, Text, DateTime, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..db.database import Base
+
+class ChatMessage(Base):
+    """Сообщение чата лобби (история для GET /parties/{lobby_key}/chat)."""
+    __tablename__ = "chat_messages"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    lobby_key: Mapped[str] = mapped_column(String(16), nullable=False)
+    sender: Mapped[str] = mapped_column(String, nullable=False) # username (без FK: история переживает удаление пользователя)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False) # UTC
+
+    # Keyset-пагинация: WHERE lobby_key = ? AND id < ? ORDER BY id DESC
+    __table_args__ = (Index("ix_chat_messages_lobby_key_id", "lobby_key", "id"),)
+
+    def __repr__(self):
+        return f"<ChatMessage(id={self.id}, lobby_key='{self.lobby_key}', sender='{self.sender}')>"
@@ -4,7 +4,11 @@ from sqlalchemy.orm import Session
 from typing import List
 
 # Импортируем зависимости и схемы
-from ..db.database import get_db
+from ..db.database import get_db, get_pool_status
+from ..crud.character_cache import character_details_cache
+from ..crud.reference_catalog import reference_catalog
+from ..websockets.manager import manager
+from ..websockets.chat import chat_pipeline
 from ..core import auth # Для зависимости get_current_admin_user
 # --- ИЗМЕНЕНИЕ: Импортируем UserOut (или ваше правильное имя схемы) ---
 # Попробуйте сначала так:
@@ -59,5 +63,45 @@ async def list_all_users(
     users = db.query(UserModel).offset(skip).limit(limit).all()
     return users
 
-# Добавляйте сюда другие эндпоинты, специфичные для администратора
+@router.get("/db/pool", response_model=dict)
+async def read_db_pool_stats():
+    """
+    Телеметрия пулов соединений БД (sync и async движки):
+    checkout/checkin, среднее и максимальное ожидание соединения,
+    события исчерпания пула и текущее заполнение.
+    """
+    return get_pool_status()
+
+@router.get("/cache/characters", response_model=dict)
+async def read_character_cache_stats():
+    """Счётчики кэша CharacterDetailedOut: попадания, промахи, вытеснения, инвалидации."""
+    return character_details_cache.stats()
+
+@router.post("/cache/characters/clear", response_model=dict)
+async def clear_character_cache():
+    """Сбрасывает кэш CharacterDetailedOut (все версии повышаются)."""
+    character_details_cache.clear()
+    return character_details_cache.stats()
 
+@router.get("/cache/reference", response_model=dict)
+async def read_reference_catalog_stats():
+    """Состояние каталога справочников: размеры, ETag'и, число пересборок."""
+    return reference_catalog.stats()
+
+@router.post("/cache/reference/invalidate", response_model=dict)
+async def invalidate_reference_catalog():
+    """Хук инвалидации каталога справочников (например, после ручной правки БД)."""
+    reference_catalog.invalidate()
+    return reference_catalog.stats()
+
+@router.get("/ws/fanout", response_model=dict)
+async def read_ws_fanout_metrics():
+    """Исходящие очереди WebSocket по лобби: глубина, потери, объединения, задержка отправки."""
+    return manager.get_fanout_metrics()
+
+@router.get("/ws/chat", response_model=dict)
+async def read_ws_chat_metrics():
+    """Чат: принятые/отклоненные (лимит частоты) сообщения, пачки рассылки, запись истории."""
+    return chat_pipeline.get_metrics()
+
+# Добавляйте сюда другие эндпоинты, специфичные для администратора
@@ -1,22 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Path
-from sqlalchemy.orm import Session, selectinload
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Path, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Any, Optional
-import asyncio # <-- Импорт asyncio
 
 # Относительные импорты
 from .. import models, schemas
 # Импортируем CRUD модули
-from ..crud import character as character_crud
-from ..crud import item as item_crud
-from ..crud import action as action_crud
-from ..crud import custom_item as custom_item_crud
-from ..crud import character_slots as slots_crud
-from ..crud import character_turn as turn_crud
-from ..crud.skill_check import perform_skill_check
+# Async-обёртки над CRUD (работают через AsyncSession.run_sync)
+from ..crud import async_crud
+from ..crud.character_serializer import CHARACTER_SECTIONS, iter_details_json, resolve_character_fields
 # Импорт WebSocket менеджера
 from ..websockets.manager import manager # <-- Импорт manager
-from ..db.database import get_db
+from ..db.database import get_async_db
 from ..core.auth import get_current_user
+from .parties import require_lobby_character_ids
 # Явно импортируем все нужные схемы
 from ..schemas import (
     CharacterBriefOut, CharacterCreate, CharacterDetailedOut, CharacterUpdateSkills,
@@ -41,13 +38,12 @@ async def _broadcast_update_if_needed(lobby_key: Optional[str], character_detail
     # --- КОНЕЦ ЛОГИРОВАНИЯ ---
     if lobby_key and character_details:
         try:
-            # Используем asyncio.create_task для неблокирующей отправки
-            asyncio.create_task(
-                 manager.broadcast_character_update(lobby_key, character_details.model_dump(mode='json'))
-            )
-            logger.info(f"Broadcast task CREATED for char {character_details.id} update in lobby {lobby_key}") # Уточнено сообщение
+            # Рассылка откладывается на окно debounce: частые обновления одного персонажа
+            # (слайдер ХП, клики по инвентарю) объединяются, уходит только последнее состояние
+            manager.schedule_character_update(lobby_key, character_details)
+            logger.info(f"Broadcast SCHEDULED for char {character_details.id} update in lobby {lobby_key}")
         except Exception as e:
-            logger.error(f"Failed to create broadcast task for char {character_details.id} in lobby {lobby_key}: {e}", exc_info=True)
+            logger.error(f"Failed to schedule broadcast for char {character_details.id} in lobby {lobby_key}: {e}", exc_info=True)
     # --- ДОБАВЛЕНО ЛОГИРОВАНИЕ: ЕСЛИ УСЛОВИЕ НЕ ВЫПОЛНЕНО ---
     elif not lobby_key:
         logger.warning("Broadcast skipped: lobby_key is missing or None.")
@@ -57,22 +53,71 @@ async def _broadcast_update_if_needed(lobby_key: Optional[str], character_detail
 
 # --- Эндпоинты для создания, получения списка, деталей персонажа ---
 @router.post("", response_model=schemas.CharacterBriefOut, status_code=status.HTTP_201_CREATED, summary="Создать нового персонажа")
-async def create_new_character(character_in: schemas.CharacterCreate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_char = character_crud.create_character(db=db, user_id=current_user.id, character_in=character_in)
+async def create_new_character(character_in: schemas.CharacterCreate, current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # async_crud.create_character сразу возвращает CharacterBriefOut
     # При создании не шлем broadcast, т.к. персонаж еще не в лобби
-    return schemas.CharacterBriefOut.model_validate(db_char) # Используем model_validate для Pydantic v2+
+    return await async_crud.create_character(db=db, user_id=current_user.id, character_in=character_in)
 
-@router.get("", response_model=List[schemas.CharacterBriefOut], summary="Получить список своих персонажей")
-async def get_my_characters(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return character_crud.get_characters_by_user(db=db, user_id=current_user.id)
+# Заголовок ответа со значением after_id для следующей страницы списка персонажей
+NEXT_PAGE_HEADER = "X-Next-After-Id"
 
-@router.get("/{character_id}", response_model=schemas.CharacterDetailedOut, summary="Получить детали персонажа")
-async def get_character_details_endpoint(character_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    character_details = character_crud.get_character_details_for_output(db=db, character_id=character_id, user_id=current_user.id)
+@router.get(
+    "", response_model=List[schemas.CharacterBriefOut], summary="Получить список своих персонажей",
+    description="Страница списка по возрастанию id. Если есть продолжение, заголовок "
+                f"{NEXT_PAGE_HEADER} содержит after_id для следующего запроса."
+)
+async def get_my_characters(
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Вернуть персонажей с id больше этого"),
+    limit: int = Query(100, ge=1, le=500),
+    name: Optional[str] = Query(None, min_length=1, max_length=100, description="Поиск по подстроке имени (без учета регистра)"),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)):
+    characters, next_after_id = await async_crud.get_characters_by_user(db=db, user_id=current_user.id, after_id=after_id, limit=limit, name=name)
+    if next_after_id is not None:
+        response.headers[NEXT_PAGE_HEADER] = str(next_after_id)
+    return characters
+
+@router.get(
+    "/{character_id}", response_model=schemas.CharacterDetailedOut, summary="Получить детали персонажа",
+    description="По умолчанию — полный лист. С ?fields= и/или ?sections= ответ содержит только "
+                "запрошенные поля (плюс id), а из БД грузятся только нужные для них связи. "
+                f"Секции: {', '.join(CHARACTER_SECTIONS)}."
+)
+async def get_character_details_endpoint(
+    character_id: int,
+    fields: Optional[str] = Query(None, description="Поля через запятую, например current_hp,current_pu"),
+    sections: Optional[str] = Query(None, description="Секции через запятую, например vitals,inventory"),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)):
+    requested = resolve_character_fields(fields, sections)
+    if requested is not None:
+        partial = await async_crud.get_character_partial_for_output(db=db, character_id=character_id, user_id=current_user.id, fields=requested)
+        if partial is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Персонаж не найден или не принадлежит вам")
+        # Частичная схема не совпадает с response_model: отдаем готовый JSON
+        return Response(content=partial.model_dump_json(), media_type="application/json")
+    character_details = await async_crud.get_character_details_for_output(db=db, character_id=character_id, user_id=current_user.id)
     if character_details is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Персонаж не найден или не принадлежит вам")
     return character_details
 
+@router.post(
+    "/batch", response_model=None, summary="Получить детали нескольких персонажей",
+    responses={200: {"model": List[schemas.CharacterDetailedOut]}},
+    description="Полные листы в порядке character_ids. Доступны свои персонажи и, если передан "
+                "lobby_key, персонажи, присутствующие в этом лобби (для мастера и участников). "
+                "Недоступные и несуществующие id пропускаются."
+)
+async def get_characters_batch(
+    batch: schemas.CharacterBatchRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)):
+    shared_ids = await require_lobby_character_ids(db, batch.lobby_key, current_user) if batch.lobby_key else set()
+    # Права проверяются в самом запросе (свои или из лобби): недоступные листы не собираются
+    details_by_id = await async_crud.get_characters_details_for_output(db, batch.character_ids, user_id=current_user.id, shared_ids=shared_ids)
+    return StreamingResponse(iter_details_json(details_by_id.values()), media_type="application/json")
+
 # --- Эндпоинты для обновления статов, навыков, заметок ---
 @router.put("/{character_id}/skills", response_model=schemas.CharacterDetailedOut, summary="Обновить навыки персонажа")
 async def update_character_skills_endpoint(
@@ -80,11 +125,10 @@ async def update_character_skills_endpoint(
     skill_updates: schemas.CharacterUpdateSkills,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    updated_char = character_crud.update_character_skills(db=db, character_id=character_id, user_id=current_user.id, skill_updates=skill_updates)
+    db: AsyncSession = Depends(get_async_db)):
+    updated_char, character_details = await async_crud.update_character_skills(db=db, character_id=character_id, user_id=current_user.id, skill_updates=skill_updates)
     if updated_char is None: raise HTTPException(status_code=404, detail="Персонаж не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные") # Should not happen
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -96,11 +140,10 @@ async def level_up_character_endpoint(
     level_up_data: schemas.LevelUpInfo,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    leveled_up_char = character_crud.level_up_character(db=db, character_id=character_id, user_id=current_user.id, level_up_data=level_up_data)
+    db: AsyncSession = Depends(get_async_db)):
+    leveled_up_char, character_details = await async_crud.level_up_character(db=db, character_id=character_id, user_id=current_user.id, level_up_data=level_up_data)
     if leveled_up_char is None: raise HTTPException(status_code=404, detail="Персонаж не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -112,11 +155,10 @@ async def update_character_stats_endpoint(
     stats_update: schemas.UpdateCharacterStats,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    updated_char, triggered_emotion_name = character_crud.update_character_stats(db=db, character_id=character_id, user_id=current_user.id, stats_update=stats_update)
+    db: AsyncSession = Depends(get_async_db)):
+    (updated_char, triggered_emotion_name), character_details = await async_crud.update_character_stats(db=db, character_id=character_id, user_id=current_user.id, stats_update=stats_update)
     if updated_char is None: raise HTTPException(status_code=404, detail="Персонаж не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=500, detail="Не удалось получить детали персонажа после обновления статов")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -129,11 +171,10 @@ async def update_character_notes_endpoint(
     notes_update: schemas.CharacterNotes,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    updated_char = character_crud.update_character_notes(db=db, character_id=character_id, user_id=current_user.id, notes_update=notes_update)
+    db: AsyncSession = Depends(get_async_db)):
+    updated_char, character_details = await async_crud.update_character_notes(db=db, character_id=character_id, user_id=current_user.id, notes_update=notes_update)
     if updated_char is None: raise HTTPException(status_code=404, detail="Персонаж не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -146,23 +187,14 @@ async def add_item_to_character_inventory(
     item_add: schemas.AddItemToInventory,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    inv_item = item_crud.add_item_to_inventory(db=db, character_id=character_id, user_id=current_user.id, item_add=item_add)
-    if inv_item is None: raise HTTPException(status_code=404, detail="Персонаж или предмет не найден")
+    db: AsyncSession = Depends(get_async_db)):
+    # Ответ (CharacterInventoryItemOut) собирается внутри async_crud, пока сессия доступна
+    inv_item_out, character_details = await async_crud.add_item_to_inventory(db=db, character_id=character_id, user_id=current_user.id, item_add=item_add, with_details=lobby_key is not None)
+    if inv_item_out is None: raise HTTPException(status_code=404, detail="Персонаж или предмет не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
-    # Format response (existing logic)
-    item_data = inv_item.item; item_schema: Any = None
-    if isinstance(item_data, models.Weapon): item_schema = schemas.WeaponOut.model_validate(item_data)
-    elif isinstance(item_data, models.Armor): item_schema = schemas.ArmorOut.model_validate(item_data)
-    elif isinstance(item_data, models.Shield): item_schema = schemas.ShieldOut.model_validate(item_data)
-    elif isinstance(item_data, models.GeneralItem): item_schema = schemas.GeneralItemOut.model_validate(item_data)
-    elif isinstance(item_data, models.Ammo): item_schema = schemas.AmmoOut.model_validate(item_data)
-    else: item_schema = schemas.ItemBase.model_validate(item_data)
-    if item_schema is None: raise HTTPException(status_code=500, detail="Не удалось определить тип добавленного предмета")
-    return schemas.CharacterInventoryItemOut(id=inv_item.id, item=item_schema, quantity=inv_item.quantity)
+    return inv_item_out
 
 @router.delete("/{character_id}/inventory/{inventory_item_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Inventory"], summary="Удалить предмет из инвентаря")
 async def remove_item_from_character_inventory(
@@ -171,12 +203,10 @@ async def remove_item_from_character_inventory(
     quantity: int = Query(1, ge=1),
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    success = item_crud.remove_item_from_inventory(db=db, inventory_item_id=inventory_item_id, character_id=character_id, user_id=current_user.id, quantity=quantity)
+    db: AsyncSession = Depends(get_async_db)):
+    success, character_details = await async_crud.remove_item_from_inventory(db=db, inventory_item_id=inventory_item_id, character_id=character_id, user_id=current_user.id, quantity=quantity, with_details=lobby_key is not None)
     if not success: raise HTTPException(status_code=404, detail="Предмет инвентаря не найден")
     # --- Broadcast Logic ---
-    # Fetch details *after* potential deletion/update
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
     return None # Return 204 No Content
@@ -187,11 +217,10 @@ async def equip_item_for_character(
     equip_data: schemas.EquipItem,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    updated_char_model = item_crud.equip_item(db=db, character_id=character_id, user_id=current_user.id, equip_data=equip_data)
+    db: AsyncSession = Depends(get_async_db)):
+    updated_char_model, character_details = await async_crud.equip_item(db=db, character_id=character_id, user_id=current_user.id, equip_data=equip_data)
     if updated_char_model is None: raise HTTPException(status_code=404, detail="Персонаж не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -203,11 +232,10 @@ async def unequip_item_for_character(
     slot: str = Path(..., description="Слот для снятия: armor, shield, weapon1, weapon2"), # Use Path for slot
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    updated_char_model = item_crud.unequip_item(db=db, character_id=character_id, user_id=current_user.id, slot=slot)
+    db: AsyncSession = Depends(get_async_db)):
+    updated_char_model, character_details = await async_crud.unequip_item(db=db, character_id=character_id, user_id=current_user.id, slot=slot)
     if updated_char_model is None: raise HTTPException(status_code=404, detail="Персонаж не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -220,11 +248,10 @@ async def add_character_custom_item(
     item_in: schemas.CustomItemCreate,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    db_item = custom_item_crud.add_custom_item(db, character_id, current_user.id, item_in)
+    db: AsyncSession = Depends(get_async_db)):
+    db_item, character_details = await async_crud.add_custom_item(db, character_id, current_user.id, item_in, with_details=lobby_key is not None)
     if db_item is None: raise HTTPException(status_code=400, detail="Не удалось добавить предмет")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
     return db_item # Return the created/updated custom item
@@ -236,11 +263,10 @@ async def delete_character_custom_item(
     quantity: int = Query(1, ge=1),
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    success = custom_item_crud.remove_custom_item(db, custom_item_id, character_id, current_user.id, quantity)
+    db: AsyncSession = Depends(get_async_db)):
+    success, character_details = await async_crud.remove_custom_item(db, custom_item_id, character_id, current_user.id, quantity, with_details=lobby_key is not None)
     if not success: raise HTTPException(status_code=404, detail="Произвольный предмет не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
     return None
@@ -252,23 +278,11 @@ async def apply_status_effect_to_character(
     status_update: schemas.StatusEffectUpdate,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    # Fetch character with effects preloaded for modification
-    db_char = db.query(models.Character).options(selectinload(models.Character.active_status_effects)).filter(models.Character.id == character_id, models.Character.owner_id == current_user.id).first()
-    if not db_char: raise HTTPException(status_code=404, detail="Персонаж не найден")
-
-    added_effect_name = character_crud.apply_status_effect(db, db_char, status_update.status_effect_id)
-
-    if added_effect_name is not None:
-        try:
-            db.commit() # Commit the change
-        except Exception as e:
-            db.rollback()
-            logger.error(f"DB Error applying status effect {status_update.status_effect_id} to char {character_id}: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Ошибка БД при применении статуса: {e}")
+    db: AsyncSession = Depends(get_async_db)):
+    # apply_status_effect коммитит изменения и возвращает лист персонажа из того же графа
+    found, updated_details = await async_crud.apply_status_effect(db, character_id, current_user.id, status_update.status_effect_id)
+    if not found: raise HTTPException(status_code=404, detail="Персонаж не найден")
 
-    # Fetch updated details *after* commit
-    updated_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if updated_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные после применения статуса")
 
     # --- Broadcast Logic ---
@@ -283,11 +297,10 @@ async def remove_status_effect_from_character(
     status_effect_id: int,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    updated_char_model = character_crud.remove_status_effect(db, character_id, current_user.id, status_effect_id)
+    db: AsyncSession = Depends(get_async_db)):
+    updated_char_model, character_details = await async_crud.remove_status_effect(db, character_id, current_user.id, status_effect_id)
     if updated_char_model is None: raise HTTPException(status_code=404, detail="Персонаж или статус-эффект не найден")
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -300,12 +313,11 @@ async def heal_character_endpoint(
     heal_request: schemas.HealRequest,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_async_db)):
     # heal_character already commits changes internally
-    updated_char_model = character_crud.heal_character(db=db, character_id=character_id, user_id=current_user.id, heal_request=heal_request)
+    updated_char_model, character_details = await async_crud.heal_character(db=db, character_id=character_id, user_id=current_user.id, heal_request=heal_request)
     if updated_char_model is None: raise HTTPException(status_code=500, detail="Неожиданная ошибка при лечении") # Should not happen if char exists
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные после лечения")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -317,12 +329,11 @@ async def take_short_rest(
     rest_request: schemas.ShortRestRequest,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_async_db)):
     # perform_short_rest commits changes
-    updated_char = character_crud.perform_short_rest(db=db, character_id=character_id, user_id=current_user.id, request=rest_request)
+    updated_char, character_details = await async_crud.perform_short_rest(db=db, character_id=character_id, user_id=current_user.id, request=rest_request)
     if updated_char is None: raise HTTPException(status_code=404, detail="Персонаж не найден") # Should be handled by crud
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные после короткого отдыха")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -333,12 +344,11 @@ async def take_long_rest(
     character_id: int,
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_async_db)):
     # perform_long_rest commits changes
-    updated_char = character_crud.perform_long_rest(db=db, character_id=character_id, user_id=current_user.id)
+    updated_char, character_details = await async_crud.perform_long_rest(db=db, character_id=character_id, user_id=current_user.id)
     if updated_char is None: raise HTTPException(status_code=404, detail="Персонаж не найден") # Should be handled by crud
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные после длительного отдыха")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -351,15 +361,13 @@ async def activate_character_action_endpoint(
     activation_data: schemas.ActivationRequest = Body(...),
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Already has lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
-    # activate_action handles commit and refresh internally
-    result = action_crud.activate_action(db=db, character_id=character_id, user_id=current_user.id, activation_data=activation_data)
+    db: AsyncSession = Depends(get_async_db)):
+    # activate_action commits changes and returns the character sheet built from the same graph
+    result, updated_character_details = await async_crud.activate_action(db=db, character_id=character_id, user_id=current_user.id, activation_data=activation_data)
 
     # --- Broadcast Logic (already partially present) ---
     # Broadcast only if the action indicated an update is needed
     if result and result.success and result.character_update_needed:
-        # Fetch fresh details AFTER the action's commit
-        updated_character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
         await _broadcast_update_if_needed(lobby_key, updated_character_details) # <-- Broadcast
     # --- End Broadcast ---
 
@@ -371,16 +379,11 @@ async def perform_character_skill_check(
     character_id: int,
     request: SkillCheckRequest,
     # lobby_key: Optional[str] = Query(None), # Skill checks usually don't change state to broadcast
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)):
-    # Preload necessary relations for the check
-    character = db.query(models.Character).options(
-        selectinload(models.Character.active_status_effects),
-        selectinload(models.Character.inventory).selectinload(models.CharacterInventoryItem.item)
-    ).filter(models.Character.id == character_id, models.Character.owner_id == current_user.id).first()
-    if not character: raise HTTPException(status_code=404, detail="Персонаж не найден")
-
-    result = perform_skill_check(db=db, character=character, skill_name=request.skill_name)
+    # Персонаж с нужными связями загружается внутри async_crud.perform_skill_check
+    result = await async_crud.perform_skill_check(db, character_id, current_user.id, request.skill_name)
+    if result is None: raise HTTPException(status_code=404, detail="Персонаж не найден")
     # No broadcast needed for a simple check result
     if not result.success:
         if "Неизвестный навык" in result.message: raise HTTPException(status_code=400, detail=result.message)
@@ -395,11 +398,10 @@ async def set_character_ability_slot(
     assignment_data: schemas.AssignAbilitySlotRequest = Body(...),
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Добавлен lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_async_db)):
     # assign_ability_to_slot commits changes
-    updated_char = slots_crud.assign_ability_to_slot(db=db, character_id=character_id, user_id=current_user.id, slot_number=slot_number, ability_id=assignment_data.ability_id)
+    updated_char, character_details = await async_crud.assign_ability_to_slot(db=db, character_id=character_id, user_id=current_user.id, slot_number=slot_number, ability_id=assignment_data.ability_id)
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные после назначения слота")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -411,11 +413,10 @@ async def end_character_turn_endpoint(
     character_id: int = Path(...),
     lobby_key: Optional[str] = Query(None, description="Ключ лобби для WebSocket broadcast"), # <-- Already has lobby_key
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_async_db)):
     # end_character_turn commits changes
-    updated_char = turn_crud.end_character_turn(db=db, character_id=character_id, user_id=current_user.id)
+    updated_char, character_details = await async_crud.end_character_turn(db=db, character_id=character_id, user_id=current_user.id)
     # --- Broadcast Logic ---
-    character_details = character_crud.get_character_details_for_output(db, character_id, current_user.id)
     if character_details is None: raise HTTPException(status_code=404, detail="Не удалось получить обновленные данные после завершения хода")
     await _broadcast_update_if_needed(lobby_key, character_details) # <-- Broadcast
     # --- End Broadcast ---
@@ -1,13 +1,15 @@
 # backend/app/routers/parties.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-# Убрали List, т.к. не используется в этом файле напрямую
-# from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Set
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Относительные импорты
 from .. import models, schemas # Нужны для response_model и типов
-from ..crud import party as party_crud # Используем CRUD для партий
-from ..db.database import get_db
+from ..crud import async_crud # Async-обёртки над CRUD партий
+from ..crud.character_serializer import iter_details_json
+from ..websockets.manager import manager
+from ..db.database import get_async_db
 from ..core.auth import get_current_user
 
 router = APIRouter(
@@ -16,22 +18,37 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
+async def require_lobby_character_ids(db: AsyncSession, lobby_key: str, user: models.User) -> Set[int]:
+    """
+    Проверяет, что пользователь — мастер (создатель партии) или участник партии
+    (присоединялся через /parties/join; сохраняется в БД, так что не зависит от
+    того, подключен ли сейчас сокет и на каком воркере), и возвращает id
+    персонажей, присутствующих в лобби. 404 — нет лобби, 403 — не участник.
+    """
+    lobby_key_upper = lobby_key.upper()
+    party = await async_crud.get_party_by_lobby_key(db=db, lobby_key=lobby_key_upper)
+    if party is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лобби не найдено")
+    if party.creator_id != user.id and not await async_crud.is_party_member(db=db, party_id=party.id, user_id=user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Вы не участник этого лобби")
+    return manager.get_character_ids_in_lobby(lobby_key_upper)
+
 @router.post("", response_model=schemas.PartyOut, summary="Создать новую партию")
 async def create_new_party(
     party_in: schemas.PartyCreate,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    party = party_crud.create_party(db=db, user_id=current_user.id, party=party_in)
+    party = await async_crud.create_party(db=db, user_id=current_user.id, party=party_in)
     return party
 
 @router.post("/join", response_model=schemas.PartyOut, summary="Присоединиться к партии")
 async def join_existing_party(
     join_data: schemas.PartyJoin,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    party = party_crud.get_party_by_lobby_key(db=db, lobby_key=join_data.lobby_key.upper())
+    party = await async_crud.get_party_by_lobby_key(db=db, lobby_key=join_data.lobby_key.upper())
     if party is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Лобби не найдено")
 
@@ -40,9 +57,43 @@ async def join_existing_party(
     if not party.creator:
          raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Не найден создатель лобби")
 
-    return schemas.PartyOut(
+    party_out = schemas.PartyOut(
         id=party.id,
         lobby_key=party.lobby_key,
         max_players=party.max_players,
         creator_username=party.creator.username
-    )
\ No newline at end of file
+    )
+    # Участие сохраняется в БД: по нему открываются история чата и листы лобби.
+    # Ответ собран заранее — после commit объект party истекает
+    if party.creator_id != current_user.id:
+        await async_crud.add_party_member(db=db, party_id=party.id, user_id=current_user.id)
+    return party_out
+
+@router.get("/{lobby_key}/chat", response_model=schemas.ChatHistoryOut, summary="История чата лобби")
+async def get_party_chat_history(
+    lobby_key: str,
+    before_id: Optional[int] = Query(None, description="Вернуть сообщения с id меньше этого (next_before_id предыдущей страницы)"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Только мастер и участники лобби (404 — нет лобби, 403 — не участник)
+    await require_lobby_character_ids(db, lobby_key, current_user)
+    # Keyset-пагинация от новых к старым; последние ~WS_CHAT_PERSIST_MS мс могут еще не быть записаны
+    return await async_crud.get_chat_history(db=db, lobby_key=lobby_key.upper(), before_id=before_id, limit=limit)
+
+@router.get(
+    "/{lobby_key}/characters", response_model=None, summary="Листы всех персонажей лобби",
+    responses={200: {"model": List[schemas.CharacterDetailedOut]}},
+    description="Полные листы персонажей, подключенных к лобби (по возрастанию id), одним запросом. "
+                "Доступно мастеру и участникам лобби."
+)
+async def get_party_characters(
+    lobby_key: str,
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    character_ids = await require_lobby_character_ids(db, lobby_key, current_user)
+    # Один набор IN-запросов на всех (персонажи из кэша не загружаются); ответ — поток JSON-массива
+    details_by_id = await async_crud.get_characters_details_for_output(db, sorted(character_ids))
+    return StreamingResponse(iter_details_json(details_by_id.values()), media_type="application/json")
@@ -1,12 +1,12 @@
 # backend/app/routers/reference_data.py
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 # Относительные импорты
-from .. import models, schemas # Нужны для response_model и типов
-from ..crud import reference as reference_crud # Используем CRUD для справочников
-from ..db.database import get_db
+from .. import schemas # Нужны для response_model
+from ..crud.reference_catalog import reference_catalog, etag_matches # Предсобранный каталог справочников
+from ..db.database import get_async_db
 
 router = APIRouter(
     prefix="/data",
@@ -14,38 +14,41 @@ router = APIRouter(
     # Обычно не требует аутентификации
 )
 
+# Клиент может кэшировать, но обязан перепроверять ETag (If-None-Match -> 304)
+_CACHE_CONTROL = "no-cache"
+
+async def _catalog_response(name: str, if_none_match: Optional[str], db: AsyncSession) -> Response:
+    """Отдает готовое JSON-тело справочника из каталога или 304, если ETag совпал."""
+    entry = await reference_catalog.get_entry(name, db)
+    headers = {"ETag": entry.etag, "Cache-Control": _CACHE_CONTROL}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
 @router.get("/weapons", response_model=List[schemas.WeaponOut], summary="Список всего оружия")
-def get_all_weapons_endpoint(db: Session = Depends(get_db)):
-    items = reference_crud.get_all_items(db, models.Weapon)
-    return items
+async def get_all_weapons_endpoint(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await _catalog_response("weapons", if_none_match, db)
 
 @router.get("/armor", response_model=List[schemas.ArmorOut], summary="Список всей брони")
-def get_all_armor_endpoint(db: Session = Depends(get_db)):
-    items = reference_crud.get_all_items(db, models.Armor)
-    return items
+async def get_all_armor_endpoint(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await _catalog_response("armor", if_none_match, db)
 
 @router.get("/shields", response_model=List[schemas.ShieldOut], summary="Список всех щитов")
-def get_all_shields_endpoint(db: Session = Depends(get_db)):
-    items = reference_crud.get_all_items(db, models.Shield)
-    return items
+async def get_all_shields_endpoint(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await _catalog_response("shields", if_none_match, db)
 
 @router.get("/general_items", response_model=List[schemas.GeneralItemOut], summary="Список общих предметов")
-def get_all_general_items_endpoint(db: Session = Depends(get_db)):
-    items = reference_crud.get_all_items(db, models.GeneralItem)
-    print(f"Fetched {len(items)} general items from CRUD.")
-    return items
+async def get_all_general_items_endpoint(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await _catalog_response("general_items", if_none_match, db)
 
 @router.get("/ammo", response_model=List[schemas.AmmoOut], summary="Список типов боеприпасов")
-def get_all_ammo_endpoint(db: Session = Depends(get_db)):
-    items = reference_crud.get_all_items(db, models.Ammo)
-    return items
+async def get_all_ammo_endpoint(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await _catalog_response("ammo", if_none_match, db)
 
 @router.get("/abilities", response_model=List[schemas.AbilityOut], summary="Список всех способностей")
-def get_all_abilities_endpoint(db: Session = Depends(get_db)):
-    abilities = reference_crud.get_all_abilities(db)
-    return abilities
+async def get_all_abilities_endpoint(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await _catalog_response("abilities", if_none_match, db)
 
 @router.get("/status_effects", response_model=List[schemas.StatusEffectOut], summary="Список всех статус-эффектов")
-def get_all_status_effects_endpoint(db: Session = Depends(get_db)):
-    effects = reference_crud.get_all_status_effects(db)
-    return effects
\ No newline at end of file
+async def get_all_status_effects_endpoint(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await _catalog_response("status_effects", if_none_match, db)
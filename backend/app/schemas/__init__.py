@@ -12,8 +12,9 @@ from .custom_item import CustomItemBase, CustomItemCreate, CustomItemOut
 from .character import (
     CharacterBase, InitialSkillDistribution, CharacterCreate, CharacterBriefOut,
     CharacterSkillModifiers, CharacterDerivedStats, CharacterClassBranchLevels,
-    CharacterNotes, CharacterDetailedOut, CharacterUpdateSkills, LevelUpInfo, HealRequest, ShortRestRequest, StatusEffectOut, AssignAbilitySlotRequest, ActiveAbilitySlotOut,
+    CharacterNotes, CharacterDetailedOut, CharacterBatchRequest, CharacterUpdateSkills, LevelUpInfo, HealRequest, ShortRestRequest, StatusEffectOut, AssignAbilitySlotRequest, ActiveAbilitySlotOut,
     UpdateCharacterStats, VALID_BRANCH_KEYS # Экспортируем константу
 )
 from .skill_check import SkillCheckRequest, SkillCheckResultOut
-from .action import ActivationRequest, ActionResultOut
\ No newline at end of file
+from .action import ActivationRequest, ActionResultOut
+from .chat import ChatMessageOut, ChatHistoryOut
\ No newline at end of file
@@ -252,6 +252,13 @@ class CharacterDetailedOut(
     model_config = ConfigDict(from_attributes=True)
 
 
+# Пакетный запрос листов (POST /characters/batch)
+class CharacterBatchRequest(BaseModel):
+    character_ids: List[int] = Field(..., min_length=1, max_length=100)
+    # Ключ лобби: кроме своих, доступны персонажи, присутствующие в этом лобби
+    lobby_key: Optional[str] = Field(None, min_length=6, max_length=6)
+
+
 # --- Схемы для Обновления Персонажа ---
 
 # Обновление базовых навыков (например, через редактор DM)
@@ -0,0 +1,18 @@
+# backend/app/schemas/chat.py
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+class ChatMessageOut(BaseModel):
+    id: int
+    sender: str
+    text: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ChatHistoryOut(BaseModel):
+    """ Страница истории чата: от новых к старым """
+    messages: List[ChatMessageOut]
+    next_before_id: Optional[int] = Field(None, description="before_id для следующей (более старой) страницы; null — история закончилась")
@@ -0,0 +1,350 @@
+# backend/app/websockets/backplane.py
+"""
+Межпроцессная шина (backplane) для лобби WebSocket.
+
+Каждый воркер uvicorn держит свои сокеты в своем ConnectionManager. Шина
+переносит между воркерами:
+- "broadcast"        — готовые сообщения (players_update и т.п.): JSON-тело
+                       байтами, закодированное один раз на отправителе;
+- "character_update" — полный снапшот персонажа (дельты каждый воркер
+                       считает сам от своих снапшотов);
+- "presence"         — вход/выход участника лобби (для списка игроков и
+                       проверки "персонаж уже в лобби").
+- "cache_bump"       — повышенные версии кэша листов персонажей
+                       (crud/character_cache.py), "lobby" = None.
+- "catalog_invalidate" — сброс каталога справочников
+                       (crud/reference_catalog.py), "lobby" = None.
+
+Реализации:
+- InMemoryBackplane — в пределах одного процесса (один воркер, отладка);
+- RedisBackplane    — Redis pub/sub + хэш участников лобби; требует пакет
+                      `redis` (redis.asyncio) или совместимый клиент
+                      (например, fakeredis), переданный в конструктор.
+
+Выбор: WS_BACKPLANE=memory|redis, адрес Redis — WS_BACKPLANE_URL.
+"""
+import abc
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Union
+
+import logging
+
+from . import codec
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+except ImportError: # redis — опциональная зависимость
+    aioredis = None
+
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "memory").lower()
+WS_BACKPLANE_URL = os.getenv("WS_BACKPLANE_URL", "redis://localhost:6379/0")
+WS_BACKPLANE_PREFIX = os.getenv("WS_BACKPLANE_PREFIX", "player_tool:ws")
+WS_BACKPLANE_NODE_TTL = int(os.getenv("WS_BACKPLANE_NODE_TTL", "30")) # сек; участники "мертвого" воркера не учитываются
+WS_BACKPLANE_KEEPALIVE = max(1, WS_BACKPLANE_NODE_TTL // 3) # сек; продление живости узла и сверка участников
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class Backplane(abc.ABC):
+    """
+    Интерфейс шины. publish() не ждет сети: события уходят по порядку из
+    внутренней очереди. Событие — JSON-совместимый dict с ключами
+    "kind", "lobby" и "origin" (node_id отправителя); свои события
+    подписчику не возвращаются.
+
+    Presence-события дополнительно ведут общий список участников лобби:
+    {"kind": "presence", "op": "join"|"leave", "member_id", "username", "character_id"}.
+
+    Упавший воркер leave не присылает: раз в WS_BACKPLANE_KEEPALIVE сек шина
+    продлевает живость своего узла и вызывает on_keepalive, где подписчик
+    сверяет удаленных участников с alive_nodes().
+    """
+
+    def __init__(self):
+        self.node_id: Optional[str] = None
+        self._handler: Optional[EventHandler] = None
+        self._outgoing: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.on_keepalive: Optional[Callable[[], Awaitable[None]]] = None
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    async def start(self, node_id: str, handler: EventHandler) -> None:
+        self.node_id = node_id
+        self._handler = handler
+        self._outgoing = asyncio.Queue()
+        await self._open()
+        self._tasks.append(asyncio.create_task(self._publisher()))
+        self._tasks.append(asyncio.create_task(self._keepalive()))
+
+    async def stop(self) -> None:
+        if self._outgoing is not None:
+            # Дожидаемся отправки уже поставленных событий (например, presence leave)
+            try:
+                await asyncio.wait_for(self._outgoing.join(), timeout=2)
+            except asyncio.TimeoutError:
+                logger.warning("Backplane stopped with unsent events.")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        await self._close()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        if self._outgoing is None:
+            return # Шина не запущена — работаем только локально
+        self._outgoing.put_nowait({**event, "origin": self.node_id})
+
+    @abc.abstractmethod
+    async def get_members(self, lobby_key: str) -> Dict[str, Dict[str, Any]]:
+        """Участники лобби на других воркерах: { member_id: {"username", "character_id"} }."""
+
+    @abc.abstractmethod
+    async def alive_nodes(self, nodes: Iterable[str]) -> Set[str]:
+        """Узлы из `nodes`, которые сейчас подключены к шине."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "node_id": self.node_id,
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+            "pending": self._outgoing.qsize() if self._outgoing is not None else 0,
+        }
+
+    # --- Реализуется наследниками ---
+    async def _open(self) -> None:
+        pass
+
+    async def _close(self) -> None:
+        pass
+
+    async def _refresh(self) -> None:
+        """Продлевает живость своего узла."""
+
+    @abc.abstractmethod
+    async def _send(self, event: Dict[str, Any]) -> None:
+        """Доставляет событие остальным воркерам."""
+
+    # --- Общее ---
+    async def _publisher(self) -> None:
+        while True:
+            event = await self._outgoing.get()
+            try:
+                await self._send(event)
+                self.published += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Backplane publish failed ({event.get('kind')} for lobby {event.get('lobby')}): {e!r}")
+            finally:
+                self._outgoing.task_done()
+
+    async def _keepalive(self) -> None:
+        while True:
+            await asyncio.sleep(WS_BACKPLANE_KEEPALIVE)
+            try:
+                await self._refresh()
+                if self.on_keepalive is not None:
+                    await self.on_keepalive()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Backplane keepalive failed: {e!r}")
+
+    async def _dispatch(self, event: Dict[str, Any]) -> None:
+        if event.get("origin") == self.node_id:
+            return
+        self.received += 1
+        try:
+            await self._handler(event)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Backplane event handler failed for {event.get('kind')}: {e!r}", exc_info=True)
+
+
+class InMemoryHub:
+    """Общая точка для InMemoryBackplane в одном процессе."""
+
+    def __init__(self):
+        self.subscribers: List["InMemoryBackplane"] = []
+        self.members: Dict[str, Dict[str, Dict[str, Any]]] = {} # lobby -> member_id -> info
+
+
+_default_hub = InMemoryHub()
+
+
+class InMemoryBackplane(Backplane):
+    def __init__(self, hub: Optional[InMemoryHub] = None):
+        super().__init__()
+        self.hub = hub or _default_hub
+
+    async def _open(self) -> None:
+        self.hub.subscribers.append(self)
+
+    async def _close(self) -> None:
+        if self in self.hub.subscribers:
+            self.hub.subscribers.remove(self)
+        # Участники этого узла больше не в лобби
+        for lobby_key, members in list(self.hub.members.items()):
+            for member_id in [m for m, info in members.items() if info.get("node") == self.node_id]:
+                del members[member_id]
+            if not members:
+                del self.hub.members[lobby_key]
+
+    async def _send(self, event: Dict[str, Any]) -> None:
+        if event["kind"] == "presence":
+            apply_presence(self.hub.members, event)
+        for subscriber in list(self.hub.subscribers):
+            if subscriber is not self:
+                await subscriber._dispatch(event)
+
+    async def alive_nodes(self, nodes: Iterable[str]) -> Set[str]:
+        return set(nodes) & {subscriber.node_id for subscriber in self.hub.subscribers}
+
+    async def get_members(self, lobby_key: str) -> Dict[str, Dict[str, Any]]:
+        return {
+            member_id: info
+            for member_id, info in self.hub.members.get(lobby_key, {}).items()
+            if info.get("node") != self.node_id
+        }
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub: все события идут в один канал `<prefix>:events`; участники
+    лобби хранятся в хэше `<prefix>:lobby:<KEY>:members`. Живость воркера —
+    ключ `<prefix>:node:<node_id>` с TTL, который продлевается фоновой задачей;
+    участники воркеров без этого ключа (упавших) игнорируются.
+    """
+
+    def __init__(self, url: str = WS_BACKPLANE_URL, client: Any = None, prefix: str = WS_BACKPLANE_PREFIX):
+        super().__init__()
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("WS_BACKPLANE=redis requires the 'redis' package (pip install redis).")
+            client = aioredis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.channel = f"{prefix}:events"
+        self._pubsub = None
+
+    def _members_key(self, lobby_key: str) -> str:
+        return f"{self.prefix}:lobby:{lobby_key}:members"
+
+    def _node_key(self, node_id: str) -> str:
+        return f"{self.prefix}:node:{node_id}"
+
+    async def _open(self) -> None:
+        await self.client.set(self._node_key(self.node_id), "1", ex=WS_BACKPLANE_NODE_TTL)
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._tasks.append(asyncio.create_task(self._reader()))
+
+    async def _close(self) -> None:
+        try:
+            if self._pubsub is not None:
+                await self._pubsub.unsubscribe(self.channel)
+                await self._pubsub.close()
+            await self.client.delete(self._node_key(self.node_id))
+        except Exception as e:
+            logger.warning(f"Error while closing Redis backplane: {e!r}")
+
+    async def _send(self, event: Dict[str, Any]) -> None:
+        if event["kind"] == "presence":
+            key = self._members_key(event["lobby"])
+            if event["op"] == "join":
+                info = {"username": event["username"], "character_id": event["character_id"], "node": event["origin"]}
+                await self.client.hset(key, event["member_id"], codec.dumps(info))
+            else:
+                await self.client.hdel(key, event["member_id"])
+        await self.client.publish(self.channel, self._pack(event))
+
+    @staticmethod
+    def _pack(event: Dict[str, Any]) -> bytes:
+        """
+        Конверт события в JSON; готовое тело broadcast (bytes) идет после перевода
+        строки как есть (компактный JSON конверта переводов строк не содержит).
+        """
+        message = event.get("message")
+        if isinstance(message, bytes):
+            return codec.dumps({**event, "message": None}) + b"\n" + message
+        return codec.dumps(event)
+
+    @staticmethod
+    def _unpack(data: Union[str, bytes]) -> Dict[str, Any]:
+        if isinstance(data, str):
+            data = data.encode()
+        head, separator, message = data.partition(b"\n")
+        event = codec.loads(head)
+        if separator:
+            event["message"] = message
+        return event
+
+    async def _reader(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Redis backplane read failed: {e!r}")
+                await asyncio.sleep(1)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            data = message["data"]
+            try:
+                event = self._unpack(data)
+            except ValueError:
+                logger.warning("Malformed backplane event skipped.")
+                continue
+            await self._dispatch(event)
+
+    async def _refresh(self) -> None:
+        await self.client.set(self._node_key(self.node_id), "1", ex=WS_BACKPLANE_NODE_TTL)
+
+    async def alive_nodes(self, nodes: Iterable[str]) -> Set[str]:
+        nodes = list(set(nodes))
+        if not nodes:
+            return set()
+        values = await self.client.mget([self._node_key(node) for node in nodes])
+        return {node for node, value in zip(nodes, values) if value is not None}
+
+    async def get_members(self, lobby_key: str) -> Dict[str, Dict[str, Any]]:
+        raw = await self.client.hgetall(self._members_key(lobby_key))
+        members: Dict[str, Dict[str, Any]] = {}
+        for member_id, value in raw.items():
+            member_id = member_id.decode() if isinstance(member_id, bytes) else member_id
+            info = codec.loads(value)
+            if info.get("node") != self.node_id:
+                members[member_id] = info
+        alive = await self.alive_nodes(info.get("node") for info in members.values())
+        return {member_id: info for member_id, info in members.items() if info.get("node") in alive}
+
+
+def apply_presence(members: Dict[str, Dict[str, Dict[str, Any]]], event: Dict[str, Any]) -> None:
+    """Применяет presence-событие к словарю lobby -> member_id -> info."""
+    lobby_members = members.setdefault(event["lobby"], {})
+    if event["op"] == "join":
+        lobby_members[event["member_id"]] = {
+            "username": event["username"],
+            "character_id": event["character_id"],
+            "node": event["origin"],
+        }
+    else:
+        lobby_members.pop(event["member_id"], None)
+    if not lobby_members:
+        del members[event["lobby"]]
+
+
+def create_backplane() -> Backplane:
+    """Создает шину по WS_BACKPLANE."""
+    if WS_BACKPLANE == "redis":
+        return RedisBackplane(WS_BACKPLANE_URL)
+    if WS_BACKPLANE != "memory":
+        logger.warning(f"Unknown WS_BACKPLANE '{WS_BACKPLANE}', using in-memory backplane.")
+    return InMemoryBackplane()
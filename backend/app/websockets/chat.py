@@ -0,0 +1,187 @@
+# backend/app/websockets/chat.py
+"""
+Чат лобби: ограничение частоты, пакетная рассылка и сохранение истории.
+
+- Ограничение: token bucket на пользователя в лобби (WS_CHAT_RATE сообщений/сек,
+  запас WS_CHAT_BURST). Лишние и слишком длинные сообщения отклоняются,
+  автору приходит {"type": "system", "text": ...}.
+- Рассылка: сообщения, пришедшие в лобби за WS_CHAT_BATCH_MS, уходят одним
+  проходом. Клиенты с chatBatch=1 получают один кадр
+  {"type": "chat_batch", "messages": [...]} (включая свои сообщения), остальные —
+  прежние кадры {"type": "chat"} без собственных сообщений.
+- История: сообщения копятся и пишутся в chat_messages одним INSERT раз в
+  WS_CHAT_PERSIST_MS или по накоплении WS_CHAT_PERSIST_BATCH штук.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from ..crud import async_crud
+from ..db.database import AsyncSessionLocal
+from .codec import Frame
+from .manager import ConnectionManager, manager
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+WS_CHAT_RATE = float(os.getenv("WS_CHAT_RATE", "2")) # сообщений в секунду на пользователя
+WS_CHAT_BURST = int(os.getenv("WS_CHAT_BURST", "5"))
+WS_CHAT_MAX_LENGTH = int(os.getenv("WS_CHAT_MAX_LENGTH", "2000"))
+WS_CHAT_BATCH_MS = float(os.getenv("WS_CHAT_BATCH_MS", "50")) # 0 — рассылка сразу
+WS_CHAT_PERSIST_MS = float(os.getenv("WS_CHAT_PERSIST_MS", "500"))
+WS_CHAT_PERSIST_BATCH = int(os.getenv("WS_CHAT_PERSIST_BATCH", "200"))
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, now: float):
+        self.tokens = float(WS_CHAT_BURST)
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(float(WS_CHAT_BURST), self.tokens + (now - self.updated) * WS_CHAT_RATE)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class ChatPipeline:
+    def __init__(self, connection_manager: ConnectionManager):
+        self.manager = connection_manager
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {} # (lobby, username) -> bucket
+        # Ожидают рассылки: lobby -> [(сообщение, сокет автора)]
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], Optional[WebSocket]]]] = {}
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
+        # Ожидают записи в БД (все лобби вместе)
+        self._to_persist: List[Dict[str, Any]] = []
+        self._persist_wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self.stats = {"accepted": 0, "rate_limited": 0, "too_long": 0, "batches": 0, "persisted": 0, "persist_errors": 0}
+
+    # --- Жизненный цикл ---
+    def start(self) -> None:
+        if self._writer is None or self._writer.done():
+            self._persist_wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._persist_loop())
+
+    async def stop(self) -> None:
+        """Рассылает ожидающие сообщения и дописывает историю."""
+        for lobby_key, task in list(self._flush_tasks.items()):
+            task.cancel()
+            self._deliver(lobby_key)
+        self._flush_tasks.clear()
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        await self._persist_pending()
+
+    # --- Прием ---
+    async def submit(self, websocket: WebSocket, lobby_key_upper: str, username: str, text: str) -> bool:
+        """Принимает сообщение от клиента. False — отклонено (автор получает system-сообщение)."""
+        if len(text) > WS_CHAT_MAX_LENGTH:
+            self.stats["too_long"] += 1
+            await self.manager.send_personal_message(websocket, Frame({"type": "system", "text": f"Сообщение длиннее {WS_CHAT_MAX_LENGTH} символов не отправлено."}))
+            return False
+        now = time.monotonic()
+        bucket = self._buckets.get((lobby_key_upper, username))
+        if bucket is None:
+            bucket = self._buckets[(lobby_key_upper, username)] = TokenBucket(now)
+        if not bucket.take(now):
+            self.stats["rate_limited"] += 1
+            logger.debug(f"Chat message from {username} in {lobby_key_upper} rate-limited.")
+            await self.manager.send_personal_message(websocket, Frame({"type": "system", "text": "Слишком много сообщений, подождите немного."}))
+            return False
+
+        self.stats["accepted"] += 1
+        message = {"sender": username, "text": text, "ts": int(time.time() * 1000)}
+        self._pending.setdefault(lobby_key_upper, []).append((message, websocket))
+        if WS_CHAT_BATCH_MS <= 0:
+            self._deliver(lobby_key_upper)
+        elif lobby_key_upper not in self._flush_tasks:
+            self._flush_tasks[lobby_key_upper] = asyncio.create_task(self._flush_after_window(lobby_key_upper))
+
+        self._to_persist.append({"lobby_key": lobby_key_upper, "sender": username, "text": text, "created_at": datetime.now(timezone.utc)})
+        self.start() # Писатель истории запускается лениво (например, без lifespan)
+        if len(self._to_persist) >= WS_CHAT_PERSIST_BATCH:
+            self._persist_wakeup.set()
+        return True
+
+    # --- Рассылка ---
+    async def _flush_after_window(self, lobby_key_upper: str) -> None:
+        try:
+            await asyncio.sleep(WS_CHAT_BATCH_MS / 1000)
+        except asyncio.CancelledError:
+            return
+        self._flush_tasks.pop(lobby_key_upper, None)
+        self._deliver(lobby_key_upper)
+
+    def _deliver(self, lobby_key_upper: str) -> None:
+        pending = self._pending.pop(lobby_key_upper, None)
+        if not pending:
+            return
+        self.stats["batches"] += 1
+        self.manager.deliver_chat(lobby_key_upper, [message for message, _ in pending], [sender for _, sender in pending])
+
+    # --- История ---
+    async def _persist_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._persist_wakeup.wait(), timeout=WS_CHAT_PERSIST_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._persist_wakeup.clear()
+            await self._persist_pending()
+            self._prune_buckets()
+
+    async def _persist_pending(self) -> None:
+        batch, self._to_persist = self._to_persist, []
+        if not batch:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                self.stats["persisted"] += await async_crud.save_chat_messages(db, batch)
+        except asyncio.CancelledError:
+            self._to_persist[:0] = batch # Остановка во время записи: пачка допишется в stop()
+            raise
+        except Exception as e:
+            self.stats["persist_errors"] += 1
+            logger.error(f"Failed to persist {len(batch)} chat message(s): {e!r}")
+
+    def _prune_buckets(self) -> None:
+        """Удаляет бакеты, которые уже полностью восполнились (пользователь давно молчит)."""
+        now = time.monotonic()
+        idle = WS_CHAT_BURST / WS_CHAT_RATE if WS_CHAT_RATE > 0 else float("inf")
+        for key in [key for key, bucket in self._buckets.items() if now - bucket.updated > idle]:
+            del self._buckets[key]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "config": {
+                "rate_per_s": WS_CHAT_RATE,
+                "burst": WS_CHAT_BURST,
+                "max_length": WS_CHAT_MAX_LENGTH,
+                "batch_window_ms": WS_CHAT_BATCH_MS,
+                "persist_interval_ms": WS_CHAT_PERSIST_MS,
+                "persist_batch": WS_CHAT_PERSIST_BATCH,
+            },
+            **self.stats,
+            "pending_delivery": sum(len(messages) for messages in self._pending.values()),
+            "pending_persist": len(self._to_persist),
+            "rate_buckets": len(self._buckets),
+        }
+
+
+# Singleton instance
+chat_pipeline = ChatPipeline(manager)
@@ -0,0 +1,114 @@
+# backend/app/websockets/codec.py
+"""
+Кодирование исходящих WebSocket-сообщений.
+
+Сообщение оборачивается в Frame и кодируется не более одного раза на каждый
+формат; один и тот же Frame ставится в очереди всех получателей. JSON-тело
+хранится байтами (как его отдает orjson): те же байты уходят в шину между
+воркерами, а lobby_seq дописывается в них без повторного кодирования (with_field).
+
+Форматы (параметр `encoding` при подключении к /ws):
+- "json"    — текстовые кадры (по умолчанию); orjson, если установлен, иначе stdlib json;
+- "msgpack" — бинарные кадры MessagePack; требует пакет `msgpack`.
+Кадры от клиента к серверу остаются текстовыми в любом режиме.
+"""
+import json
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError: # orjson — опциональное ускорение
+    orjson = None
+
+try:
+    import msgpack
+except ImportError: # msgpack — опциональный бинарный протокол
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+
+def supported_encodings() -> tuple:
+    return (ENCODING_JSON, ENCODING_MSGPACK) if msgpack is not None else (ENCODING_JSON,)
+
+
+def dumps(obj: Any) -> bytes:
+    """Компактный JSON в UTF-8."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class Frame:
+    """Исходящее сообщение с лениво вычисляемыми и кэшируемыми представлениями."""
+
+    __slots__ = ("_payload", "_encoded", "_text", "_binary")
+
+    def __init__(self, payload: Any = None, text: Optional[str] = None, encoded: Optional[bytes] = None):
+        self._payload = payload
+        self._encoded = encoded
+        self._text = text
+        self._binary: Optional[bytes] = None
+
+    @property
+    def payload(self) -> Any:
+        if self._payload is None and (self._encoded is not None or self._text is not None):
+            self._payload = loads(self._encoded if self._encoded is not None else self._text)
+        return self._payload
+
+    @property
+    def encoded(self) -> bytes:
+        """JSON-тело байтами (для шины и для text)."""
+        if self._encoded is None:
+            self._encoded = self._text.encode() if self._text is not None else dumps(self._payload)
+        return self._encoded
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.encoded.decode()
+        return self._text
+
+    @property
+    def is_object(self) -> bool:
+        """Кадр — JSON-объект (без разбора уже закодированного тела)."""
+        if self._payload is not None:
+            return isinstance(self._payload, dict)
+        return self.encoded[:1] == b"{"
+
+    def with_field(self, key: str, value: Any) -> "Frame":
+        """
+        Копия кадра-объекта с дополнительным полем верхнего уровня. Поле
+        дописывается в готовое JSON-тело; исходный payload повторно не кодируется.
+        """
+        body = self.encoded
+        field = dumps({key: value})[1:-1]
+        frame = Frame(encoded=body[:-1] + (b"," + field if body != b"{}" else field) + b"}")
+        if self._payload is not None:
+            frame._payload = {**self._payload, key: value}
+        return frame
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = msgpack.packb(self.payload, use_bin_type=True)
+        return self._binary
+
+    def __len__(self) -> int:
+        return len(self.encoded)
+
+
+def as_frame(message: Union[Frame, str, dict]) -> Frame:
+    """Frame из готового кадра, JSON-строки или dict."""
+    if isinstance(message, Frame):
+        return message
+    if isinstance(message, str):
+        return Frame(text=message)
+    return Frame(payload=message)
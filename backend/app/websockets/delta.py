@@ -0,0 +1,37 @@
+# backend/app/websockets/delta.py
+"""
+Структурный diff снапшотов персонажа для character_patch.
+
+Результат — список операций JSON Patch (RFC 6902), только "replace":
+- словари с одинаковым набором ключей сравниваются рекурсивно;
+- списки одинаковой длины сравниваются поэлементно (путь с индексом);
+- всё остальное (изменилась длина списка, набор ключей или тип) заменяется целиком.
+
+Схема CharacterDetailedOut фиксирована, поэтому этого достаточно: изменение
+HP даёт одну операцию `/current_hp`, расход патронов — `/inventory/3/quantity`.
+"""
+from typing import Any, Dict, List
+
+
+def _escape(key: str) -> str:
+    # RFC 6901: "~" -> "~0", "/" -> "~1"
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def diff(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """Возвращает список replace-операций, превращающих `old` в `new`."""
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict) and old.keys() == new.keys():
+        ops: List[Dict[str, Any]] = []
+        for key, value in new.items():
+            if old[key] != value:
+                ops.extend(diff(old[key], value, f"{path}/{_escape(key)}"))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            if old_item != new_item:
+                ops.extend(diff(old_item, new_item, f"{path}/{index}"))
+        return ops
+    return [{"op": "replace", "path": path, "value": new}]
@@ -1,94 +1,344 @@
-from typing import Dict, List, Tuple, Optional, Set
+from typing import Dict, List, Tuple, Optional, Set, Any, Union
 from fastapi import WebSocket, status # Added status
 from starlette.websockets import WebSocketState
-import json
+import asyncio
+import itertools
 import logging
+import os
+import time
+import uuid
+
+from ..crud.character_cache import character_details_cache
+from ..crud.reference_catalog import reference_catalog
+from .delta import diff as compute_delta
+from .backplane import Backplane
+from .codec import Frame, as_frame, ENCODING_MSGPACK
+from .outbox import ConnectionOutbox, WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY, WS_SEND_TIMEOUT
+from .registry import Connection, ConnectionRegistry, Lobby, WS_REPLAY_BUFFER
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Heartbeat: клиентам с heartbeat=1 раз в WS_PING_INTERVAL сек. уходит {"type": "ping"};
+# если от клиента нет ни одного кадра дольше WS_PING_INTERVAL + WS_PING_TIMEOUT, он выселяется.
+# Проверка закрытых/упавших сокетов делается для всех соединений лобби.
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+WS_PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", "20"))
+
+# Окно объединения обновлений персонажа (мс): за окно по каждому персонажу
+# рассылается только последнее состояние. 0 — рассылка сразу.
+WS_BROADCAST_DEBOUNCE_MS = float(os.getenv("WS_BROADCAST_DEBOUNCE_MS", "40"))
+
+# Коды закрытия при выселении
+_EVICTION_CLOSE_CODES = {
+    "heartbeat_timeout": status.WS_1001_GOING_AWAY,
+    "slow_consumer": status.WS_1013_TRY_AGAIN_LATER,
+}
+
 class ConnectionManager:
     def __init__(self):
-        # Format: { lobby_key: [ (websocket, username, character_id), ... ] }
-        self.active_connections: Dict[str, List[Tuple[WebSocket, str, Optional[int]]]] = {}
-        # Format: { lobby_key: {websocket: character_id} }
-        self.lobby_characters: Dict[str, Dict[WebSocket, Optional[int]]] = {}
+        # Лобби и соединения с индексами по сокету/персонажу/пользователю (см. registry.py)
+        self.registry = ConnectionRegistry()
+        # --- Delta-рассылка (character_patch): снапшоты хранятся в Lobby, известные seq — в Connection ---
+        self._snapshot_seq = itertools.count(1) # общий монотонный счетчик seq
+        # --- Backplane: лобби, разделенные между воркерами ---
+        self.node_id = uuid.uuid4().hex[:12]
+        self.backplane: Optional[Backplane] = None # None — только локальная рассылка
+        self._loop: Optional[asyncio.AbstractEventLoop] = None # цикл событий шины (для публикаций из потоков)
+        # --- Heartbeat / выселение мертвых сокетов ---
+        self.evictions_total: Dict[str, int] = {} # причина -> число выселенных соединений (за всё время)
+        self._background: Set[asyncio.Task] = set() # ссылки на фоновые задачи (закрытие сокетов, players_update)
+        # --- Возобновление сессий (lastSeq) ---
+        self.replay_stats: Dict[str, int] = {"resumed": 0, "replayed_events": 0, "full_sync_fallbacks": 0}
         logger.info("ConnectionManager initialized.")
 
-    async def connect(self, websocket: WebSocket, lobby_key: str, username: str, character_id: Optional[int]) -> bool:
+    # --- Backplane ---
+    async def start_backplane(self, backplane: Backplane):
+        """Подключает шину между воркерами (вызывается при старте приложения)."""
+        backplane.on_keepalive = self._prune_dead_nodes
+        await backplane.start(self.node_id, self._on_backplane_event)
+        self.backplane = backplane
+        self._loop = asyncio.get_running_loop()
+        character_details_cache.on_bump = self._publish_cache_bump
+        reference_catalog.on_invalidate = self._publish_catalog_invalidate
+        logger.info(f"Backplane {type(backplane).__name__} started (node {self.node_id}).")
+
+    async def stop_backplane(self):
+        if self.backplane is not None:
+            character_details_cache.on_bump = None
+            reference_catalog.on_invalidate = None
+            backplane, self.backplane = self.backplane, None
+            await backplane.stop()
+
+    def _member_id(self, websocket: WebSocket) -> str:
+        return f"{self.node_id}:{id(websocket)}"
+
+    def _publish(self, event: Dict[str, Any]):
+        if self.backplane is not None:
+            self.backplane.publish(event)
+
+    def _publish_cache_bump(self, character_ids: Set[Any]):
+        """Коммит в этом процессе повысил версии кэша листов — сообщаем остальным воркерам."""
+        self._publish_threadsafe({"kind": "cache_bump", "lobby": None, "characters": sorted(character_ids, key=str)})
+
+    def _publish_catalog_invalidate(self):
+        """Справочники изменились в этом процессе — остальные воркеры сбрасывают свой каталог."""
+        self._publish_threadsafe({"kind": "catalog_invalidate", "lobby": None})
+
+    def _publish_threadsafe(self, event: Dict[str, Any]):
+        """
+        Публикация из хуков commit: коммит синхронной сессии идет в потоке пула,
+        поэтому публикация передается в цикл событий.
+        """
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._publish(event)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, event)
+
+    async def _on_backplane_event(self, event: Dict[str, Any]):
+        """Событие от другого воркера: доставляем только своим сокетам, обратно не публикуем."""
+        kind = event.get("kind")
+        lobby_key_upper = event.get("lobby")
+        if kind == "cache_bump":
+            character_details_cache.bump(set(event["characters"]))
+        elif kind == "catalog_invalidate":
+            reference_catalog.reset()
+        elif kind == "presence":
+            lobby = self.registry.get(lobby_key_upper)
+            if lobby is None:
+                return # Лобби здесь нет; при первом подключении участники загрузятся из шины
+            if event["op"] == "join":
+                lobby.add_remote(event["member_id"], {
+                    "username": event["username"], "character_id": event["character_id"], "node": event["origin"],
+                })
+            elif lobby.remove_remote(event["member_id"]) is not None and event.get("character_id") is not None:
+                self._forget_character_snapshot(lobby, event["character_id"])
+        elif kind == "broadcast":
+            self._broadcast_local(lobby_key_upper, Frame(encoded=event["message"]), None, event.get("coalesce_key"))
+        elif kind == "character_update":
+            self._deliver_character_update(lobby_key_upper, event["character"])
+        elif kind == "chat":
+            self.deliver_chat(lobby_key_upper, event["messages"], [None] * len(event["messages"]), publish=False)
+        else:
+            logger.warning(f"Unknown backplane event kind '{kind}' ignored.")
+
+    async def _prune_dead_nodes(self, lobbies: Optional[List[Lobby]] = None):
+        """
+        Убирает удаленных участников, чей воркер больше не жив (упал, не прислав
+        presence leave). Вызывается шиной на каждом keepalive и перед отказом
+        в подключении из-за "персонаж уже в лобби".
+        """
+        if self.backplane is None:
+            return
+        lobbies = list(self.registry.lobbies.values()) if lobbies is None else lobbies
+        nodes = {info.get("node") for lobby in lobbies for info in lobby.remote_members.values()}
+        if not nodes:
+            return
+        alive = await self.backplane.alive_nodes(nodes)
+        for lobby in lobbies:
+            dead = [member_id for member_id, info in lobby.remote_members.items() if info.get("node") not in alive]
+            for member_id in dead:
+                info = lobby.remove_remote(member_id)
+                if info.get("character_id") is not None:
+                    self._forget_character_snapshot(lobby, info["character_id"])
+            if dead:
+                logger.warning(f"Dropped {len(dead)} member(s) of dead worker(s) from lobby '{lobby.key}'.")
+                if lobby.connections:
+                    self._schedule_players_update(lobby)
+
+    def lobby_has_members(self, lobby_key: str) -> bool:
+        """Есть ли в лобби участники на этом или другом воркере."""
+        lobby = self.registry.get(lobby_key.upper())
+        return lobby is not None and lobby.has_members()
+
+    async def connect(self, websocket: WebSocket, lobby_key: str, username: str, character_id: Optional[int], delta: bool = False, encoding: str = "json", heartbeat: bool = False, chat_batch: bool = False) -> bool:
         """Handles a new WebSocket connection, associating character_id."""
         # --- NOTE: Moved websocket.accept() to the /ws endpoint AFTER validation ---
         # await websocket.accept() # Moved to main.py after validation
         lobby_key_upper = lobby_key.upper() # Работаем с ключом в верхнем регистре
 
-        if lobby_key_upper not in self.active_connections:
-            self.active_connections[lobby_key_upper] = []
-            self.lobby_characters[lobby_key_upper] = {} # Инициализируем словарь персонажей
+        lobby, created = self.registry.get_or_create(lobby_key_upper)
+        if created:
             logger.info(f"Lobby '{lobby_key_upper}' created on first connect by '{username}'.")
+            lobby.heartbeat_task = asyncio.create_task(self._heartbeat_loop(lobby))
+            if self.backplane is not None:
+                # Участники, подключенные к другим воркерам
+                try:
+                    lobby.set_remote_members(await self.backplane.get_members(lobby_key_upper))
+                except Exception as e:
+                    logger.error(f"Failed to load lobby '{lobby_key_upper}' members from backplane: {e!r}")
 
         # Check if character is already actively connected in this lobby by another socket
         # (Avoids duplicate character entries if user reconnects quickly etc.)
-        current_lobby_char_ids = set(self.lobby_characters.get(lobby_key_upper, {}).values())
-        if character_id is not None and character_id in current_lobby_char_ids:
+        if character_id is not None and character_id in lobby.remote_by_character:
+            # Персонаж числится за другим воркером — проверяем, жив ли тот
+            try:
+                await self._prune_dead_nodes([lobby])
+            except Exception as e:
+                logger.error(f"Failed to check backplane nodes for lobby '{lobby_key_upper}': {e!r}")
+            if self.registry.lobbies.setdefault(lobby_key_upper, lobby) is lobby and lobby.heartbeat_task is None:
+                # Пока ждали шину, лобби покинуло последнее локальное соединение — возвращаем его в реестр
+                lobby.heartbeat_task = asyncio.create_task(self._heartbeat_loop(lobby))
+            lobby = self.registry.get(lobby_key_upper)
+        if character_id is not None and lobby.has_character(character_id):
              logger.warning(f"User '{username}' attempted to connect with CharID {character_id} which is already in lobby '{lobby_key_upper}'. Refusing connection.")
+             if lobby.is_empty:
+                 self.registry.lobbies.pop(lobby_key_upper, None) # Лобби без локальных соединений не храним
+                 self._stop_heartbeat(lobby)
              # Close the connection attempt before adding it
              # Send a specific close reason if possible (check WebSocket close codes)
              await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=f"Character {character_id} already active in lobby.")
              return False # Indicate connection failed
 
         # Добавляем соединение и информацию о персонаже
-        connection_tuple = (websocket, username, character_id)
-        self.active_connections[lobby_key_upper].append(connection_tuple)
-        self.lobby_characters[lobby_key_upper][websocket] = character_id
+        conn = Connection(websocket, lobby_key_upper, username, character_id, self._member_id(websocket))
+        if delta:
+            conn.known_seqs = {}
+        conn.heartbeat = heartbeat
+        conn.chat_batch = chat_batch
+        conn.outbox = ConnectionOutbox(
+            websocket,
+            lobby.metrics,
+            on_dead=lambda ws, reason: self._evict(lobby_key_upper, [ws], reason),
+            on_drop=self._on_message_dropped,
+            binary=encoding == ENCODING_MSGPACK,
+        )
+        self.registry.add(lobby, conn)
+        conn.outbox.start()
+        self._publish({
+            "kind": "presence", "op": "join", "lobby": lobby_key_upper,
+            "member_id": conn.member_id, "username": username, "character_id": character_id,
+        })
 
-        logger.info(f"User '{username}' (CharID: {character_id}) connected to lobby '{lobby_key_upper}'.")
-        logger.info(f" Current connections in lobby: {[(u, c) for _, u, c in self.active_connections.get(lobby_key_upper, [])]}") # Use .get for safety
+        logger.info(f"User '{username}' (CharID: {character_id}) connected to lobby '{lobby_key_upper}' ({len(lobby.connections)} local connections).")
         return True
 
-    def disconnect(self, websocket: WebSocket, lobby_key: str):
-        """Handles a WebSocket disconnection, removing character info."""
+    def disconnect(self, websocket: WebSocket, lobby_key: str) -> bool:
+        """
+        Handles a WebSocket disconnection, removing character info.
+        Возвращает False, если соединение уже было удалено (например, выселено heartbeat'ом).
+        """
         lobby_key_upper = lobby_key.upper()
-        disconnected_user = "unknown"
-        disconnected_char_id = None
-
-        if lobby_key_upper in self.active_connections:
-            connection_to_remove: Optional[Tuple[WebSocket, str, Optional[int]]] = None
-            # Iterate safely over a copy or use index if necessary
-            # For simplicity, find the connection first, then remove
-            found = False
-            for i, conn_tuple in enumerate(self.active_connections[lobby_key_upper]):
-                 if conn_tuple[0] == websocket:
-                      connection_to_remove = conn_tuple
-                      disconnected_user = conn_tuple[1]
-                      disconnected_char_id = conn_tuple[2] # Get character ID
-                      del self.active_connections[lobby_key_upper][i] # Remove by index
-                      found = True
-                      logger.info(f"Removed connection for '{disconnected_user}' (CharID: {disconnected_char_id}) from lobby '{lobby_key_upper}'.")
-                      break
-
-            # Remove character mapping from lobby_characters
-            if lobby_key_upper in self.lobby_characters and websocket in self.lobby_characters[lobby_key_upper]:
-                del self.lobby_characters[lobby_key_upper][websocket]
-                logger.info(f"Removed character mapping for disconnected user '{disconnected_user}'.")
-            elif found: # If connection was found but mapping wasn't (shouldn't happen often)
-                logger.warning(f"Character mapping for '{disconnected_user}' (ws: {websocket}) not found in lobby_characters['{lobby_key_upper}'], though connection was present.")
-
-            # Remove lobby if empty
-            if not self.active_connections.get(lobby_key_upper):
-                if lobby_key_upper in self.active_connections: del self.active_connections[lobby_key_upper]
-                if lobby_key_upper in self.lobby_characters: del self.lobby_characters[lobby_key_upper] # Clean up character dict too
-                logger.info(f"Lobby '{lobby_key_upper}' is now empty and closed.")
-            elif found: # Log remaining only if someone was actually disconnected
-                 logger.info(f"User '{disconnected_user}' (CharID: {disconnected_char_id}) disconnected. Remaining users: {[u for _, u, _ in self.active_connections.get(lobby_key_upper, [])]}")
+        conn, lobby = self.registry.remove(websocket, lobby_key_upper)
+        if conn is None:
+            # Уже отключен: выселен или writer и цикл приема оба сообщили об обрыве
+            logger.debug(f"Connection already removed from lobby '{lobby_key_upper}'.")
+            return False
+
+        conn.outbox.close()
+        self._publish({
+            "kind": "presence", "op": "leave", "lobby": lobby_key_upper,
+            "member_id": conn.member_id, "username": conn.username, "character_id": conn.character_id,
+        })
+        # Персонаж покинул лобби: его снапшот больше не нужен
+        if conn.character_id is not None:
+            self._forget_character_snapshot(lobby, conn.character_id)
+
+        if lobby.is_empty:
+            self._stop_heartbeat(lobby)
+            self._stop_flush(lobby)
+            logger.info(f"User '{conn.username}' (CharID: {conn.character_id}) disconnected; lobby '{lobby_key_upper}' is now empty and closed.")
         else:
-            logger.warning(f"Attempted to disconnect from non-existent or already empty lobby '{lobby_key_upper}'.")
+            logger.info(f"User '{conn.username}' (CharID: {conn.character_id}) disconnected from lobby '{lobby_key_upper}' ({len(lobby.connections)} local connections remain).")
+        return True
+
+    def touch(self, websocket: WebSocket):
+        """Отмечает входящий кадр от клиента (для heartbeat)."""
+        conn = self.registry.connection(websocket)
+        if conn is not None:
+            conn.last_seen = time.monotonic()
+
+    # --- Heartbeat и выселение ---
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _stop_heartbeat(self, lobby: Lobby):
+        task = lobby.heartbeat_task
+        lobby.heartbeat_task = None
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _heartbeat_loop(self, lobby: Lobby):
+        """Пингует heartbeat-клиентов лобби и пачкой выселяет мертвые соединения."""
+        try:
+            while self.registry.get(lobby.key) is lobby:
+                await asyncio.sleep(WS_PING_INTERVAL)
+                now = time.monotonic()
+                stale: Dict[str, List[WebSocket]] = {}
+                ping = None
+                for websocket, conn in list(lobby.connections.items()): # enqueue может выселить (политика disconnect)
+                    if conn.outbox.closed or websocket.client_state != WebSocketState.CONNECTED:
+                        stale.setdefault("closed", []).append(websocket)
+                    elif conn.heartbeat:
+                        if now - conn.last_seen > WS_PING_INTERVAL + WS_PING_TIMEOUT:
+                            stale.setdefault("heartbeat_timeout", []).append(websocket)
+                        else:
+                            ping = ping or Frame({"type": "ping", "ts": int(time.time() * 1000)})
+                            conn.outbox.enqueue(ping, "ping")
+                for reason, sockets in stale.items():
+                    self._evict(lobby.key, sockets, reason)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Heartbeat loop for lobby '{lobby.key}' failed: {e!r}", exc_info=True)
+
+    def _evict(self, lobby_key_upper: str, websockets: List[WebSocket], reason: str):
+        """
+        Выселяет соединения пачкой: удаляет из реестра, закрывает сокеты в фоне,
+        обновляет счетчики и рассылает один players_update на всю пачку.
+        """
+        lobby = self.registry.get(lobby_key_upper)
+        evicted = [ws for ws in websockets if self.disconnect(ws, lobby_key_upper)]
+        if not evicted:
+            return
+        self.evictions_total[reason] = self.evictions_total.get(reason, 0) + len(evicted)
+        if lobby is not None:
+            lobby.evictions[reason] = lobby.evictions.get(reason, 0) + len(evicted)
+        logger.warning(f"Evicted {len(evicted)} connection(s) from lobby '{lobby_key_upper}' ({reason}).")
+        code = _EVICTION_CLOSE_CODES.get(reason, status.WS_1011_INTERNAL_ERROR)
+        for ws in evicted:
+            self._spawn(self._close_quietly(ws, code, reason))
+        if lobby is not None and lobby.has_members():
+            self._schedule_players_update(lobby)
+
+    async def _close_quietly(self, websocket: WebSocket, code: int, reason: str):
+        try:
+            if websocket.client_state == WebSocketState.CONNECTED:
+                await asyncio.wait_for(websocket.close(code=code, reason=reason), timeout=5)
+        except Exception:
+            pass # Сокет уже мертв — цикл приема в /ws завершится сам
+
+    def _schedule_players_update(self, lobby: Lobby):
+        """Один players_update на все выселения текущей итерации цикла событий."""
+        if lobby.master_username is None or lobby.max_players is None or lobby.players_update_pending:
+            return
+        lobby.players_update_pending = True
+
+        async def _send():
+            await asyncio.sleep(0)
+            lobby.players_update_pending = False
+            if self.registry.get(lobby.key) is lobby:
+                await self.send_players_update(lobby.key, lobby.master_username, lobby.max_players)
+        self._spawn(_send())
 
     # --- NEW METHOD: Send message to a single client ---
-    async def send_personal_message(self, websocket: WebSocket, message: str):
-        """Sends a message to a specific WebSocket connection."""
+    async def send_personal_message(self, websocket: WebSocket, message: Union[Frame, str, dict]):
+        """Sends a message to a specific WebSocket connection (через его очередь, если она есть)."""
+        frame = as_frame(message)
+        conn = self.registry.connection(websocket)
+        if conn is not None:
+            conn.outbox.enqueue(frame) # Порядок относительно рассылок сохраняется
+            return
         try:
             if websocket.client_state == WebSocketState.CONNECTED:
-                await websocket.send_text(message)
+                await websocket.send_text(frame.text)
             else:
                 # Log only, don't try to disconnect here as the state is already non-connected
                 logger.warning(f"Attempted to send personal message, but socket state is {websocket.client_state}.")
@@ -96,123 +346,396 @@ class ConnectionManager:
             # Log error, but avoid trying to disconnect potentially already closed socket
             logger.error(f"Failed to send personal message to {websocket.client.host}:{websocket.client.port}: {e}")
 
-    async def broadcast(self, lobby_key: str, message: str, exclude_websocket: Optional[WebSocket] = None):
-        """Sends a message to all connected clients in a specific lobby, optionally excluding one."""
+    async def broadcast(self, lobby_key: str, message: Union[Frame, str, dict], exclude_websocket: Optional[WebSocket] = None, coalesce_key: Optional[str] = None):
+        """
+        Sends a message to all connected clients in a specific lobby, optionally excluding one.
+        Сообщение кодируется один раз: те же байты (без lobby_seq) уходят в шину,
+        а локальный кадр получает lobby_seq дописыванием в них (Frame.with_field).
+        """
         lobby_key_upper = lobby_key.upper()
-        if lobby_key_upper in self.active_connections:
-            # Create a copy of the list for safe iteration
-            connections_to_send = list(self.active_connections[lobby_key_upper])
-            if not connections_to_send:
-                 # logger.warning(f"Attempted to broadcast to empty lobby '{lobby_key_upper}'.")
-                 return # Don't log if lobby just closed
-
-            # Use list comprehension for disconnected sockets to remove later
-            disconnected_sockets = []
-            for connection, username, char_id in connections_to_send:
-                 if connection == exclude_websocket:
-                     continue # Skip excluded socket
-
-                 try:
-                      if connection.client_state == WebSocketState.CONNECTED:
-                          await connection.send_text(message)
-                      else:
-                           logger.warning(f"Socket for user '{username}' (CharID: {char_id}) in lobby '{lobby_key_upper}' is not connected during broadcast. State: {connection.client_state}. Marking for disconnect.")
-                           disconnected_sockets.append(connection) # Mark for removal
-                 except Exception as e:
-                      logger.error(f"Failed to send broadcast message to '{username}' (CharID: {char_id}) in lobby '{lobby_key_upper}': {e}. Marking for disconnect.")
-                      disconnected_sockets.append(connection) # Mark for removal
-
-            # Disconnect marked sockets after broadcasting
-            if disconnected_sockets:
-                 logger.info(f"Cleaning up {len(disconnected_sockets)} disconnected sockets from lobby '{lobby_key_upper}' after broadcast.")
-                 for sock in disconnected_sockets:
-                     self.disconnect(sock, lobby_key_upper) # Disconnect them properly
+        frame = as_frame(message)
+        self._broadcast_local(lobby_key_upper, frame, exclude_websocket, coalesce_key)
+        if self.backplane is not None:
+            self._publish({"kind": "broadcast", "lobby": lobby_key_upper, "message": frame.encoded, "coalesce_key": coalesce_key})
+
+    def _broadcast_local(self, lobby_key_upper: str, frame: Frame, exclude_websocket: Optional[WebSocket], coalesce_key: Optional[str]):
+        lobby = self.registry.get(lobby_key_upper)
+        if lobby is None:
+            return
+        excluded = lobby.connections.get(exclude_websocket) if exclude_websocket is not None else None
+        frame = self._number_event(lobby, frame, coalesce_key, excluded.username if excluded is not None else None)
+        for websocket, conn in lobby.connections.items():
+            if websocket is not exclude_websocket: # Skip excluded socket
+                conn.outbox.enqueue(frame, coalesce_key)
+
+    def deliver_chat(self, lobby_key_upper: str, messages: List[Dict[str, Any]], senders: List[Optional[WebSocket]], publish: bool = True):
+        """
+        Рассылает пачку сообщений чата (см. websockets/chat.py) одним проходом по лобби.
+        Каждое сообщение — отдельное событие лобби (кадр chat, нужен для повтора и
+        старых клиентов); клиенты с chat_batch получают один общий кадр chat_batch.
+        senders — сокеты авторов (им кадр chat не отправляется), None — автор на другом воркере.
+        """
+        if publish:
+            self._publish({"kind": "chat", "lobby": lobby_key_upper, "messages": messages})
+        lobby = self.registry.get(lobby_key_upper)
+        if lobby is None or not messages:
+            return
+        chat_frames = [
+            (self._number_event(lobby, Frame({"type": "chat", "sender": message["sender"], "text": message["text"]}), None, message["sender"]), sender)
+            for message, sender in zip(messages, senders)
+        ]
+        batch_frame = None
+        for websocket, conn in lobby.connections.items():
+            if conn.chat_batch:
+                if batch_frame is None:
+                    batch_frame = Frame({"type": "chat_batch", "messages": messages, "lobby_seq": lobby.event_seq})
+                conn.outbox.enqueue(batch_frame)
+                continue
+            for frame, sender in chat_frames:
+                if websocket is not sender:
+                    conn.outbox.enqueue(frame)
+
+    def _number_event(self, lobby: Lobby, frame: Frame, coalesce_key: Optional[str] = None, exclude_username: Optional[str] = None) -> Frame:
+        """
+        Присваивает событию лобби lobby_seq и кладет его в буфер повтора.
+        Нумерует каждый воркер сам (по своим получателям), поэтому в backplane
+        уходит кадр без lobby_seq. Поле дописывается в уже закодированное тело.
+        """
+        if not frame.is_object:
+            return frame
+        seq = lobby.next_event_seq()
+        numbered = frame.with_field("lobby_seq", seq)
+        lobby.record_event(seq, numbered, coalesce_key, exclude_username)
+        return numbered
+
+    def resume(self, websocket: WebSocket, lobby_key: str, epoch: Optional[str], last_seq: int) -> bool:
+        """
+        Возобновление сессии клиента, передавшего lastSeq. Вызывать сразу после
+        connect, без await между ними, иначе живые события обгонят повтор.
+
+        Клиенту уходит {"type": "session", "epoch", "lobby_seq", "resumed"} и, если
+        разрыв в пределах буфера той же эпохи, пропущенные события (устаревшие
+        character_update/players_update пропускаются). False — нужна полная синхронизация.
+        """
+        lobby = self.registry.get(lobby_key.upper())
+        conn = self.registry.connection(websocket)
+        if lobby is None or conn is None:
+            return False
+        missed = lobby.events_since(last_seq) if epoch == lobby.epoch else None
+        if missed is not None and len(missed) >= conn.outbox.maxsize // 2:
+            missed = None # Повтор переполнил бы исходящую очередь — дешевле полная синхронизация
+        conn.outbox.enqueue(Frame({
+            "type": "session",
+            "epoch": lobby.epoch,
+            "lobby_seq": lobby.event_seq,
+            "resumed": missed is not None,
+        }))
+        if missed is None:
+            self.replay_stats["full_sync_fallbacks"] += 1
+            logger.info(f"Session of '{conn.username}' in lobby '{lobby.key}' not resumable (epoch {epoch}, lastSeq {last_seq}); full sync.")
+            return False
+        replayed = 0
+        for event in missed:
+            if event.exclude_username == conn.username:
+                continue # Собственные сообщения чата автору не возвращаются
+            conn.outbox.enqueue(event.frame, event.coalesce_key)
+            payload = event.frame.payload
+            if conn.known_seqs is not None and payload.get("type") == "character_update":
+                conn.known_seqs[payload["character"]["id"]] = payload["seq"]
+            replayed += 1
+        self.replay_stats["resumed"] += 1
+        self.replay_stats["replayed_events"] += replayed
+        logger.info(f"Resumed session of '{conn.username}' in lobby '{lobby.key}' from lobby_seq {last_seq}: {replayed} event(s) replayed.")
+        return True
+
+    def _on_message_dropped(self, websocket: WebSocket):
+        """Сообщение потеряно при переполнении: delta-клиент больше не в синхроне, следующие обновления — полные."""
+        conn = self.registry.connection(websocket)
+        if conn is not None and conn.known_seqs is not None:
+            conn.known_seqs.clear()
+
+    def get_fanout_metrics(self) -> Dict[str, Any]:
+        """Глубина исходящих очередей и задержка отправки по лобби."""
+        lobbies = {}
+        for lobby_key_upper, lobby in self.registry.lobbies.items():
+            depths = [conn.outbox.depth for conn in lobby.connections.values()]
+            lobbies[lobby_key_upper] = {
+                "connections": len(depths),
+                "remote_members": len(lobby.remote_members),
+                "heartbeat_clients": sum(1 for conn in lobby.connections.values() if conn.heartbeat),
+                "evictions": dict(lobby.evictions),
+                "lobby_seq": lobby.event_seq,
+                "debounce": {**lobby.debounce, "pending": len(lobby.pending_updates)},
+                "replay_buffer": len(lobby.events),
+                "queue_depth": sum(depths),
+                "max_connection_queue_depth": max(depths, default=0),
+                **lobby.metrics.snapshot(),
+            }
+        return {
+            "config": {
+                "queue_size": WS_SEND_QUEUE_SIZE,
+                "slow_consumer_policy": WS_SLOW_CONSUMER_POLICY,
+                "send_timeout_s": WS_SEND_TIMEOUT,
+            },
+            "heartbeat": {
+                "ping_interval_s": WS_PING_INTERVAL,
+                "ping_timeout_s": WS_PING_TIMEOUT,
+                "evictions_total": dict(self.evictions_total),
+            },
+            "replay": {"buffer_size": WS_REPLAY_BUFFER, **self.replay_stats},
+            "debounce": {
+                "window_ms": WS_BROADCAST_DEBOUNCE_MS,
+                **{key: sum(lobby.debounce[key] for lobby in self.registry.lobbies.values()) for key in ("scheduled", "superseded", "flushed")},
+            },
+            "backplane": self.backplane.stats() if self.backplane is not None else None,
+            "lobbies": lobbies,
+        }
 
     async def send_players_update(self, lobby_key: str, master_username: str, max_players: int):
-        """Formats and broadcasts the current player list including character IDs."""
+        """
+        Formats and broadcasts the current player list including character IDs.
+        Готовый кадр кэшируется в лобби до следующего изменения состава.
+        """
         lobby_key_upper = lobby_key.upper()
-        logger.info(f"Preparing players_update for lobby '{lobby_key_upper}' (Master: '{master_username}', Max: {max_players})")
-        players_in_lobby = []
-        current_master = None
-
-        if lobby_key_upper in self.active_connections:
-            current_connections = self.active_connections[lobby_key_upper]
-            logger.info(f"  Active connections in lobby '{lobby_key_upper}': {[(user, char_id) for _, user, char_id in current_connections]}")
-            for ws, username, char_id in current_connections:
-                # Get character ID directly from the stored tuple
-                player_info = {"username": username, "character_id": char_id}
-                if username == master_username:
-                    # Even if master is connecting with a charId (which shouldn't happen per frontend logic), capture it
-                    current_master = player_info
-                    logger.info(f"  Found active master: {username} (CharID: {char_id})")
-                else:
-                    players_in_lobby.append(player_info)
-        else:
+        lobby = self.registry.get(lobby_key_upper)
+        if lobby is None or not lobby.has_members():
             # If lobby doesn't exist anymore, don't send update
-            logger.warning(f"  Lobby '{lobby_key_upper}' not found during send_players_update. Skipping.")
+            logger.warning(f"Lobby '{lobby_key_upper}' not found during send_players_update. Skipping.")
             return
 
+        lobby.master_username, lobby.max_players = master_username, max_players
+        message_data = lobby.cached_roster(master_username, max_players)
+        if message_data is None:
+            message_data = self._build_players_update(lobby, master_username, max_players)
+            if message_data is None:
+                return
+            lobby.store_roster(master_username, max_players, message_data)
+        logger.debug(f"Broadcasting players_update for lobby '{lobby_key_upper}': {message_data.text}")
+        # Устаревший список игроков в очереди заменяется новым
+        await self.broadcast(lobby_key_upper, message_data, coalesce_key="players_update")
+
+    def _build_players_update(self, lobby: Lobby, master_username: str, max_players: int) -> Optional[Frame]:
+        players_in_lobby = []
+        current_master = None
+        # Локальные сокеты + участники на других воркерах
+        for username, char_id in lobby.members():
+            player_info = {"username": username, "character_id": char_id}
+            if username == master_username:
+                # Even if master is connecting with a charId (which shouldn't happen per frontend logic), capture it
+                current_master = player_info
+            else:
+                players_in_lobby.append(player_info)
+
         # If master wasn't found among active connections (e.g., only players connected?)
         if current_master is None and master_username:
              current_master = {"username": master_username, "character_id": None}
-             logger.info(f"  Master '{master_username}' not found in active connections, using provided username (CharID unknown).")
+             logger.debug(f"Master '{master_username}' not found in active connections of lobby '{lobby.key}', using provided username (CharID unknown).")
         # Edge case: If masterUsername wasn't provided somehow
         elif current_master is None and not master_username:
-             logger.error(f"  Cannot send players_update for lobby '{lobby_key_upper}': Master username unknown and not found in connections.")
-             return
+             logger.error(f"Cannot send players_update for lobby '{lobby.key}': Master username unknown and not found in connections.")
+             return None
 
         target_player_slots = max(0, max_players - 1)
+        if len(players_in_lobby) > target_player_slots:
+            logger.warning(f"More players ({len(players_in_lobby)}) than available slots ({target_player_slots}) in lobby '{lobby.key}'. Truncating.")
         # Ensure the list has exactly target_player_slots elements
-        final_player_list = [None] * target_player_slots
-        for i, player in enumerate(players_in_lobby):
-            if i < target_player_slots:
-                 final_player_list[i] = player # Fill with player data
-            else:
-                 logger.warning(f"  More players ({len(players_in_lobby)}) than available slots ({target_player_slots}) in lobby '{lobby_key_upper}'. Truncating.")
-                 break # Stop if we exceed target slots
-
-        logger.info(f"  Final player list (size {target_player_slots}): {final_player_list}")
-        message_data = json.dumps({
+        final_player_list = players_in_lobby[:target_player_slots] + [None] * max(0, target_player_slots - len(players_in_lobby))
+        return Frame({
             "type": "players_update",
             "master": current_master,
             "players": final_player_list
         })
-        logger.info(f"  Broadcasting players_update message: {message_data}")
-        await self.broadcast(lobby_key_upper, message_data)
+
+    def schedule_character_update(self, lobby_key: str, character: Any):
+        """
+        Откладывает рассылку персонажа на WS_BROADCAST_DEBOUNCE_MS: повторные
+        обновления того же персонажа в пределах окна заменяют ожидающее
+        (рассылается только последнее), порядок между персонажами сохраняется.
+        character — dict или pydantic-модель (model_dump выполняется только для
+        реально рассылаемого состояния).
+        """
+        lobby_key_upper = lobby_key.upper()
+        character_id = character['id'] if isinstance(character, dict) else getattr(character, 'id', None)
+        if character_id is None:
+            logger.error("schedule_character_update: Invalid character data provided.")
+            return
+        lobby = self.registry.get(lobby_key_upper)
+        if lobby is None or WS_BROADCAST_DEBOUNCE_MS <= 0:
+            # Локальных получателей нет (остальные воркеры получат снапшот через backplane) или debounce выключен
+            self._spawn(self.broadcast_character_update(lobby_key_upper, self._character_dict(character)))
+            return
+        lobby.debounce["scheduled"] += 1
+        if character_id in lobby.pending_updates:
+            lobby.debounce["superseded"] += 1
+        lobby.pending_updates[character_id] = character # Существующий ключ сохраняет свое место в очереди
+        if lobby.flush_task is None:
+            lobby.flush_task = self._spawn(self._flush_after_window(lobby))
+
+    async def _flush_after_window(self, lobby: Lobby):
+        try:
+            await asyncio.sleep(WS_BROADCAST_DEBOUNCE_MS / 1000)
+        except asyncio.CancelledError:
+            return
+        lobby.flush_task = None
+        pending, lobby.pending_updates = lobby.pending_updates, {}
+        for character in pending.values():
+            lobby.debounce["flushed"] += 1
+            await self.broadcast_character_update(lobby.key, self._character_dict(character))
+
+    def _stop_flush(self, lobby: Lobby):
+        lobby.pending_updates.clear()
+        task, lobby.flush_task = lobby.flush_task, None
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            task.cancel()
+
+    @staticmethod
+    def _character_dict(character: Any) -> Dict[str, Any]:
+        return character if isinstance(character, dict) else character.model_dump(mode='json')
 
     async def broadcast_character_update(self, lobby_key: str, character_data: dict):
-        """Sends detailed character data to all users in the lobby."""
+        """
+        Sends character data to all users in the lobby (сразу, без debounce).
+        Клиенты с delta=1, знающие предыдущий seq, получают character_patch;
+        остальные (и при рассинхроне или слишком большом патче) — полный character_update.
+        Ожидающее отложенное обновление того же персонажа устарело и отбрасывается.
+        """
         lobby_key_upper = lobby_key.upper()
         if not character_data or 'id' not in character_data:
              logger.error("broadcast_character_update: Invalid character_data provided.")
              return
+        lobby = self.registry.get(lobby_key_upper)
+        if lobby is not None and lobby.pending_updates.pop(character_data['id'], None) is not None:
+            lobby.debounce["superseded"] += 1
+        self._deliver_character_update(lobby_key_upper, character_data)
+        # Другие воркеры получают полный снапшот и сами считают дельты для своих клиентов
+        self._publish({"kind": "character_update", "lobby": lobby_key_upper, "character": character_data})
 
-        message = json.dumps({
+    def _deliver_character_update(self, lobby_key_upper: str, character_data: Dict[str, Any]):
+        """Рассылает снапшот персонажа локальным сокетам (полный или character_patch)."""
+        lobby = self.registry.get(lobby_key_upper)
+        if lobby is None:
+            return
+        char_id = character_data['id']
+
+        base_seq, seq, ops = self._record_snapshot(lobby, character_data)
+        # Одно событие лобби: патч и полный снапшот несут один lobby_seq,
+        # в буфер повтора кладется полный снапшот
+        lobby_seq = lobby.next_event_seq()
+        full_message = Frame({
             "type": "character_update",
-            "character": character_data # character_data should be a dict
+            "character": character_data, # character_data should be a dict
+            "seq": seq,
+            "lobby_seq": lobby_seq
         })
-        # logger.info(f"Broadcasting character_update for CharID: {character_data['id']} in lobby '{lobby_key_upper}'") # Reduce log noise
-        await self.broadcast(lobby_key_upper, message)
+        patch_message = None
+        if ops:
+            patch_message = Frame({
+                "type": "character_patch",
+                "character_id": char_id,
+                "base_seq": base_seq,
+                "seq": seq,
+                "ops": ops,
+                "lobby_seq": lobby_seq
+            })
+            if len(patch_message) >= len(full_message):
+                patch_message = None # Патч не меньше снапшота — шлем снапшот
+
+        # Полный снапшот заменяет более старый снапшот того же персонажа в очереди
+        # вместе с ещё не отправленными патчами к нему; патчи между собой не
+        # объединяются (каждый опирается на предыдущий seq)
+        full_key = f"character:{char_id}"
+        lobby.record_event(lobby_seq, full_message, full_key)
+        for conn in lobby.connections.values():
+            known = conn.known_seqs
+            if known is None:
+                conn.outbox.enqueue(full_message, full_key) # Клиент без delta
+                continue
+            if known.get(char_id) == seq:
+                continue # Клиент уже знает это состояние (ничего не изменилось)
+            if patch_message is not None and base_seq is not None and known.get(char_id) == base_seq:
+                conn.outbox.enqueue(patch_message, depends_on=full_key)
+            else:
+                conn.outbox.enqueue(full_message, full_key)
+            known[char_id] = seq
+
+    def _record_snapshot(self, lobby: Lobby, character_data: Dict[str, Any]) -> Tuple[Optional[int], int, Optional[List[Dict[str, Any]]]]:
+        """
+        Сохраняет снапшот персонажа как последний разосланный.
+        Возвращает (base_seq, seq, ops): ops — diff от предыдущего снапшота
+        (None, если предыдущего не было); при отсутствии изменений seq не растет.
+        """
+        snapshots = lobby.snapshots
+        previous = snapshots.get(character_data['id'])
+        if previous is None:
+            seq = next(self._snapshot_seq)
+            snapshots[character_data['id']] = (seq, character_data)
+            return None, seq, None
+        base_seq, old_snapshot = previous
+        ops = compute_delta(old_snapshot, character_data)
+        if not ops:
+            return base_seq, base_seq, ops
+        seq = next(self._snapshot_seq)
+        snapshots[character_data['id']] = (seq, character_data)
+        return base_seq, seq, ops
+
+    def _forget_character_snapshot(self, lobby: Lobby, character_id: int):
+        """
+        Удаляет снапшот персонажа. Известные клиентам seq не трогаем (O(1) вместо
+        обхода лобби): seq глобально уникальны, а после удаления снапшота следующая
+        рассылка идет с base_seq=None, т.е. полным character_update.
+        """
+        lobby.snapshots.pop(character_id, None)
+
+    def record_initial_sync(self, websocket: WebSocket, lobby_key: str, characters: List[Dict[str, Any]]) -> Dict[int, int]:
+        """
+        Запоминает снапшоты, отправленные клиенту в initial_character_sync.
+        Возвращает { character_id: seq } для поля "seqs" сообщения.
+        """
+        lobby = self.registry.get(lobby_key.upper())
+        if lobby is None:
+            return {}
+        seqs: Dict[int, int] = {}
+        for character_data in characters:
+            _, seq, _ = self._record_snapshot(lobby, character_data)
+            seqs[character_data['id']] = seq
+        conn = lobby.connections.get(websocket)
+        if conn is not None and conn.known_seqs is not None:
+            conn.known_seqs.update(seqs)
+        return seqs
+
+    async def send_resync(self, websocket: WebSocket, lobby_key: str, character_id: Optional[int] = None):
+        """Отправляет клиенту полные снапшоты (по запросу {"type": "resync"} при рассинхроне)."""
+        lobby = self.registry.get(lobby_key.upper())
+        conn = self.registry.connection(websocket)
+        if lobby is None or conn is None:
+            return
+        for char_id, (seq, snapshot) in list(lobby.snapshots.items()):
+            if character_id is not None and char_id != character_id:
+                continue
+            conn.outbox.enqueue(Frame({"type": "character_update", "character": snapshot, "seq": seq}))
+            if conn.known_seqs is not None:
+                conn.known_seqs[char_id] = seq
 
     # --- NEW: Method to get all CHARACTER IDs in a lobby ---
     def get_character_ids_in_lobby(self, lobby_key: str) -> Set[int]:
-        """Returns a set of character IDs currently present in the lobby (excluding None)."""
-        lobby_key_upper = lobby_key.upper()
-        character_ids = set()
-        # Use the stored lobby_characters mapping directly
-        if lobby_key_upper in self.lobby_characters:
-            for char_id in self.lobby_characters[lobby_key_upper].values():
-                if char_id is not None:
-                     character_ids.add(char_id)
-        return character_ids
-
-    # --- NEW: Method to get all active websockets in a lobby ---
+        """Returns a set of character IDs currently present in the lobby (excluding None), включая другие воркеры."""
+        lobby = self.registry.get(lobby_key.upper())
+        return lobby.character_ids() if lobby is not None else set()
+
     def get_lobby_websockets(self, lobby_key: str) -> List[WebSocket]:
-         lobby_key_upper = lobby_key.upper()
-         if lobby_key_upper in self.active_connections:
-             # Return only the websocket objects
-             return [ws for ws, _, _ in self.active_connections[lobby_key_upper]]
-         return []
+        """Все локальные сокеты лобби."""
+        lobby = self.registry.get(lobby_key.upper())
+        return list(lobby.connections) if lobby is not None else []
+
+    def get_user_websockets(self, lobby_key: str, username: str) -> List[WebSocket]:
+        """Локальные сокеты пользователя в лобби."""
+        lobby = self.registry.get(lobby_key.upper())
+        return list(lobby.by_username.get(username, ())) if lobby is not None else []
+
+    def get_character_websocket(self, lobby_key: str, character_id: int) -> Optional[WebSocket]:
+        """Локальный сокет, через который в лобби подключен персонаж."""
+        lobby = self.registry.get(lobby_key.upper())
+        return lobby.by_character.get(character_id) if lobby is not None else None
 
 # Singleton instance
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
@@ -0,0 +1,192 @@
+# backend/app/websockets/outbox.py
+"""
+Исходящая очередь WebSocket-соединения.
+
+Рассылка кладет сообщения в ограниченную очередь соединения и не ждет сети;
+отдельная задача-писатель (writer) отправляет их по порядку. Медленный клиент
+копит очередь только у себя и не задерживает остальных в лобби.
+
+Политики при переполнении (WS_SLOW_CONSUMER_POLICY):
+- "drop"       — выбрасывается самое старое сообщение;
+- "coalesce"   — сообщение с тем же coalesce_key (например, снапшот того же
+                 персонажа или список игроков) заменяет устаревшее в очереди
+                 вместе с зависящими от него сообщениями (depends_on —
+                 патчи того же персонажа); если заменить нечего —
+                 выбрасывается самое старое;
+- "disconnect" — медленный клиент отключается (код 1013).
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from .codec import Frame
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+POLICY_DROP = "drop"
+POLICY_COALESCE = "coalesce"
+POLICY_DISCONNECT = "disconnect"
+SLOW_CONSUMER_POLICIES = (POLICY_DROP, POLICY_COALESCE, POLICY_DISCONNECT)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", POLICY_COALESCE).lower()
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10")) # сек на один send; дольше — клиент считается мертвым
+if WS_SLOW_CONSUMER_POLICY not in SLOW_CONSUMER_POLICIES:
+    logger.warning(f"Unknown WS_SLOW_CONSUMER_POLICY '{WS_SLOW_CONSUMER_POLICY}', using '{POLICY_COALESCE}'.")
+    WS_SLOW_CONSUMER_POLICY = POLICY_COALESCE
+
+
+class LobbyMetrics:
+    """Счетчики исходящих очередей одного лобби."""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+        self.send_errors = 0
+        self.max_queue_depth = 0
+        self._latency_total_s = 0.0 # от постановки в очередь до завершения send
+        self.max_latency_s = 0.0
+
+    def record_sent(self, latency_s: float) -> None:
+        self.sent += 1
+        self._latency_total_s += latency_s
+        if latency_s > self.max_latency_s:
+            self.max_latency_s = latency_s
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "slow_disconnects": self.slow_disconnects,
+            "send_errors": self.send_errors,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_send_latency_ms": round(self._latency_total_s / self.sent * 1000, 3) if self.sent else 0.0,
+            "max_send_latency_ms": round(self.max_latency_s * 1000, 3),
+        }
+
+
+class ConnectionOutbox:
+    """
+    Ограниченная очередь + задача-писатель для одного WebSocket.
+    binary=True — кадры уходят как MessagePack (send_bytes), иначе JSON-текстом.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        metrics: LobbyMetrics,
+        on_dead: Callable[[WebSocket, str], None],
+        on_drop: Optional[Callable[[WebSocket], None]] = None,
+        maxsize: int = WS_SEND_QUEUE_SIZE,
+        policy: str = WS_SLOW_CONSUMER_POLICY,
+        binary: bool = False,
+    ):
+        self.websocket = websocket
+        self.metrics = metrics
+        self.binary = binary
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self._on_dead = on_dead # (websocket, причина): ошибка отправки / медленный клиент; сокет закрывает менеджер
+        self._on_drop = on_drop # вызывается, когда сообщение потеряно (drop/coalesce)
+        # (frame, coalesce_key, depends_on, enqueued_at); Frame общий для всех получателей
+        self._queue: Deque[Tuple[Frame, Optional[str], Optional[str], float]] = deque()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+
+    def close(self) -> None:
+        """Останавливает писателя; неотправленные сообщения отбрасываются."""
+        self._closed = True
+        self._queue.clear()
+        if self._task is not None and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, frame: Frame, coalesce_key: Optional[str] = None, depends_on: Optional[str] = None) -> bool:
+        """
+        Ставит сообщение в очередь без ожидания сети. False — сообщение не принято.
+        depends_on — coalesce_key состояния, поверх которого применяется сообщение
+        (патч поверх снапшота): при замене этого состояния сообщение удаляется вместе с ним.
+        """
+        if self._closed:
+            return False
+        if coalesce_key is not None and self.policy == POLICY_COALESCE:
+            # Устаревшее состояние с тем же ключом и патчи к нему больше не нужны:
+            # новое полное состояние ставится в конец и заменяет их все
+            kept = deque(entry for entry in self._queue if entry[1] != coalesce_key and entry[2] != coalesce_key)
+            if len(kept) != len(self._queue):
+                self.metrics.coalesced += len(self._queue) - len(kept)
+                self._queue = kept
+        if len(self._queue) >= self.maxsize:
+            if self.policy == POLICY_DISCONNECT:
+                self.metrics.slow_disconnects += 1
+                logger.warning(f"Slow consumer {self._peer()} exceeded send queue ({self.maxsize}); disconnecting.")
+                self._fail("slow_consumer")
+                return False
+            self._queue.popleft()
+            self.metrics.dropped += 1
+            if self._on_drop:
+                self._on_drop(self.websocket)
+        self._queue.append((frame, coalesce_key, depends_on, time.perf_counter()))
+        self.metrics.enqueued += 1
+        if len(self._queue) > self.metrics.max_queue_depth:
+            self.metrics.max_queue_depth = len(self._queue)
+        self._wakeup.set()
+        return True
+
+    async def _writer(self) -> None:
+        try:
+            while not self._closed:
+                if not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame, _, _, enqueued_at = self._queue.popleft()
+                if self.websocket.client_state != WebSocketState.CONNECTED:
+                    logger.warning(f"Socket {self._peer()} is not connected (state: {self.websocket.client_state}); stopping writer.")
+                    self._fail("closed")
+                    return
+                try:
+                    # Кодирование — один раз на Frame (кэшируется), здесь только отправка
+                    send = self.websocket.send_bytes(frame.binary) if self.binary else self.websocket.send_text(frame.text)
+                    await asyncio.wait_for(send, timeout=WS_SEND_TIMEOUT)
+                except Exception as e:
+                    self.metrics.send_errors += 1
+                    logger.error(f"Failed to send message to {self._peer()}: {e!r}. Marking for disconnect.")
+                    self._fail("send_failed")
+                    return
+                self.metrics.record_sent(time.perf_counter() - enqueued_at)
+        except asyncio.CancelledError:
+            pass
+
+    def _fail(self, reason: str) -> None:
+        if not self._closed:
+            self.close()
+            self._on_dead(self.websocket, reason)
+
+    def _peer(self) -> str:
+        client = getattr(self.websocket, "client", None)
+        return f"{client.host}:{client.port}" if client else "unknown"
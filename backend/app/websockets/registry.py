@@ -0,0 +1,243 @@
+# backend/app/websockets/registry.py
+"""
+Индексированный реестр WebSocket-соединений.
+
+Lobby хранит соединения в словарях-индексах, поэтому connect/disconnect и
+поиск по персонажу/пользователю выполняются за O(1):
+- websocket    -> Connection (порядок вставки = порядок входа, нужен для списка игроков);
+- character_id -> websocket;
+- username     -> {websocket, ...}.
+Участники на других воркерах (из backplane) индексируются так же.
+
+Список игроков (players_update) кэшируется как готовый Frame и сбрасывается
+только при изменении состава лобби.
+
+События лобби (рассылки всем участникам) нумеруются `lobby_seq` и хранятся в
+кольцевом буфере на WS_REPLAY_BUFFER событий: переподключившийся клиент
+получает только пропущенные события. Нумерация действует в пределах эпохи
+лобби (`epoch`) — новое лобби с тем же ключом начинает отсчет заново.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from .codec import Frame
+from .outbox import ConnectionOutbox, LobbyMetrics
+
+WS_REPLAY_BUFFER = int(os.getenv("WS_REPLAY_BUFFER", "256")) # событий на лобби
+
+
+class LobbyEvent:
+    """Событие лобби в буфере повтора."""
+
+    __slots__ = ("seq", "frame", "coalesce_key", "exclude_username")
+
+    def __init__(self, seq: int, frame: Frame, coalesce_key: Optional[str], exclude_username: Optional[str]):
+        self.seq = seq
+        self.frame = frame
+        self.coalesce_key = coalesce_key # более позднее событие с тем же ключом делает это ненужным при повторе
+        self.exclude_username = exclude_username # автор чата: ему событие не рассылалось
+
+
+class Connection:
+    """Одно локальное соединение в лобби."""
+
+    __slots__ = ("websocket", "lobby_key", "username", "character_id", "member_id", "outbox", "known_seqs", "heartbeat", "last_seen", "chat_batch")
+
+    def __init__(self, websocket: WebSocket, lobby_key: str, username: str, character_id: Optional[int], member_id: str):
+        self.websocket = websocket
+        self.lobby_key = lobby_key
+        self.username = username
+        self.character_id = character_id
+        self.member_id = member_id # id участника в backplane
+        self.outbox: Optional[ConnectionOutbox] = None
+        # Для клиентов с delta=1: { character_id: seq, известный клиенту }; None — клиент без delta
+        self.known_seqs: Optional[Dict[int, int]] = None
+        # heartbeat=1: клиент получает {"type": "ping"} и обязан присылать кадры; last_seen — время последнего входящего кадра
+        self.heartbeat = False
+        self.last_seen = time.monotonic()
+        self.chat_batch = False # chatBatch=1: чат приходит кадрами chat_batch
+
+
+class Lobby:
+    def __init__(self, key: str):
+        self.key = key
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.by_character: Dict[int, WebSocket] = {}
+        self.by_username: Dict[str, Set[WebSocket]] = {}
+        # Участники на других воркерах: { member_id: {"username", "character_id", "node"} }
+        self.remote_members: Dict[str, Dict[str, Any]] = {}
+        self.remote_by_character: Dict[int, str] = {}
+        # Последний разосланный снапшот персонажа: { character_id: (seq, snapshot) }
+        self.snapshots: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+        self.metrics = LobbyMetrics()
+        self._roster_version = 0
+        self._roster_cache: Optional[Tuple[int, str, int, Frame]] = None
+        # Параметры последнего players_update (нужны, чтобы разослать его после выселения)
+        self.master_username: Optional[str] = None
+        self.max_players: Optional[int] = None
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.evictions: Dict[str, int] = {} # причина -> число выселенных соединений
+        self.players_update_pending = False # players_update после выселения уже запланирован
+        # Нумерация и буфер событий для возобновления сессий
+        self.epoch = uuid.uuid4().hex[:12]
+        self.event_seq = 0
+        self.events: Deque[LobbyEvent] = deque(maxlen=max(0, WS_REPLAY_BUFFER))
+        # Отложенные (debounce) обновления персонажей: { character_id: данные }; порядок — порядок первого обновления
+        self.pending_updates: Dict[int, Any] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+        self.debounce = {"scheduled": 0, "superseded": 0, "flushed": 0}
+
+    # --- Состав ---
+    def add(self, conn: Connection) -> None:
+        self.connections[conn.websocket] = conn
+        if conn.character_id is not None:
+            self.by_character[conn.character_id] = conn.websocket
+        self.by_username.setdefault(conn.username, set()).add(conn.websocket)
+        self._roster_version += 1
+
+    def remove(self, websocket: WebSocket) -> Optional[Connection]:
+        conn = self.connections.pop(websocket, None)
+        if conn is None:
+            return None
+        if conn.character_id is not None and self.by_character.get(conn.character_id) is websocket:
+            del self.by_character[conn.character_id]
+        sockets = self.by_username.get(conn.username)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.by_username[conn.username]
+        self._roster_version += 1
+        return conn
+
+    def set_remote_members(self, members: Dict[str, Dict[str, Any]]) -> None:
+        self.remote_members = dict(members)
+        self.remote_by_character = {
+            info["character_id"]: member_id
+            for member_id, info in members.items()
+            if info.get("character_id") is not None
+        }
+        self._roster_version += 1
+
+    def add_remote(self, member_id: str, info: Dict[str, Any]) -> None:
+        self.remote_members[member_id] = info
+        if info.get("character_id") is not None:
+            self.remote_by_character[info["character_id"]] = member_id
+        self._roster_version += 1
+
+    def remove_remote(self, member_id: str) -> Optional[Dict[str, Any]]:
+        info = self.remote_members.pop(member_id, None)
+        if info is None:
+            return None
+        cid = info.get("character_id")
+        if cid is not None and self.remote_by_character.get(cid) == member_id:
+            del self.remote_by_character[cid]
+        self._roster_version += 1
+        return info
+
+    # --- Запросы ---
+    @property
+    def is_empty(self) -> bool:
+        return not self.connections
+
+    def has_members(self) -> bool:
+        return bool(self.connections) or bool(self.remote_members)
+
+    def has_character(self, character_id: int) -> bool:
+        return character_id in self.by_character or character_id in self.remote_by_character
+
+    def character_ids(self) -> Set[int]:
+        return set(self.by_character) | set(self.remote_by_character)
+
+    def members(self) -> Iterator[Tuple[str, Optional[int]]]:
+        """(username, character_id) всех участников: сначала локальные, затем с других воркеров."""
+        for conn in self.connections.values():
+            yield conn.username, conn.character_id
+        for info in self.remote_members.values():
+            yield info["username"], info.get("character_id")
+
+    # --- События и повтор ---
+    def next_event_seq(self) -> int:
+        self.event_seq += 1
+        return self.event_seq
+
+    def record_event(self, seq: int, frame: Frame, coalesce_key: Optional[str] = None, exclude_username: Optional[str] = None) -> None:
+        if self.events.maxlen:
+            self.events.append(LobbyEvent(seq, frame, coalesce_key, exclude_username))
+
+    def events_since(self, last_seq: int) -> Optional[List[LobbyEvent]]:
+        """
+        События с lobby_seq > last_seq без устаревших (замененных более поздним
+        событием с тем же coalesce_key). None — разрыв вне буфера, нужна полная синхронизация.
+        """
+        if last_seq > self.event_seq or last_seq < 0:
+            return None
+        if last_seq == self.event_seq:
+            return []
+        if not self.events or self.events[0].seq > last_seq + 1:
+            return None
+        missed = [event for event in self.events if event.seq > last_seq]
+        latest: Dict[str, int] = {}
+        for event in missed:
+            if event.coalesce_key is not None:
+                latest[event.coalesce_key] = event.seq
+        return [
+            event for event in missed
+            if event.coalesce_key is None or latest[event.coalesce_key] == event.seq
+        ]
+
+    # --- Кэш списка игроков ---
+    def cached_roster(self, master_username: str, max_players: int) -> Optional[Frame]:
+        cache = self._roster_cache
+        if cache is not None and cache[0] == self._roster_version and cache[1] == master_username and cache[2] == max_players:
+            return cache[3]
+        return None
+
+    def store_roster(self, master_username: str, max_players: int, frame: Frame) -> None:
+        self._roster_cache = (self._roster_version, master_username, max_players, frame)
+
+
+class ConnectionRegistry:
+    """Лобби по ключу + глобальный индекс websocket -> Connection."""
+
+    def __init__(self):
+        self.lobbies: Dict[str, Lobby] = {}
+        self.sockets: Dict[WebSocket, Connection] = {}
+
+    def get(self, lobby_key_upper: str) -> Optional[Lobby]:
+        return self.lobbies.get(lobby_key_upper)
+
+    def get_or_create(self, lobby_key_upper: str) -> Tuple[Lobby, bool]:
+        lobby = self.lobbies.get(lobby_key_upper)
+        if lobby is not None:
+            return lobby, False
+        lobby = self.lobbies[lobby_key_upper] = Lobby(lobby_key_upper)
+        return lobby, True
+
+    def connection(self, websocket: WebSocket) -> Optional[Connection]:
+        return self.sockets.get(websocket)
+
+    def add(self, lobby: Lobby, conn: Connection) -> None:
+        lobby.add(conn)
+        self.sockets[conn.websocket] = conn
+
+    def remove(self, websocket: WebSocket, lobby_key_upper: str) -> Tuple[Optional[Connection], Optional[Lobby]]:
+        """Удаляет соединение; возвращает (connection, lobby). Пустое лобби удаляется из реестра."""
+        lobby = self.lobbies.get(lobby_key_upper)
+        if lobby is None:
+            return None, None
+        conn = lobby.remove(websocket)
+        if conn is not None:
+            self.sockets.pop(websocket, None)
+        if lobby.is_empty:
+            del self.lobbies[lobby_key_upper]
+        return conn, lobby
+
+    def lobby_connections(self, lobby_key_upper: str) -> List[Connection]:
+        lobby = self.lobbies.get(lobby_key_upper)
+        return list(lobby.connections.values()) if lobby is not None else []
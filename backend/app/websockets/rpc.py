@@ -0,0 +1,138 @@
+# backend/app/websockets/rpc.py
+"""
+Игровые действия через WebSocket (RPC-кадры) вместо HTTP + отдельной рассылки.
+
+Запрос от клиента:
+    {"type": "rpc", "id": <любой id клиента>, "method": "<метод>",
+     "character_id": <необязательно, по умолчанию персонаж сокета>, "params": {...}}
+Ответ (только автору запроса, в порядке общей очереди соединения):
+    {"type": "rpc_result", "id": <тот же id>, "ok": true, "result": ...}
+    {"type": "rpc_result", "id": <тот же id>, "ok": false, "error": {"status": <HTTP-код>, "detail": ...}}
+
+Методы повторяют HTTP-эндпоинты /characters/{id}/...: activate, skill_check,
+end_turn, stats, heal. Пользователь берется из уже аутентифицированного
+сокета (без повторной проверки JWT и поиска пользователя), права на персонажа
+проверяет CRUD, как и в HTTP. Обновленный лист рассылается лобби сразу, в
+том же обработчике. На каждый запрос — своя короткая сессия БД.
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, WebSocket, status
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import schemas
+from ..crud import async_crud
+from ..db.database import AsyncSessionLocal
+from .codec import Frame
+from .manager import manager
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (db, character_id, user_id, params) -> (result для ответа, детали персонажа для рассылки или None)
+RpcHandler = Callable[[AsyncSession, int, int, Dict[str, Any]], Awaitable[Tuple[Any, Optional[schemas.CharacterDetailedOut]]]]
+
+
+def _require_details(details: Optional[schemas.CharacterDetailedOut], error: str) -> schemas.CharacterDetailedOut:
+    if details is None:
+        raise HTTPException(status_code=404, detail=error)
+    return details
+
+
+async def _activate(db: AsyncSession, character_id: int, user_id: int, params: Dict[str, Any]):
+    activation_data = schemas.ActivationRequest.model_validate(params)
+    result, details = await async_crud.activate_action(db=db, character_id=character_id, user_id=user_id, activation_data=activation_data)
+    if not (result and result.success and result.character_update_needed):
+        details = None
+    return result, details
+
+
+async def _skill_check(db: AsyncSession, character_id: int, user_id: int, params: Dict[str, Any]):
+    request = schemas.SkillCheckRequest.model_validate(params)
+    result = await async_crud.perform_skill_check(db, character_id, user_id, request.skill_name)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Персонаж не найден")
+    if not result.success:
+        code = 400 if "Неизвестный навык" in result.message else 500
+        raise HTTPException(status_code=code, detail=result.message)
+    return result, None # Проверка навыка не меняет состояние
+
+
+async def _end_turn(db: AsyncSession, character_id: int, user_id: int, params: Dict[str, Any]):
+    _, details = await async_crud.end_character_turn(db=db, character_id=character_id, user_id=user_id)
+    details = _require_details(details, "Не удалось получить обновленные данные после завершения хода")
+    return details, details
+
+
+async def _stats(db: AsyncSession, character_id: int, user_id: int, params: Dict[str, Any]):
+    stats_update = schemas.UpdateCharacterStats.model_validate(params)
+    (updated_char, _), details = await async_crud.update_character_stats(db=db, character_id=character_id, user_id=user_id, stats_update=stats_update)
+    if updated_char is None:
+        raise HTTPException(status_code=404, detail="Персонаж не найден")
+    details = _require_details(details, "Не удалось получить детали персонажа после обновления статов")
+    return details, details
+
+
+async def _heal(db: AsyncSession, character_id: int, user_id: int, params: Dict[str, Any]):
+    heal_request = schemas.HealRequest.model_validate(params)
+    updated_char, details = await async_crud.heal_character(db=db, character_id=character_id, user_id=user_id, heal_request=heal_request)
+    if updated_char is None:
+        raise HTTPException(status_code=500, detail="Неожиданная ошибка при лечении")
+    details = _require_details(details, "Не удалось получить обновленные данные после лечения")
+    return details, details
+
+
+RPC_METHODS: Dict[str, RpcHandler] = {
+    "activate": _activate,
+    "skill_check": _skill_check,
+    "end_turn": _end_turn,
+    "stats": _stats,
+    "heal": _heal,
+}
+
+
+def _dump(value: Any) -> Any:
+    return value.model_dump(mode='json') if hasattr(value, "model_dump") else value
+
+
+async def handle_rpc(websocket: WebSocket, lobby_key: str, user_id: int, default_character_id: Optional[int], frame: Dict[str, Any]) -> None:
+    """Выполняет RPC-кадр: ответ автору + рассылка обновленного персонажа лобби."""
+    request_id = frame.get("id")
+    method = frame.get("method")
+    started = time.perf_counter()
+    response: Dict[str, Any] = {"type": "rpc_result", "id": request_id}
+    try:
+        handler = RPC_METHODS.get(method)
+        if handler is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Неизвестный метод '{method}'")
+        character_id = frame.get("character_id", default_character_id)
+        if not isinstance(character_id, int) or isinstance(character_id, bool):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Не указан ID персонажа")
+        params = frame.get("params") or {}
+        if not isinstance(params, dict):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="params должен быть объектом")
+
+        async with AsyncSessionLocal() as db:
+            result, details = await handler(db, character_id, user_id, params)
+
+        response["ok"] = True
+        response["result"] = _dump(result)
+        if details is not None:
+            # Рассылка в том же шаге; кадр автору идет через ту же очередь соединения
+            details_data = response["result"] if result is details else details.model_dump(mode='json')
+            await manager.broadcast_character_update(lobby_key, details_data)
+    except HTTPException as e:
+        response["ok"] = False
+        response["error"] = {"status": e.status_code, "detail": e.detail}
+    except ValidationError as e:
+        response["ok"] = False
+        response["error"] = {"status": status.HTTP_422_UNPROCESSABLE_ENTITY, "detail": e.errors(include_url=False, include_context=False)}
+    except Exception as e:
+        logger.error(f"RPC '{method}' failed in lobby {lobby_key}: {e!r}", exc_info=True)
+        response["ok"] = False
+        response["error"] = {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "detail": "Internal server error"}
+    logger.debug(f"RPC '{method}' (id {request_id}) in lobby {lobby_key} handled in {(time.perf_counter() - started) * 1000:.1f} ms, ok={response['ok']}")
+    await manager.send_personal_message(websocket, Frame(response))
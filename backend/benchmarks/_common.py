@@ -0,0 +1,88 @@
+# backend/benchmarks/_common.py
+"""
+Общая подготовка бенчмарков: временная SQLite-база, засеянная справочниками
+(app/seed_db.py), пользователь и персонажи.
+
+Движки создаются при импорте app.db.database, поэтому use_temp_database()
+вызывается до первого импорта app.
+"""
+import logging
+import os
+import statistics
+import sys
+import tempfile
+from typing import Dict, Iterable, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SKILLS = [
+    "skill_strength", "skill_dexterity", "skill_endurance", "skill_reaction", "skill_technique",
+    "skill_adaptation", "skill_logic", "skill_attention", "skill_erudition", "skill_culture",
+    "skill_science", "skill_medicine", "skill_suggestion", "skill_insight", "skill_authority",
+    "skill_self_control", "skill_religion", "skill_flow",
+]
+
+
+def use_temp_database(**env: str) -> str:
+    """Новая SQLite-база во временном каталоге + переменные окружения `env`; возвращает путь к файлу."""
+    path = os.path.join(tempfile.mkdtemp(prefix="player_tool_bench_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.update(env)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    return path
+
+
+def seed_database() -> None:
+    """Таблицы + справочники; сидер логирует каждую запись, поэтому INFO на это время выключен."""
+    from app.db.database import Base, engine
+    from app.seed_db import seed_data
+
+    Base.metadata.create_all(bind=engine)
+    previous = logging.root.manager.disable
+    logging.disable(max(previous, logging.INFO))
+    try:
+        seed_data()
+    finally:
+        logging.disable(previous)
+
+
+def character_body(name: str = "Hero") -> dict:
+    """Тело POST /characters: 45 очков навыков, ветки стрелка и медика."""
+    skills = {skill: 3 for skill in SKILLS}
+    skills.update(skill_strength=6, skill_dexterity=6, skill_endurance=6)
+    skills["skill_flow"] += 45 - sum(value - 1 for value in skills.values())
+    return {
+        "name": name, "strength": 5, "dexterity": 5, "endurance": 5, "intelligence": 5,
+        "perception": 5, "charisma": 5, "luck": 5,
+        "initial_skills": skills, "initial_branch_levels": {"sharpshooter": 2, "medic": 1},
+    }
+
+
+def register(client, username: str) -> Dict[str, str]:
+    """Регистрирует пользователя через API синхронного клиента (TestClient) и возвращает заголовки."""
+    client.post("/auth/register", json={"username": username, "password": f"{username}-pass"})
+    token = client.post("/auth/login", data={"username": username, "password": f"{username}-pass"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create_characters(client, headers: Dict[str, str], count: int) -> List[int]:
+    ids = []
+    for index in range(count):
+        response = client.post("/characters", json=character_body(f"Bench {index}"), headers=headers)
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    return ids
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def describe_ms(samples: Iterable[float]) -> str:
+    """Сводка по выборке в миллисекундах: p50 / p99 / max."""
+    values = list(samples)
+    if not values:
+        return "n=0"
+    return f"p50 {statistics.median(values):7.2f}  p99 {percentile(values, 0.99):7.2f}  max {max(values):7.2f} ms"
@@ -0,0 +1,117 @@
+# backend/benchmarks/db_concurrency.py
+"""
+Несколько процессов-воркеров на одной SQLite-базе: профиль SQLITE_CONCURRENT
+(WAL, synchronous=NORMAL, busy_timeout) против настроек SQLite по умолчанию
+(user-003).
+
+Каждый воркер — отдельный процесс с приложением (как воркер uvicorn) и
+TestClient: чтения листа персонажа, каждый --write-every-й запрос (по
+умолчанию 4-й) — изменение статов. Кэш листов выключен
+(CHARACTER_CACHE_SIZE=0), чтобы чтения шли в базу. Для каждого профиля база
+создается заново: journal_mode=WAL сохраняется в файле.
+
+Запуск (из backend/):
+  python benchmarks/db_concurrency.py [--workers 1 4] [--duration 5] [--write-every 4]
+"""
+import argparse
+import contextlib
+import logging
+import multiprocessing
+import os
+import time
+from typing import Dict, List
+
+from _common import create_characters, describe_ms, register, seed_database, use_temp_database
+
+PROFILES = {"default": "0", "concurrent": "1"}
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Сидер, обработчики и CRUD логируют и печатают каждую операцию."""
+    logging.disable(logging.WARNING)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _prepare(characters: int, results) -> None:
+    with _quiet():
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        seed_database()
+        with TestClient(app) as client:
+            headers = register(client, "bench")
+            results.put((headers, create_characters(client, headers, characters)))
+
+
+def _worker(headers: Dict[str, str], character_ids: List[int], write_every: int, start, duration: float, results) -> None:
+    with _quiet():
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        latencies: List[float] = []
+        errors = 0
+        with TestClient(app, raise_server_exceptions=False) as client:
+            start.wait()
+            deadline = time.perf_counter() + duration
+            step = 0
+            while time.perf_counter() < deadline:
+                character_id = character_ids[step % len(character_ids)]
+                started = time.perf_counter()
+                if step % write_every == write_every - 1:
+                    response = client.put(f"/characters/{character_id}/stats", json={"current_hp": step % 10 + 1}, headers=headers)
+                else:
+                    response = client.get(f"/characters/{character_id}", headers=headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 500
+                step += 1
+        results.put((latencies, errors))
+
+
+def _run(profile: str, workers: int, write_every: int, duration: float, characters: int) -> Dict[str, object]:
+    context = multiprocessing.get_context("spawn") # дочерние процессы читают окружение при импорте app
+    use_temp_database(SQLITE_CONCURRENT=PROFILES[profile], CHARACTER_CACHE_SIZE="0")
+    results = context.Queue()
+    setup = context.Process(target=_prepare, args=(characters, results))
+    setup.start()
+    headers, character_ids = results.get()
+    setup.join()
+
+    start = context.Event()
+    processes = [
+        context.Process(target=_worker, args=(headers, character_ids[index::workers] or character_ids, write_every, start, duration, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(0.5) # Ждем, пока воркеры импортируют приложение
+    start.set()
+    latencies: List[float] = []
+    errors = 0
+    for _ in processes:
+        worker_latencies, worker_errors = results.get()
+        latencies.extend(worker_latencies)
+        errors += worker_errors
+    for process in processes:
+        process.join()
+    return {"rate": len(latencies) / duration, "latencies": latencies, "errors": errors}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--duration", type=float, default=5.0, help="секунд на каждую точку")
+    parser.add_argument("--characters", type=int, default=16)
+    parser.add_argument("--write-every", type=int, default=4, help="каждый N-й запрос — запись (1 = только записи)")
+    args = parser.parse_args()
+
+    print(f"{'profile':<11} {'workers':>7} {'req/s':>7} {'5xx':>5}   request latency")
+    for workers in args.workers:
+        for profile in PROFILES:
+            result = _run(profile, workers, args.write_every, args.duration, args.characters)
+            print(f"{profile:<11} {workers:>7} {result['rate']:>7.1f} {result['errors']:>5}   {describe_ms(result['latencies'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# backend/benchmarks/loop_lag.py
+"""
+Задержка event loop под конкурентной нагрузкой на HTTP API (user-001).
+
+Приложение работает в этом же процессе (httpx.ASGITransport, lifespan
+включен); N клиентов-корутин по кругу читают лист персонажа, меняют статы,
+бросают проверку навыка и завершают ход. Параллельно монитор засыпает на
+5 мс и записывает, на сколько позже он проснулся: это и есть задержка loop,
+которую увидят все остальные соединения (WebSocket, heartbeat, чат).
+
+Режимы:
+  async    — как в приложении: get_async_db / AsyncSession.run_sync (aiosqlite);
+  blocking — как до миграции: async-обработчики с синхронной Session прямо в
+             event loop (get_async_db подменен на BlockingSession).
+
+Запуск (из backend/):
+  python benchmarks/loop_lag.py [--duration 5] [--concurrency 1 8 32] [--characters 16]
+"""
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from typing import Dict, List
+
+from _common import create_characters, describe_ms, register, seed_database, use_temp_database
+
+use_temp_database()
+
+import httpx # noqa: E402
+from fastapi.testclient import TestClient # noqa: E402
+
+from app.db.database import SessionLocal, get_async_db # noqa: E402
+from app.main import app # noqa: E402
+
+MONITOR_INTERVAL = 0.005 # сек
+
+
+class BlockingSession:
+    """Замена AsyncSession для режима blocking: вызовы синхронной Session выполняются прямо в event loop."""
+
+    _AWAITABLE = {"get", "commit", "rollback", "execute", "scalar", "scalars", "flush", "refresh", "close"}
+
+    def __init__(self):
+        self.sync_session = SessionLocal()
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.sync_session, *args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self.sync_session, name)
+        if name not in self._AWAITABLE:
+            return attr
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+        return call
+
+
+async def get_blocking_db():
+    db = BlockingSession()
+    try:
+        yield db
+    finally:
+        db.sync_session.close()
+
+
+async def _monitor(lags: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(MONITOR_INTERVAL)
+        lags.append((time.perf_counter() - started - MONITOR_INTERVAL) * 1000)
+
+
+async def _player(client: httpx.AsyncClient, headers: Dict[str, str], character_id: int, deadline: float, latencies: List[float]) -> None:
+    url = f"/characters/{character_id}"
+    requests = [
+        ("GET", url, None),
+        ("PUT", f"{url}/stats", {"current_hp": 5}),
+        ("POST", f"{url}/skill_check", {"skill_name": "Сила"}),
+        ("POST", f"{url}/end_turn", None),
+    ]
+    step = 0
+    while time.perf_counter() < deadline:
+        method, path, body = requests[step % len(requests)]
+        started = time.perf_counter()
+        response = await client.request(method, path, json=body, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        step += 1
+        await asyncio.sleep(0) # чтение следующего запроса из сокета: точка переключения, как на настоящем сервере
+
+
+async def _run(concurrency: int, duration: float, headers: Dict[str, str], character_ids: List[int]) -> Dict[str, List[float]]:
+    lags: List[float] = []
+    latencies: List[float] = []
+    stop = asyncio.Event()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            monitor = asyncio.create_task(_monitor(lags, stop))
+            deadline = time.perf_counter() + duration
+            if concurrency:
+                await asyncio.gather(*(
+                    _player(client, headers, character_ids[index % len(character_ids)], deadline, latencies)
+                    for index in range(concurrency)
+                ))
+            else:
+                await asyncio.sleep(duration)
+            stop.set()
+            await monitor
+    return {"lag": lags, "latency": latencies}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=5.0, help="секунд на каждую точку")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--characters", type=int, default=16)
+    parser.add_argument("--mode", choices=("async", "blocking", "both"), default="both")
+    args = parser.parse_args()
+
+    # Сидер и обработчики логируют (а CRUD еще и печатает) каждую операцию
+    logging.disable(logging.WARNING)
+    with open(os.devnull, "w") as quiet:
+        with contextlib.redirect_stdout(quiet):
+            seed_database()
+            with TestClient(app) as client:
+                headers = register(client, "bench")
+                character_ids = create_characters(client, headers, args.characters)
+
+        modes = ("async", "blocking") if args.mode == "both" else (args.mode,)
+        print(f"{'mode':<9} {'conc':>4} {'req/s':>7}   {'event loop lag':<46}   request latency")
+        for mode in modes:
+            if mode == "blocking":
+                app.dependency_overrides[get_async_db] = get_blocking_db
+            else:
+                app.dependency_overrides.pop(get_async_db, None)
+            for concurrency in [0, *args.concurrency]:
+                with contextlib.redirect_stdout(quiet):
+                    result = asyncio.run(_run(concurrency, args.duration, headers, character_ids))
+                rate = len(result["latency"]) / args.duration
+                print(f"{mode:<9} {concurrency:>4} {rate:>7.1f}   {describe_ms(result['lag'])}   {describe_ms(result['latency'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# backend/benchmarks/serializer.py
+"""
+Сборка CharacterDetailedOut для "тяжелого" персонажа (user-018): 100 записей
+инвентаря, 30 изученных способностей, 4 занятых слота экипировки, 5 активных
+слотов способностей и 5 состояний.
+
+Две точки:
+  serialize — только сериализация уже загруженного графа (_character_to_output);
+  load+serialize — get_character_details_for_output с выключенным кэшем листов.
+
+--backend указывает на каталог backend/ другой ревизии (git worktree):
+обе функции есть и до, и после компилированного сериализатора.
+
+Запуск (из backend/):
+  python benchmarks/serializer.py [--runs 300] [--backend PATH]
+"""
+import argparse
+import contextlib
+import itertools
+import logging
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+from _common import create_characters, register, seed_database, use_temp_database
+
+
+def _time(fn: Callable[[], object], runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _heavy_character(db, models, character_id: int) -> None:
+    """Дополняет персонажа до размеров сценария прямо через ORM."""
+    item_classes = (models.Weapon, models.Armor, models.Shield, models.GeneralItem, models.Ammo)
+    items = [item for cls in item_classes for item in db.query(cls).order_by(cls.id).limit(20)]
+    character = db.get(models.Character, character_id)
+    # В справочниках меньше 100 предметов: хвост инвентаря повторяет их (как стопки у игроков)
+    inventory = [models.CharacterInventoryItem(character_id=character_id, item_id=item.id, quantity=1) for item in itertools.islice(itertools.cycle(items), 100)]
+    db.add_all(inventory)
+    db.flush()
+
+    def first(cls):
+        return next(row for row in inventory if isinstance(db.get(models.Item, row.item_id), cls))
+    character.equipped_weapon1, character.equipped_armor, character.equipped_shield = first(models.Weapon), first(models.Armor), first(models.Shield)
+    character.equipped_weapon2 = [row for row in inventory if isinstance(db.get(models.Item, row.item_id), models.Weapon)][1]
+
+    abilities = db.query(models.Ability).order_by(models.Ability.id).limit(30).all()
+    character.available_abilities = abilities
+    for slot, ability in enumerate(abilities[:5], start=1):
+        setattr(character, f"active_ability_{slot}", ability)
+    character.active_status_effects = db.query(models.StatusEffect).order_by(models.StatusEffect.id).limit(5).all()
+    db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=300)
+    parser.add_argument("--backend", help="каталог backend/ другой ревизии")
+    args = parser.parse_args()
+
+    use_temp_database(CHARACTER_CACHE_SIZE="0")
+    if args.backend:
+        sys.path.insert(0, args.backend)
+    # Сидер, обработчики и CRUD логируют и печатают каждую операцию
+    logging.disable(logging.WARNING)
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        from fastapi.testclient import TestClient
+        from app import models
+        from app.crud import character as character_crud
+        from app.db.database import SessionLocal
+        from app.main import app
+
+        seed_database()
+        with TestClient(app) as client:
+            [character_id] = create_characters(client, register(client, "bench"), 1)
+        db = SessionLocal()
+        _heavy_character(db, models, character_id)
+        user_id = db.get(models.Character, character_id).owner_id
+        db.close()
+
+        db = SessionLocal()
+        loaded = character_crud.get_character_details(db, character_id, user_id)
+        serialize = _time(lambda: character_crud._character_to_output(loaded), args.runs)
+        db.close()
+
+        def load_and_serialize():
+            session = SessionLocal()
+            try:
+                return character_crud.get_character_details_for_output(session, character_id, user_id)
+            finally:
+                session.close()
+        full = _time(load_and_serialize, args.runs)
+
+    for name, samples in (("serialize", serialize), ("load+serialize", full)):
+        print(f"{name:<15} median {statistics.median(samples):6.2f} ms  min {min(samples):6.2f} ms  ({args.runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# backend/benchmarks/skill_modifiers.py
+"""
+Модификаторы навыков (user-022): таблица SKILL_MODIFIER_TABLE и кэш
+Character.derived против прежней цепочки if (Character._get_modifier,
+скопирована ниже как эталон). База не нужна: персонаж — transient-экземпляр.
+
+Перед замером проверяется, что таблица и цепочка if дают одинаковый
+модификатор для значений навыка от -1 до 12.
+
+Запуск (из backend/):
+  python benchmarks/skill_modifiers.py [--repeat 7]
+"""
+import argparse
+import timeit
+from typing import Callable, Dict
+
+from _common import use_temp_database
+
+use_temp_database()
+
+from app.models.character import SKILL_NAMES, Character, skill_modifier # noqa: E402
+
+
+def legacy_modifier(skill_value: int) -> int:
+    """Character._get_modifier до перехода на таблицу."""
+    if skill_value <= 1: return 0
+    if skill_value <= 3: return 1
+    if skill_value <= 5: return 2
+    if skill_value <= 7: return 3
+    if skill_value <= 9: return 4
+    return 5 # Для 10
+
+
+def legacy_modifiers(character: Character) -> Dict[str, int]:
+    """Прежний CharacterDerivedStats.modifiers: цепочка if по каждой колонке."""
+    return {f"{name}_mod": legacy_modifier(getattr(character, f"skill_{name}")) for name in SKILL_NAMES}
+
+
+def _cold(character: Character) -> Callable[[], object]:
+    def run():
+        character.invalidate_derived()
+        return character.derived.modifier_values
+    return run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=7, help="повторов timeit (берется лучший)")
+    args = parser.parse_args()
+
+    for value in range(-1, 13):
+        assert skill_modifier(value) == legacy_modifier(value), value
+
+    character = Character(**{f"skill_{name}": index % 11 for index, name in enumerate(SKILL_NAMES)})
+    assert dict(zip((f"{name}_mod" for name in SKILL_NAMES), character.derived.modifier_values)) == legacy_modifiers(character)
+    cases = [
+        ("all 18 modifiers, old if-chain over the columns", lambda: legacy_modifiers(character)),
+        ("all 18 modifiers, table, one pass (cold)", _cold(character)),
+        ("all 18 modifiers, cached on the instance", lambda: character.derived.modifier_values),
+        ("one modifier, old if-chain", lambda: legacy_modifier(character.skill_dexterity)),
+        ("one modifier, hybrid -> cached array", lambda: character.dexterity_mod),
+    ]
+    character.derived.modifier_values # прогрев кэша для "cached" и "hybrid"
+    for name, fn in cases:
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=args.repeat, number=number)) / number
+        print(f"{name:<50} {best * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
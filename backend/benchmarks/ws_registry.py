@@ -0,0 +1,94 @@
+# backend/benchmarks/ws_registry.py
+"""
+Реестр соединений ConnectionManager (user-010): connect / disconnect /
+players_update на поддельных сокетах, без сети и базы.
+
+--backend указывает на другой каталог backend/ (например, git worktree более
+ранней ревизии): скрипт использует только connect(ws, lobby, username,
+character_id), disconnect(ws, lobby) и send_players_update, поэтому одинаково
+работает со старым (список кортежей) и новым (индексы registry.py) реестром.
+
+Запуск (из backend/):
+  python benchmarks/ws_registry.py [--sizes 1000 5000] [--lobbies 1 50] [--backend PATH]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from _common import use_temp_database
+
+
+class FakeWebSocket:
+    """Сокет, который принимает любые кадры мгновенно."""
+
+    client_state = None # заполняется в main(): WebSocketState.CONNECTED
+
+    async def send_text(self, text):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+async def _measure(manager_class, size: int, lobbies: int, repeats: int) -> Dict[str, float]:
+    manager = manager_class()
+    sockets = [FakeWebSocket() for _ in range(size)]
+    keys = [f"BENCH{index % lobbies}" for index in range(size)]
+
+    started = time.perf_counter()
+    for index, websocket in enumerate(sockets):
+        await manager.connect(websocket, keys[index], f"user{index}", index)
+    connect_us = (time.perf_counter() - started) / size * 1e6
+
+    # Рассылка состава после изменения состава лобби (каждый вход/выход)
+    roster_ms: List[float] = []
+    last = sockets[-1]
+    for _ in range(repeats):
+        manager.disconnect(last, keys[-1])
+        await manager.connect(last, keys[-1], f"user{size - 1}", size - 1)
+        started = time.perf_counter()
+        await manager.send_players_update(keys[-1], "user0", size)
+        roster_ms.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0) # Писатели очередей отправляют кадры
+
+    started = time.perf_counter()
+    for index, websocket in enumerate(sockets):
+        manager.disconnect(websocket, keys[index])
+    disconnect_us = (time.perf_counter() - started) / size * 1e6
+    await asyncio.sleep(0)
+    return {"connect": connect_us, "disconnect": disconnect_us, "players_update": statistics.median(roster_ms)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--lobbies", type=int, nargs="+", default=[1, 50])
+    parser.add_argument("--repeats", type=int, default=7, help="повторов players_update (медиана)")
+    parser.add_argument("--backend", help="каталог backend/ другой ревизии")
+    args = parser.parse_args()
+
+    use_temp_database()
+    if args.backend:
+        sys.path.insert(0, args.backend)
+    logging.disable(logging.CRITICAL) # connect/disconnect логируют каждый вход
+    from starlette.websockets import WebSocketState
+    from app.websockets.manager import ConnectionManager
+
+    FakeWebSocket.client_state = WebSocketState.CONNECTED
+
+    print(f"{'sockets':>7} {'lobbies':>7} {'connect':>13} {'disconnect':>13} {'players_update':>15}")
+    for size in args.sizes:
+        for lobbies in args.lobbies:
+            result = asyncio.run(_measure(ConnectionManager, size, lobbies, args.repeats))
+            print(f"{size:>7} {lobbies:>7} {result['connect']:>8.1f} us/op {result['disconnect']:>8.1f} us/op {result['players_update']:>12.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# backend/tests/conftest.py
+"""
+Общие фикстуры: приложение на временной SQLite-базе, засеянной справочниками
+(app/seed_db.py), пользователь, персонажи и счетчик SQL-запросов.
+
+DATABASE_URL задается до импорта app: движки создаются при импорте app.db.database.
+"""
+import logging
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="player_tool_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from fastapi.testclient import TestClient # noqa: E402
+from sqlalchemy import event # noqa: E402
+from starlette.websockets import WebSocketState # noqa: E402
+
+from app import models # noqa: E402
+from app.crud.character_cache import character_details_cache # noqa: E402
+from app.db.database import Base, SessionLocal, async_engine, engine # noqa: E402
+from app.main import app # noqa: E402
+from app.seed_db import seed_data # noqa: E402
+
+SKILLS = [
+    "skill_strength", "skill_dexterity", "skill_endurance", "skill_reaction", "skill_technique",
+    "skill_adaptation", "skill_logic", "skill_attention", "skill_erudition", "skill_culture",
+    "skill_science", "skill_medicine", "skill_suggestion", "skill_insight", "skill_authority",
+    "skill_self_control", "skill_religion", "skill_flow",
+]
+
+
+def character_body(name: str = "Hero") -> dict:
+    """Тело POST /characters: 45 очков навыков, ветки стрелка и медика."""
+    skills = {skill: 3 for skill in SKILLS}
+    skills.update(skill_strength=6, skill_dexterity=6, skill_endurance=6)
+    skills["skill_flow"] += 45 - sum(value - 1 for value in skills.values())
+    return {
+        "name": name, "strength": 5, "dexterity": 5, "endurance": 5, "intelligence": 5,
+        "perception": 5, "charisma": 5, "luck": 5,
+        "initial_skills": skills, "initial_branch_levels": {"sharpshooter": 2, "medic": 1},
+    }
+
+
+class FakeWebSocket:
+    """Минимум WebSocket для ConnectionManager: состояние, отправленные кадры, код закрытия."""
+
+    def __init__(self):
+        self.client_state = WebSocketState.CONNECTED
+        self.sent = []
+        self.close_code = None
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+        self.client_state = WebSocketState.DISCONNECTED
+
+    def received(self, frame_type: str) -> List[str]:
+        """Отправленные текстовые кадры типа `frame_type`."""
+        marker = f'"type":"{frame_type}"'
+        return [frame for frame in self.sent if isinstance(frame, str) and marker in frame]
+
+
+class QueryCounter:
+    """Число SQL-выражений (before_cursor_execute) sync- и async-движков и их текст."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def selecting_from(self, table: str) -> List[str]:
+        """SELECT-ы, читающие таблицу `table` (FROM/JOIN)."""
+        return [
+            statement for statement in self.statements
+            if statement.lstrip().upper().startswith("SELECT")
+            and (f"FROM {table} " in f"{statement} " or f"JOIN {table} " in statement)
+        ]
+
+
+@contextmanager
+def count_queries(cold: bool = True) -> Iterator[QueryCounter]:
+    """Считает запросы внутри блока; cold=True — кэш листов сбрасывается заранее."""
+    if cold:
+        character_details_cache.clear()
+    counter = QueryCounter()
+    targets = (engine, async_engine.sync_engine)
+    for target in targets:
+        event.listen(target, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        for target in targets:
+            event.remove(target, "before_cursor_execute", counter)
+
+
+@pytest.fixture(scope="session")
+def client() -> Iterator[TestClient]:
+    Base.metadata.create_all(bind=engine)
+    logging.disable(logging.INFO) # сидер и менеджер WebSocket логируют каждое действие
+    try:
+        seed_data()
+    finally:
+        logging.disable(logging.NOTSET)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def headers(client) -> Dict[str, str]:
+    client.post("/auth/register", json={"username": "tester", "password": "tester-pass"})
+    token = client.post("/auth/login", data={"username": "tester", "password": "tester-pass"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def reference(client) -> Dict[str, int]:
+    """id справочных записей, на которых строятся сценарии."""
+    db = SessionLocal()
+    try:
+        return {
+            "pistol": db.query(models.Weapon).filter(models.Weapon.name.like("Пистолет (легкий%")).first().id,
+            "ammo": db.query(models.Ammo).filter(models.Ammo.ammo_type == "Пистолетные 9мм").first().id,
+            "medkit": db.query(models.GeneralItem).filter(models.GeneralItem.category == "Медицина").first().id,
+            "armor": db.query(models.Armor).first().id,
+            "status_effect": db.query(models.StatusEffect).filter(models.StatusEffect.ac_modifier != None).first().id, # noqa: E711
+            "precise_shot": db.query(models.Ability).filter(models.Ability.name == "Точный Выстрел").first().id,
+        }
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def character(client, headers) -> int:
+    """Новый персонаж без предметов."""
+    response = client.post("/characters", json=character_body(), headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def arm_character(client, headers, reference, character_id: int) -> Dict[str, int]:
+    """
+    Выдает персонажу пистолет (weapon1), надетую броню, патроны и аптечку.
+    Возвращает id персонажа и записей инвентаря.
+    """
+    def add(item: str, **extra) -> int:
+        response = client.post(f"/characters/{character_id}/inventory", json={"item_id": reference[item], **extra}, headers=headers)
+        assert response.status_code == 201, response.text
+        return response.json()["id"]
+
+    ids = {"id": character_id, "pistol": add("pistol"), "ammo": add("ammo", quantity=10), "medkit": add("medkit"), "armor": add("armor")}
+    for slot, inv_id in (("weapon1", ids["pistol"]), ("armor", ids["armor"])):
+        response = client.put(f"/characters/{character_id}/equipment", json={"inventory_item_id": inv_id, "slot": slot}, headers=headers)
+        assert response.status_code == 200, response.text
+    return ids
+
+
+@pytest.fixture
+def armed_character(client, headers, reference, character) -> Dict[str, int]:
+    """Персонаж из arm_character: пистолет и броня надеты, в инвентаре патроны и аптечка."""
+    return arm_character(client, headers, reference, character)
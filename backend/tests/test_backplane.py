@@ -0,0 +1,260 @@
+# backend/tests/test_backplane.py
+"""
+Несколько воркеров (ConnectionManager) в одном процессе, соединенных шиной
+(websockets/backplane.py): InMemoryBackplane на общем InMemoryHub и
+RedisBackplane поверх FakeRedis — минимальной подмены redis.asyncio ниже
+(pub/sub, хэши участников, ключи живости узлов).
+
+Проверяются рассылка между воркерами, общий состав лобби, инвалидация кэша
+листов и каталога справочников на других воркерах и удаление участников
+упавшего воркера.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+from fastapi import status
+
+from app.crud.character_cache import CharacterDetailsCache
+from app.crud.reference_catalog import ReferenceCatalog
+from app.websockets import manager as manager_module
+from app.websockets.backplane import InMemoryBackplane, InMemoryHub, RedisBackplane
+from app.websockets.manager import ConnectionManager
+from conftest import FakeWebSocket
+
+LOBBY = "BPTEST"
+
+
+# --- FakeRedis ---
+
+class FakeRedisServer:
+    """Общее состояние "сервера": ключи, хэши и подписчики каналов. TTL не отслеживается."""
+
+    def __init__(self):
+        self.keys: Dict[str, bytes] = {}
+        self.hashes: Dict[str, Dict[bytes, bytes]] = defaultdict(dict)
+        self.channels: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+
+
+class FakePubSub:
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.subscribed: List[str] = []
+
+    async def subscribe(self, channel: str):
+        self.server.channels[channel].append(self.queue)
+        self.subscribed.append(channel)
+
+    async def unsubscribe(self, channel: str):
+        self.server.channels[channel].remove(self.queue)
+        self.subscribed.remove(channel)
+
+    async def close(self):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages: bool = True, timeout: float = 1.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class FakeRedis:
+    """Клиент с подмножеством redis.asyncio.Redis, которое использует RedisBackplane."""
+
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+
+    async def set(self, key: str, value, ex: Optional[int] = None):
+        self.server.keys[key] = value.encode() if isinstance(value, str) else value
+
+    async def delete(self, key: str):
+        self.server.keys.pop(key, None)
+
+    async def mget(self, keys: List[str]):
+        return [self.server.keys.get(key) for key in keys]
+
+    async def hset(self, key: str, field: str, value: bytes):
+        self.server.hashes[key][field.encode()] = value
+
+    async def hdel(self, key: str, field: str):
+        self.server.hashes[key].pop(field.encode(), None)
+
+    async def hgetall(self, key: str):
+        return dict(self.server.hashes.get(key, {}))
+
+    async def publish(self, channel: str, data: bytes):
+        for queue in list(self.server.channels[channel]):
+            queue.put_nowait({"type": "message", "channel": channel.encode(), "data": data})
+
+    def pubsub(self) -> FakePubSub:
+        return FakePubSub(self.server)
+
+
+# --- Воркеры ---
+
+class Cluster:
+    """Воркеры одного "развертывания" на общей шине выбранного типа."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.hub = InMemoryHub()
+        self.redis = FakeRedisServer()
+        self.workers: List[ConnectionManager] = []
+
+    async def start_worker(self) -> ConnectionManager:
+        if self.kind == "memory":
+            backplane = InMemoryBackplane(self.hub)
+        else:
+            backplane = RedisBackplane(client=FakeRedis(self.redis), prefix="test")
+        worker = ConnectionManager()
+        await worker.start_backplane(backplane)
+        self.workers.append(worker)
+        return worker
+
+    def crash(self, worker: ConnectionManager) -> None:
+        """Воркер пропадает без presence leave: фоновые задачи шины остановлены, узел больше не жив."""
+        backplane = worker.backplane
+        for task in backplane._tasks:
+            task.cancel()
+        backplane._tasks.clear()
+        if self.kind == "memory":
+            self.hub.subscribers.remove(backplane)
+        else:
+            self.redis.keys.pop(backplane._node_key(backplane.node_id))
+            for queues in self.redis.channels.values():
+                if backplane._pubsub.queue in queues:
+                    queues.remove(backplane._pubsub.queue)
+        worker.backplane = None
+
+    async def stop(self) -> None:
+        for worker in self.workers:
+            await worker.stop_backplane()
+
+
+async def eventually(condition: Callable[[], Any], timeout: float = 2.0) -> None:
+    """Ждет, пока событие дойдет через шину и очереди отправки."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met"
+        await asyncio.sleep(0.01)
+
+
+def run_cluster(kind: str, scenario: Callable[[Cluster], Any]) -> None:
+    async def main():
+        cluster = Cluster(kind)
+        try:
+            await scenario(cluster)
+        finally:
+            await cluster.stop()
+    asyncio.run(main())
+
+
+backplanes = pytest.mark.parametrize("kind", ["memory", "redis"])
+
+
+# --- Тесты ---
+
+@backplanes
+def test_broadcast_reaches_sockets_on_other_workers(kind):
+    async def scenario(cluster):
+        first, second = await cluster.start_worker(), await cluster.start_worker()
+        sender, receiver = FakeWebSocket(), FakeWebSocket()
+        await first.connect(sender, LOBBY, "alice", 1)
+        await second.connect(receiver, LOBBY, "bob", 2)
+
+        await first.broadcast(LOBBY, {"type": "note", "text": "hi"})
+        await first.broadcast_character_update(LOBBY, {"id": 1, "name": "Alice", "current_hp": 7})
+
+        await eventually(lambda: receiver.received("note") and receiver.received("character_update"))
+        assert '"text":"hi"' in receiver.received("note")[0]
+        assert '"current_hp":7' in receiver.received("character_update")[0]
+    run_cluster(kind, scenario)
+
+
+@backplanes
+def test_lobby_roster_merges_members_of_all_workers(kind):
+    async def scenario(cluster):
+        first, second = await cluster.start_worker(), await cluster.start_worker()
+        alice, bob, intruder = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await first.connect(alice, LOBBY, "alice", 1)
+        await second.connect(bob, LOBBY, "bob", 2) # состав первого воркера загружен из шины
+
+        await eventually(lambda: ("bob", 2) in first.registry.get(LOBBY).members())
+        assert set(second.registry.get(LOBBY).members()) == {("alice", 1), ("bob", 2)}
+
+        await first.send_players_update(LOBBY, "master", 4)
+        await eventually(lambda: alice.received("players_update"))
+        roster = alice.received("players_update")[-1]
+        assert '"username":"alice"' in roster and '"username":"bob"' in roster
+
+        # Персонаж уже в лобби на другом воркере
+        assert not await second.connect(intruder, LOBBY, "alice", 1)
+        assert intruder.close_code == status.WS_1008_POLICY_VIOLATION
+    run_cluster(kind, scenario)
+
+
+@backplanes
+def test_cache_invalidation_reaches_other_workers(kind, monkeypatch):
+    async def scenario(cluster):
+        writer, reader = await cluster.start_worker(), await cluster.start_worker()
+        # Кэш "второго процесса": событие с шины может сбросить его только на reader
+        reader_cache = CharacterDetailsCache(8)
+        monkeypatch.setattr(manager_module, "character_details_cache", reader_cache)
+
+        class Sheet:
+            owner_id = 1
+        reader_cache.put(42, reader_cache.current_version(42), Sheet())
+        assert reader_cache.get(42, 1) is not None
+
+        writer._publish_cache_bump({42}) # on_bump после commit на writer
+        await eventually(lambda: reader_cache.get(42, 1) is None)
+        assert reader_cache.current_version(42) > 0
+    run_cluster(kind, scenario)
+
+
+@backplanes
+def test_catalog_invalidation_reaches_other_workers(kind, monkeypatch):
+    async def scenario(cluster):
+        writer, reader = await cluster.start_worker(), await cluster.start_worker()
+        reader_catalog = ReferenceCatalog()
+        monkeypatch.setattr(manager_module, "reference_catalog", reader_catalog)
+        reader_catalog._entries = {} # "собранный" каталог второго процесса
+
+        writer._publish_catalog_invalidate() # on_invalidate после commit справочников на writer
+        await eventually(lambda: not reader_catalog.is_built)
+        assert reader_catalog.invalidations == 1
+    run_cluster(kind, scenario)
+
+
+@backplanes
+def test_members_of_dead_worker_are_dropped_on_keepalive(kind):
+    async def scenario(cluster):
+        survivor, doomed = await cluster.start_worker(), await cluster.start_worker()
+        await survivor.connect(FakeWebSocket(), LOBBY, "alice", 1)
+        await doomed.connect(FakeWebSocket(), LOBBY, "bob", 2)
+        await eventually(lambda: ("bob", 2) in survivor.registry.get(LOBBY).members())
+
+        cluster.crash(doomed)
+        await survivor.backplane.on_keepalive()
+
+        assert list(survivor.registry.get(LOBBY).members()) == [("alice", 1)]
+    run_cluster(kind, scenario)
+
+
+@backplanes
+def test_character_of_dead_worker_can_reconnect(kind):
+    async def scenario(cluster):
+        survivor, doomed = await cluster.start_worker(), await cluster.start_worker()
+        await survivor.connect(FakeWebSocket(), LOBBY, "alice", 1)
+        await doomed.connect(FakeWebSocket(), LOBBY, "bob", 2)
+        await eventually(lambda: 2 in survivor.registry.get(LOBBY).remote_by_character)
+
+        cluster.crash(doomed) # keepalive еще не прошел: участник числится за мертвым узлом
+        reconnected = FakeWebSocket()
+        assert await survivor.connect(reconnected, LOBBY, "bob", 2)
+        assert reconnected.close_code is None
+        assert set(survivor.registry.get(LOBBY).members()) == {("alice", 1), ("bob", 2)}
+    run_cluster(kind, scenario)
@@ -0,0 +1,67 @@
+# backend/tests/test_character_batch.py
+"""
+POST /characters/batch: доступны свои персонажи и персонажи лобби (lobby_key);
+права проверяются в запросе, поэтому чужие листы не собираются и не
+попадают в кэш. Ответ — в порядке character_ids.
+"""
+from typing import Dict
+
+import pytest
+
+from app.crud.character_cache import character_details_cache
+from conftest import character_body, count_queries
+
+
+def _login(client, username: str) -> Dict[str, str]:
+    client.post("/auth/register", json={"username": username, "password": f"{username}-pass"})
+    token = client.post("/auth/login", data={"username": username, "password": f"{username}-pass"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def other_headers(client) -> Dict[str, str]:
+    return _login(client, "batch-other")
+
+
+def _create(client, headers, name: str) -> int:
+    response = client.post("/characters", json=character_body(name), headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _batch(client, headers, ids, lobby_key=None):
+    response = client.post("/characters/batch", json={"character_ids": ids, "lobby_key": lobby_key}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [sheet["id"] for sheet in response.json()]
+
+
+def test_batch_returns_own_sheets_in_requested_order(client, headers, character):
+    second = _create(client, headers, "Second")
+    assert _batch(client, headers, [second, character]) == [second, character]
+    assert _batch(client, headers, [character, second, character]) == [character, second]
+
+
+def test_batch_skips_invisible_ids_without_building_them(client, headers, other_headers, character):
+    foreign = _create(client, other_headers, "Foreign")
+    with count_queries() as counter:
+        assert _batch(client, headers, [foreign, character, 10**9]) == [character]
+
+    # Чужой лист не загружался: условие владельца в самом SELECT персонажей
+    character_selects = counter.selecting_from("characters")
+    assert character_selects and all("owner_id" in statement for statement in character_selects)
+    assert character_details_cache.get_many([foreign]) == {}
+
+
+def test_batch_with_lobby_key_includes_lobby_characters(client, headers, other_headers, character):
+    foreign = _create(client, other_headers, "Guest")
+    outsider = _create(client, other_headers, "Outsider")
+    party = client.post("/parties", json={"max_players": 4}, headers=headers)
+    assert party.status_code in (200, 201), party.text
+    lobby_key = party.json()["lobby_key"]
+    token = other_headers["Authorization"].split()[1]
+    query = f"token={token}&lobbyKey={lobby_key}&masterUsername=tester&maxPlayers=4&characterId={foreign}"
+
+    with client.websocket_connect(f"/ws?{query}") as websocket:
+        websocket.receive_text() # первый кадр: игрок уже зарегистрирован в лобби
+        assert _batch(client, headers, [outsider, foreign, character], lobby_key) == [foreign, character]
+    assert _batch(client, headers, [outsider, foreign, character]) == [character]
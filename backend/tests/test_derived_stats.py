@@ -0,0 +1,101 @@
+# backend/tests/test_derived_stats.py
+"""
+Производные характеристики (CharacterDerivedStats) после мутаций через unit of
+work: граф меняется и сериализуется повторно, поэтому посчитанный на нем
+total_ac должен сбрасываться.
+
+- Через HTTP ответ мутации сверяется с ожидаемым КД и с листом, собранным
+  заново (кэш листов сброшен).
+- Через run_character_mutation total_ac считается на графе ДО мутации в той
+  же сессии: без сброса ответ содержал бы прежний КД.
+"""
+from app import models, schemas
+from app.crud import character as character_crud
+from app.crud import item as item_crud
+from app.crud.character_cache import character_details_cache
+from app.crud.character_loading import VITALS
+from app.crud.unit_of_work import get_owned_character
+from app.db.database import SessionLocal
+
+
+def _fresh_total_ac(client, headers, character_id: int) -> int:
+    character_details_cache.clear()
+    response = client.get(f"/characters/{character_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["total_ac"]
+
+
+def _reference_values(reference):
+    db = SessionLocal()
+    try:
+        armor = db.get(models.Armor, reference["armor"])
+        effect = db.get(models.StatusEffect, reference["status_effect"])
+        return armor.armor_type, armor.ac_bonus, armor.max_dex_bonus, effect.ac_modifier
+    finally:
+        db.close()
+
+
+def _armor_ac(armor_type, ac_bonus, max_dex_bonus, base_ac, dex_mod) -> int:
+    """КД в броне по правилам CharacterDerivedStats.total_ac."""
+    if armor_type == "Тяжёлая":
+        return ac_bonus
+    if armor_type == "Средняя":
+        return ac_bonus + min(dex_mod, 2 if max_dex_bonus is None else max_dex_bonus)
+    if armor_type == "Лёгкая":
+        return ac_bonus + min(dex_mod, 99 if max_dex_bonus is None else max_dex_bonus)
+    return base_ac
+
+
+def test_total_ac_follows_armor_and_status_effects(client, headers, reference, armed_character):
+    character_id = armed_character["id"]
+    url = f"/characters/{character_id}"
+    armor_type, ac_bonus, max_dex_bonus, ac_modifier = _reference_values(reference)
+    sheet = client.get(url, headers=headers).json() # total_ac посчитан и лист в кэше
+    base_ac, dex_mod = sheet["base_ac"], sheet["skill_modifiers"]["dexterity_mod"]
+    armored_ac = _armor_ac(armor_type, ac_bonus, max_dex_bonus, base_ac, dex_mod)
+    assert armored_ac != base_ac and ac_modifier
+    assert sheet["total_ac"] == armored_ac
+
+    steps = [
+        ("unequip armor", "delete", "/equipment/armor", None, base_ac),
+        ("equip armor", "put", "/equipment", {"inventory_item_id": armed_character["armor"], "slot": "armor"}, armored_ac),
+        ("apply status", "post", "/status_effects", {"status_effect_id": reference["status_effect"]}, armored_ac + ac_modifier),
+        ("remove status", "delete", f"/status_effects/{reference['status_effect']}", None, armored_ac),
+    ]
+    for name, method, path, body, expected in steps:
+        kwargs = {"json": body} if body is not None else {}
+        response = getattr(client, method)(url + path, headers=headers, **kwargs)
+        assert response.status_code == 200, (name, response.text)
+        assert response.json()["total_ac"] == expected, name # лист из того же графа unit of work
+        assert _fresh_total_ac(client, headers, character_id) == expected, name
+
+
+def test_total_ac_cached_before_mutation_is_reset(client, headers, reference, armed_character):
+    character_id = armed_character["id"]
+    effect_id = reference["status_effect"]
+    db = SessionLocal()
+    try:
+        owner_id = db.get(models.Character, character_id).owner_id
+    finally:
+        db.close()
+
+    def apply_status(db):
+        character_crud.apply_status_effect(db, get_owned_character(db, character_id, owner_id, VITALS), effect_id)
+        db.commit()
+
+    steps = [
+        ("unequip armor", lambda db: item_crud.unequip_item(db, character_id=character_id, user_id=owner_id, slot="armor")),
+        ("equip armor", lambda db: item_crud.equip_item(db, character_id=character_id, user_id=owner_id, equip_data=schemas.EquipItem(inventory_item_id=armed_character["armor"], slot="armor"))),
+        ("apply status", apply_status),
+        ("remove status", lambda db: character_crud.remove_status_effect(db, character_id, owner_id, effect_id)),
+    ]
+    for name, operation in steps:
+        db = SessionLocal()
+        try:
+            before = character_crud.get_character_details(db, character_id, owner_id).derived.total_ac # граф из identity map переиспользуется
+            _, details = character_crud.run_character_mutation(db, character_id, owner_id, lambda: operation(db))
+        finally:
+            db.close()
+        after = _fresh_total_ac(client, headers, character_id)
+        assert after != before, name
+        assert details.total_ac == after, name
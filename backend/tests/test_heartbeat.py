@@ -0,0 +1,54 @@
+# backend/tests/test_heartbeat.py
+"""
+Heartbeat лобби (ConnectionManager._heartbeat_loop / _evict) на поддельных
+сокетах: 500 соединений в одном лобби, часть молчит, часть уже закрыта.
+"""
+import asyncio
+import time
+
+from fastapi import status
+from starlette.websockets import WebSocketState
+
+from app.websockets import manager as manager_module
+from app.websockets.manager import ConnectionManager
+from conftest import FakeWebSocket
+
+INTERVAL = 0.05 # WS_PING_INTERVAL и WS_PING_TIMEOUT теста, сек
+
+
+def test_heartbeat_evicts_silent_and_closed_sockets(monkeypatch):
+    monkeypatch.setattr(manager_module, "WS_PING_INTERVAL", INTERVAL)
+    monkeypatch.setattr(manager_module, "WS_PING_TIMEOUT", INTERVAL)
+    sockets = [FakeWebSocket() for _ in range(500)]
+    silent = sockets[:200] # heartbeat=1, перестали слать кадры
+    alive = sockets[200:400] # heartbeat=1, отвечают на ping
+    closed = sockets[400:450] # сокет уже закрыт, disconnect не вызывался
+    idle = sockets[450:] # без heartbeat: молчат, но не выселяются
+    manager = ConnectionManager()
+
+    async def scenario():
+        for index, websocket in enumerate(sockets):
+            assert await manager.connect(websocket, "hbtest", f"user{index}", None, heartbeat=websocket not in idle)
+        lobby = manager.registry.get("HBTEST")
+        for websocket in closed:
+            websocket.client_state = WebSocketState.DISCONNECTED
+        long_ago = time.monotonic() - 10
+        for websocket in silent + idle:
+            lobby.connections[websocket].last_seen = long_ago
+
+        deadline = time.monotonic() + 4 * INTERVAL
+        while time.monotonic() < deadline:
+            for websocket in alive:
+                manager.touch(websocket) # pong
+            await asyncio.sleep(INTERVAL / 5)
+        # Снимок до выхода из asyncio.run: при остановке цикла heartbeat может успеть
+        # еще один тик, когда pong уже не шлются
+        return set(lobby.connections), dict(manager.evictions_total)
+
+    remaining, evictions = asyncio.run(scenario())
+
+    assert remaining == set(alive) | set(idle)
+    assert evictions == {"heartbeat_timeout": len(silent), "closed": len(closed)}
+    assert all(websocket.close_code == status.WS_1001_GOING_AWAY for websocket in silent)
+    assert all(any('"type":"ping"' in frame for frame in websocket.sent) for websocket in alive)
+    assert not any(websocket.sent for websocket in idle)
@@ -0,0 +1,103 @@
+# backend/tests/test_idle_sockets.py
+"""
+Простаивающие WebSocket-соединения не держат соединения пула БД (main.py,
+/ws): сессии открываются только на проверку и начальную синхронизацию.
+
+500 сокетов (50 лобби по 10 игроков) подключаются к приложению напрямую
+через ASGI в event loop TestClient и ждут следующего кадра; в этот момент
+ни один из пулов не должен иметь выданных соединений.
+"""
+import asyncio
+from typing import Any, Dict, List
+from urllib.parse import urlencode
+
+from sqlalchemy import insert
+
+from app import models
+from app.db.database import SessionLocal, async_engine, engine
+from app.main import app
+
+LOBBIES = 50
+PLAYERS_PER_LOBBY = 10
+
+
+class AsgiWebSocketClient:
+    """Клиент /ws поверх ASGI-вызова приложения: подключается и молчит."""
+
+    def __init__(self, query: Dict[str, Any]):
+        self.scope = {
+            "type": "websocket", "path": "/ws", "raw_path": b"/ws", "root_path": "",
+            "scheme": "ws", "query_string": urlencode(query).encode(), "headers": [],
+            "client": ("testclient", 50000), "server": ("testserver", 80), "subprotocols": [],
+        }
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent: List[Dict[str, Any]] = []
+        self.receives = 0
+        self.idle = asyncio.Event() # приложение ждет кадр от клиента после подключения
+        self.task = None
+
+    async def _receive(self) -> Dict[str, Any]:
+        self.receives += 1
+        if self.receives > 1:
+            self.idle.set()
+        return await self.incoming.get()
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        self.sent.append(message)
+        if message["type"] == "websocket.close":
+            self.idle.set()
+
+    def open(self) -> None:
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.ensure_future(app(self.scope, self._receive, self._send))
+
+    @property
+    def accepted(self) -> bool:
+        return any(message["type"] == "websocket.accept" for message in self.sent)
+
+    def received(self, frame_type: str) -> bool:
+        marker = f'"type":"{frame_type}"'
+        return any(marker in (message.get("text") or "") for message in self.sent if message["type"] == "websocket.send")
+
+    async def close(self) -> None:
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+
+def _clone_characters(character_id: int, count: int) -> List[int]:
+    """`count` копий персонажа одним INSERT (создание через API заняло бы основную часть теста)."""
+    db = SessionLocal()
+    try:
+        source = db.get(models.Character, character_id)
+        columns = {column.key: getattr(source, column.key) for column in models.Character.__table__.columns if column.key != "id"}
+        rows = [{**columns, "name": f"Idle {index}"} for index in range(count)]
+        return list(db.scalars(insert(models.Character).returning(models.Character.id), rows))
+    finally:
+        db.commit()
+        db.close()
+
+
+def test_idle_sockets_hold_no_pooled_connections(client, headers, character):
+    token = headers["Authorization"].split()[1]
+    character_ids = _clone_characters(character, LOBBIES * PLAYERS_PER_LOBBY)
+    sockets = [
+        AsgiWebSocketClient({
+            "token": token, "lobbyKey": f"IDLE{index // PLAYERS_PER_LOBBY}", "masterUsername": "idle-master",
+            "maxPlayers": PLAYERS_PER_LOBBY, "characterId": character_id,
+        })
+        for index, character_id in enumerate(character_ids)
+    ]
+
+    async def scenario():
+        for websocket in sockets:
+            websocket.open()
+            await websocket.idle.wait() # по одному: начальная синхронизация читает листы уже подключенных
+        checked_out = (engine.pool.checkedout(), async_engine.pool.checkedout())
+        for websocket in sockets:
+            await websocket.close()
+        return checked_out
+
+    checked_out = client.portal.call(scenario)
+
+    assert all(websocket.accepted and websocket.received("initial_character_sync") for websocket in sockets)
+    assert checked_out == (0, 0)
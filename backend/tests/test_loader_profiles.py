@@ -0,0 +1,210 @@
+# backend/tests/test_loader_profiles.py
+"""
+Профили загрузки персонажа (crud/character_loading.py).
+
+- Каждый профиль грузит armed_character фиксированным числом запросов, и
+  каждая таблица предметов читается один раз: экипировка берется из уже
+  загруженного инвентаря.
+- Каждая CRUD-функция, вызванная вне unit of work, работает на своем
+  (узком) профиле: raiseload ни разу не срабатывает. Обращение к связи вне
+  профиля — ошибка, так что успешный вызов и есть доказательство.
+- Эндпоинты (в том числе повышение уровня, назначение слота, действия
+  оружия) дают фиксированное число запросов. TestClient пробрасывает
+  исключения сервера, поэтому raiseload на реальном пути уронил бы тест.
+- Начальная синхронизация лобби (get_characters_details_for_output) грузит
+  одного и нескольких персонажей одинаковым числом запросов.
+"""
+from typing import Callable, Dict
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from app import models, schemas
+from app.crud import action as action_crud
+from app.crud import character as character_crud
+from app.crud import character_slots, character_turn
+from app.crud import item as item_crud
+from app.crud.character_loading import CHARACTER_PROFILES, COMBAT, FULL, MINIMAL, VITALS
+from app.crud.unit_of_work import get_owned_character
+from app.db.database import SessionLocal
+from conftest import arm_character, character_body, count_queries
+
+# Таблицы, которые при любом профиле читаются не больше одного раза
+_ONCE = ("character_inventory_items", "weapons", "armors", "general_items", "ammos", "weapon_granted_abilities")
+
+
+@pytest.fixture
+def owner_id(armed_character) -> int:
+    db = SessionLocal()
+    try:
+        return db.get(models.Character, armed_character["id"]).owner_id
+    finally:
+        db.close()
+
+
+# --- Профили ---
+
+@pytest.mark.parametrize("profile, expected", [
+    (MINIMAL, 1),
+    (VITALS, 2), # + состояния
+    (COMBAT, 9), # + инвентарь, предметы, 4 подтипа, способности оружия; экипировка без запросов
+    (FULL, 11), # + изученные способности и произвольные предметы (слоты — JOIN в основном запросе)
+])
+def test_profile_statement_count(armed_character, owner_id, profile, expected):
+    db = SessionLocal()
+    try:
+        with count_queries(cold=False) as queries:
+            character = get_owned_character(db, armed_character["id"], owner_id, profile)
+            for relation in CHARACTER_PROFILES[profile]:
+                getattr(character, relation)
+            if profile in (COMBAT, FULL):
+                assert character.equipped_armor.item.armor_type is not None
+                assert character.equipped_weapon1.item.granted_abilities is not None
+        assert queries.count == expected, "\n".join(queries.statements)
+        for table in _ONCE:
+            assert len(queries.selecting_from(table)) <= 1, table
+    finally:
+        db.close()
+
+
+def test_relation_outside_profile_raises(armed_character, owner_id):
+    db = SessionLocal()
+    try:
+        character = get_owned_character(db, armed_character["id"], owner_id, VITALS)
+        with pytest.raises(InvalidRequestError):
+            character.inventory
+    finally:
+        db.close()
+
+
+# --- CRUD-функции на своих профилях (вне unit of work) ---
+
+CRUD_CALLS: Dict[str, Callable] = {
+    "skills": lambda db, cid, uid, ids, ref: character_crud.update_character_skills(db, cid, uid, schemas.CharacterUpdateSkills(skill_logic=4)),
+    "stats": lambda db, cid, uid, ids, ref: character_crud.update_character_stats(db, cid, uid, schemas.UpdateCharacterStats(current_hp=3))[0],
+    "notes": lambda db, cid, uid, ids, ref: character_crud.update_character_notes(db, cid, uid, schemas.CharacterNotes(character_notes="n")),
+    "heal": lambda db, cid, uid, ids, ref: character_crud.heal_character(db, cid, uid, schemas.HealRequest(source="medkit", inventory_item_id=ids["medkit"])),
+    "short_rest": lambda db, cid, uid, ids, ref: character_crud.perform_short_rest(db, cid, uid, schemas.ShortRestRequest(dice_to_spend=1)),
+    "long_rest": lambda db, cid, uid, ids, ref: character_crud.perform_long_rest(db, cid, uid),
+    "end_turn": lambda db, cid, uid, ids, ref: character_turn.end_character_turn(db, cid, uid),
+    "equip": lambda db, cid, uid, ids, ref: item_crud.equip_item(db, cid, uid, schemas.EquipItem(inventory_item_id=ids["pistol"], slot="weapon2")),
+    "unequip": lambda db, cid, uid, ids, ref: item_crud.unequip_item(db, cid, uid, "armor"),
+    "remove_item": lambda db, cid, uid, ids, ref: item_crud.remove_item_from_inventory(db, ids["ammo"], cid, uid, 1),
+    "assign_slot": lambda db, cid, uid, ids, ref: character_slots.assign_ability_to_slot(db, cid, uid, 1, ref["precise_shot"]),
+    "activate_weapon_ability": lambda db, cid, uid, ids, ref: action_crud.activate_action(db, cid, uid, schemas.ActivationRequest(
+        activation_type="ability", target_id=db.get(models.Weapon, ref["pistol"]).granted_abilities[0].id)),
+    "activate_item": lambda db, cid, uid, ids, ref: action_crud.activate_action(db, cid, uid, schemas.ActivationRequest(activation_type="item", target_id=ids["medkit"])),
+}
+
+
+@pytest.mark.parametrize("name", sorted(CRUD_CALLS))
+def test_crud_runs_on_its_profile(armed_character, owner_id, reference, name):
+    db = SessionLocal()
+    try:
+        assert CRUD_CALLS[name](db, armed_character["id"], owner_id, armed_character, reference)
+    finally:
+        db.close()
+
+
+def test_levelup_runs_on_its_profile(client, headers, armed_character, owner_id):
+    response = client.put(f"/characters/{armed_character['id']}/stats", json={"experience_points": 100000}, headers=headers)
+    assert response.status_code == 200, response.text
+    db = SessionLocal()
+    try:
+        level_up = schemas.LevelUpInfo(hp_roll=5, branch_point_spent="medic", skill_points_spent={"skill_logic": 1, "skill_science": 1, "skill_medicine": 1})
+        assert character_crud.level_up_character(db, armed_character["id"], owner_id, level_up)
+    finally:
+        db.close()
+
+
+def test_remove_status_runs_on_its_profile(client, headers, reference, armed_character, owner_id):
+    response = client.post(f"/characters/{armed_character['id']}/status_effects", json={"status_effect_id": reference["status_effect"]}, headers=headers)
+    assert response.status_code == 200, response.text
+    db = SessionLocal()
+    try:
+        assert character_crud.remove_status_effect(db, armed_character["id"], owner_id, reference["status_effect"])
+    finally:
+        db.close()
+
+
+# --- Эндпоинты ---
+
+def _activate(target: str) -> Callable:
+    def body(ids, ref, client, headers):
+        if target == "weapon":
+            sheet = client.get(f"/characters/{ids['id']}", headers=headers).json()
+            return {"activation_type": "ability", "target_id": sheet["equipped_weapon1"]["item"]["granted_abilities"][0]["id"]}
+        client.put(f"/characters/{ids['id']}/active_abilities/1", json={"ability_id": ref["precise_shot"]}, headers=headers)
+        return {"activation_type": "ability", "target_id": ref["precise_shot"]}
+    return body
+
+
+def _heal(ids, ref, client, headers):
+    client.put(f"/characters/{ids['id']}/stats", json={"current_hp": 3}, headers=headers)
+    return {"source": "medkit", "inventory_item_id": ids["medkit"]}
+
+
+def _levelup(ids, ref, client, headers):
+    client.put(f"/characters/{ids['id']}/stats", json={"experience_points": 100000}, headers=headers)
+    return {"hp_roll": 5, "branch_point_spent": "medic", "skill_points_spent": {"skill_logic": 1, "skill_science": 1, "skill_medicine": 1}}
+
+
+# (название, метод, путь, тело или функция (ids, ref, client, headers) -> тело, ожидаемое число запросов).
+# Счет включает запрос пользователя; 12 — пользователь + граф профиля full (лист, unit of work).
+ENDPOINTS = [
+    ("get_cold", "get", "", None, 12),
+    ("get_vitals_section", "get", "?sections=vitals", None, 2), # пользователь + узкий SELECT колонок
+    ("skill_check", "post", "/skill_check", {"skill_name": "Сила"}, 10), # профиль combat
+    ("notes", "put", "/notes", {"character_notes": "hi"}, 13),
+    ("skills", "put", "/skills", {"skill_logic": 4}, 13),
+    ("stats", "put", "/stats", {"current_hp": 3}, 13),
+    ("heal", "post", "/heal", _heal, 14), # UPDATE персонажа + UPDATE аптечки
+    ("activate_weapon_ability", "post", "/activate", _activate("weapon"), 15),
+    ("activate_slot_ability", "post", "/activate", _activate("slot"), 17),
+    ("activate_item", "post", "/activate", lambda ids, ref, client, headers: {"activation_type": "item", "target_id": ids["medkit"]}, 14),
+    ("assign_slot", "put", "/active_abilities/1", lambda ids, ref, client, headers: {"ability_id": ref["precise_shot"]}, 15),
+    ("levelup", "post", "/levelup", _levelup, 15),
+    ("inventory_remove", "delete", "/inventory/{ammo}", None, 5), # без лобби лист не собирается: профиль minimal
+]
+
+
+@pytest.mark.parametrize("name, method, path, body, expected", ENDPOINTS, ids=[case[0] for case in ENDPOINTS])
+def test_endpoint_query_count(client, headers, reference, armed_character, name, method, path, body, expected):
+    if callable(body):
+        body = body(armed_character, reference, client, headers)
+    url = f"/characters/{armed_character['id']}" + path.format(**armed_character)
+    kwargs = {"json": body} if body is not None else {}
+
+    with count_queries() as queries:
+        response = getattr(client, method)(url, headers=headers, **kwargs)
+
+    assert response.status_code < 300, response.text
+    assert queries.count == expected, "\n".join(queries.statements)
+    for table in _ONCE:
+        assert len(queries.selecting_from(table)) <= 1, (table, queries.statements)
+
+
+# --- Начальная синхронизация лобби ---
+
+def test_initial_sync_statement_count_does_not_grow_with_players(client, headers, reference, armed_character):
+    others = []
+    for index in range(4):
+        response = client.post("/characters", json=character_body(f"Player {index}"), headers=headers)
+        assert response.status_code == 201, response.text
+        others.append(arm_character(client, headers, reference, response.json()["id"])["id"])
+
+    counts = {}
+    for ids in ([armed_character["id"]], [armed_character["id"], *others]):
+        db = SessionLocal()
+        try:
+            with count_queries() as queries: # холодный кэш: все листы собираются из БД
+                details = character_crud.get_characters_details_for_output(db, ids)
+            assert list(details) == ids
+            counts[len(ids)] = queries
+        finally:
+            db.close()
+
+    one, many = counts[1], counts[1 + len(others)]
+    assert many.count == one.count == 11, "\n".join(many.statements) # профиль full, IN-запрос на каждую связь
+    for table in _ONCE:
+        assert len(many.selecting_from(table)) <= 1, table
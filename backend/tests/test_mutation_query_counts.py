@@ -0,0 +1,86 @@
+# backend/tests/test_mutation_query_counts.py
+"""
+Число SQL-запросов мутаций персонажа (unit of work, crud/unit_of_work.py):
+граф загружается один раз профилем full, CRUD-функция работает с ним, ответ
+сериализуется без повторной загрузки.
+
+Счет включает запрос пользователя (get_current_user), кэш листов перед
+вызовом сброшен. Персонаж — armed_character: пистолет и броня надеты,
+в инвентаре еще патроны и аптечка (по IN-запросу на каждый подтип предмета).
+Рост числа — N+1 или повторная загрузка графа; уменьшение — обновите бюджет.
+"""
+import pytest
+
+from conftest import count_queries
+
+LOAD = 12 # пользователь + граф персонажа (профиль full: 6 запросов связей, 4 подтипа предметов, способности оружия)
+
+
+def _prepare_damage(client, headers, ids, reference):
+    response = client.put(f"/characters/{ids['id']}/stats", json={"current_hp": 3}, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def _prepare_cooldown(client, headers, ids, reference):
+    response = client.put(f"/characters/{ids['id']}/active_abilities/1", json={"ability_id": reference["precise_shot"]}, headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.post(f"/characters/{ids['id']}/activate", json={"activation_type": "ability", "target_id": reference["precise_shot"]}, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def _prepare_levelup(client, headers, ids, reference):
+    response = client.put(f"/characters/{ids['id']}/stats", json={"experience_points": 100000}, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def _prepare_status(client, headers, ids, reference):
+    response = client.post(f"/characters/{ids['id']}/status_effects", json={"status_effect_id": reference["status_effect"]}, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def _prepare_unequipped_armor(client, headers, ids, reference):
+    response = client.delete(f"/characters/{ids['id']}/equipment/armor", headers=headers)
+    assert response.status_code == 200, response.text
+
+
+# (название, подготовка, (метод, путь, тело), ожидаемое число запросов: загрузка + запись)
+MUTATIONS = [
+    ("end_turn", _prepare_cooldown, ("post", "/end_turn", None), LOAD + 1), # UPDATE кулдауна
+    ("short_rest", _prepare_damage, ("post", "/short_rest", {"dice_to_spend": 1}), LOAD + 1), # UPDATE
+    ("long_rest", _prepare_damage, ("post", "/long_rest", None), LOAD + 1), # UPDATE
+    ("equip", _prepare_unequipped_armor, ("put", "/equipment", lambda ids, ref: {"inventory_item_id": ids["armor"], "slot": "armor"}), LOAD + 1), # UPDATE
+    ("unequip", None, ("delete", "/equipment/armor", None), LOAD + 1), # UPDATE
+    # SELECT состояния + INSERT в character_status_effects
+    ("apply_status", None, ("post", "/status_effects", lambda ids, ref: {"status_effect_id": ref["status_effect"]}), LOAD + 2),
+    ("remove_status", _prepare_status, ("delete", "/status_effects/{status_effect}", None), LOAD + 1), # DELETE
+    # SELECT способностей ветки + UPDATE + INSERT в character_abilities
+    ("levelup", _prepare_levelup, ("post", "/levelup", {"hp_roll": 5, "branch_point_spent": "medic", "skill_points_spent": {"skill_logic": 1, "skill_science": 1, "skill_medicine": 1}}), LOAD + 3),
+    # SELECT способности + UPDATE; второй UPDATE — post_update у связей active_ability_N (models/character.py)
+    ("assign_slot", None, ("put", "/active_abilities/1", lambda ids, ref: {"ability_id": ref["precise_shot"]}), LOAD + 3),
+]
+
+
+@pytest.mark.parametrize("name, prepare, request_spec, expected", MUTATIONS, ids=[case[0] for case in MUTATIONS])
+def test_mutation_query_count(client, headers, reference, armed_character, name, prepare, request_spec, expected):
+    if prepare is not None:
+        prepare(client, headers, armed_character, reference)
+    method, path, body = request_spec
+    if callable(body):
+        body = body(armed_character, reference)
+    url = f"/characters/{armed_character['id']}" + path.format(**reference)
+    kwargs = {"json": body} if body is not None else {}
+
+    with count_queries() as queries:
+        response = getattr(client, method)(url, headers=headers, **kwargs)
+
+    assert response.status_code == 200, response.text
+    assert queries.count == expected, "\n".join(queries.statements)
+
+
+def test_mutation_response_matches_fresh_read(client, headers, armed_character):
+    """Ответ мутации (сериализованный граф unit of work) совпадает с листом, прочитанным заново."""
+    response = client.post(f"/characters/{armed_character['id']}/end_turn", headers=headers)
+    assert response.status_code == 200, response.text
+    with count_queries():
+        fresh = client.get(f"/characters/{armed_character['id']}", headers=headers)
+    assert fresh.json() == response.json()
@@ -0,0 +1,54 @@
+# backend/tests/test_party_membership.py
+"""
+Доступ к истории чата и листам лобби: мастер и пользователи, присоединившиеся
+через /parties/join (таблица party_members), независимо от того, подключен ли
+сейчас их сокет.
+"""
+from typing import Dict
+
+import pytest
+
+from conftest import character_body
+
+
+def _login(client, username: str) -> Dict[str, str]:
+    client.post("/auth/register", json={"username": username, "password": f"{username}-pass"})
+    token = client.post("/auth/login", data={"username": username, "password": f"{username}-pass"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def lobby_key(client, headers) -> str:
+    response = client.post("/parties", json={"max_players": 4}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["lobby_key"]
+
+
+def test_joined_player_reads_history_without_socket(client, headers, lobby_key):
+    player = _login(client, "member-joined")
+    assert client.get(f"/parties/{lobby_key}/chat", headers=player).status_code == 403
+
+    for _ in range(2): # повторный вход не нарушает первичный ключ party_members
+        response = client.post("/parties/join", json={"lobby_key": lobby_key.lower()}, headers=player)
+        assert response.status_code == 200, response.text
+        assert response.json()["creator_username"] == "tester"
+
+    assert client.get(f"/parties/{lobby_key}/chat", headers=player).status_code == 200
+    assert client.get(f"/parties/{lobby_key}/characters", headers=player).status_code == 200
+
+
+def test_connected_socket_without_join_is_not_a_member(client, headers, lobby_key):
+    player = _login(client, "member-socket-only")
+    character = client.post("/characters", json=character_body("Socket Only"), headers=player).json()["id"]
+    token = player["Authorization"].split()[1]
+    query = f"token={token}&lobbyKey={lobby_key}&masterUsername=tester&maxPlayers=4&characterId={character}"
+
+    with client.websocket_connect(f"/ws?{query}") as websocket:
+        websocket.receive_text()
+        assert client.get(f"/parties/{lobby_key}/chat", headers=player).status_code == 403
+
+
+def test_master_and_unknown_lobby(client, headers, lobby_key):
+    assert client.get(f"/parties/{lobby_key}/chat", headers=headers).status_code == 200
+    assert client.get("/parties/ZZZZZZ/chat", headers=headers).status_code == 404
+    assert client.post("/parties/join", json={"lobby_key": "ZZZZZZ"}, headers=headers).status_code == 404
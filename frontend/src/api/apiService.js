@@ -31,9 +31,19 @@ export const getCurrentUser = () => {
 };
 
 // --- Characters ---
-export const getMyCharacters = () => {
+export const getMyCharacters = async () => {
     console.log("API Call: getMyCharacters");
-    return axios.get(`${API_URL}/characters`, { headers: getAuthHeaders() });
+    // Список отдается страницами: дочитываем, пока сервер присылает X-Next-After-Id
+    let response = await axios.get(`${API_URL}/characters`, { headers: getAuthHeaders() });
+    let characters = response.data;
+    while (response.headers['x-next-after-id']) {
+        response = await axios.get(`${API_URL}/characters`, {
+            headers: getAuthHeaders(),
+            params: { after_id: response.headers['x-next-after-id'] },
+        });
+        characters = characters.concat(response.data);
+    }
+    return { ...response, data: characters };
 };
 
 export const getCharacterDetails = (characterId) => {